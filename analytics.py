@@ -0,0 +1,231 @@
+import json
+import sys
+
+import numpy as np
+from scipy import sparse
+
+import logger
+import urlTable
+import graphHandler as gh
+
+# Graph analytics (PageRank, HITS, degrees) worked out on a sparse adjacency matrix, instead of
+# going through graphToNxGraph() (which makes a networkx node for every Vertex, and is slow and
+# huge for the page graph).
+#
+# The matrix is built straight from a Graph, or from a saved .wgraph (see graphFile.py) without
+# loading it into a Graph at all. A[i, j] is the weight of the edge from node i to node j, where
+# the vertices in V come first (in the same order), and any edge targets that aren't in V come
+# after them. Everything is power iteration on the whole matrix at once, so millions of edges
+# take seconds.
+#
+# Domain rankings are done the same way, on the matrix you get by adding up the page edges
+# between each pair of domains (leaving out links within a domain).
+
+# the chance of following a link (instead of jumping to a random page)
+damping = 0.85
+# power iteration stops once the total change in the scores is less than tol, or after maxIter rounds
+tol = 1e-8
+maxIter = 100
+# how many of the top pages and domains to write to the log
+topCount = 10
+
+
+# A graph as a sparse matrix, along with what each row/column is
+class Adjacency:
+    def __init__(self, matrix, urls, domains, domainNames, numVertices):
+        # scipy.sparse.csr_matrix, ex: matrix[0, 9] == 5 means node 0 links to node 9 with weight 5
+        self.matrix = matrix
+        # ex: ["https://example.com/a/", ...] (url of each node)
+        self.urls = urls
+        # ex: array([0, 0, 3, ...]) (index into domainNames of each node)
+        self.domains = domains
+        # ex: ["example.com", ...]
+        self.domainNames = domainNames
+        # nodes 0 to numVertices-1 are the vertices in V, the rest are just edge targets
+        self.numVertices = numVertices
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    # Returns the domain graph as a matrix (D[a, b] = the total weight of the page edges from
+    # domain a to domain b), with the links within a domain left out
+    def domainMatrix(self):
+        n = len(self)
+        P = sparse.csr_matrix((np.ones(n), (np.arange(n), self.domains)), shape=(n, len(self.domainNames)))
+        D = (P.T @ self.matrix @ P).tocsr()
+        D.setdiag(0)
+        D.eliminate_zeros()
+        return D
+
+    # Returns the number of vertices in V on each domain
+    def domainPages(self):
+        return np.bincount(self.domains[:self.numVertices], minlength=len(self.domainNames))
+
+
+# Returns an Adjacency for G
+def fromGraph(G):
+    # vertices in V get the first indexes, in order
+    vertexIds = np.fromiter((v.id for v in G.V), dtype=np.int64, count=len(G.V))
+    src = np.fromiter((gh.internOf(e.u) for e in G.E), dtype=np.int64, count=len(G.E))
+    dst = np.fromiter((gh.internOf(e.v) for e in G.E), dtype=np.int64, count=len(G.E))
+    weights = np.fromiter((e.weight for e in G.E), dtype=np.float64, count=len(G.E))
+
+    # then edge targets that aren't in V, in order of url id
+    index = np.full(len(urlTable.shared), -1, dtype=np.int64)
+    index[vertexIds] = np.arange(len(vertexIds))
+    outside = np.unique(np.concatenate([src, dst])[index[np.concatenate([src, dst])] < 0])
+    index[outside] = np.arange(len(vertexIds), len(vertexIds) + len(outside))
+    ids = np.concatenate([vertexIds, outside])
+    n = len(ids)
+
+    matrix = sparse.csr_matrix((weights, (index[src], index[dst])), shape=(n, n))
+    domainIds = np.fromiter((urlTable.domainId(i) for i in ids), dtype=np.int64, count=n)
+    uniqueDomains, domains = np.unique(domainIds, return_inverse=True)
+    return Adjacency(matrix, [urlTable.url(i) for i in ids], domains,
+                     [urlTable.domainName(d) for d in uniqueDomains], len(vertexIds))
+
+# Returns an Adjacency for a graphFile.GraphFile (the CSR arrays get used as they are)
+def fromGraphFile(gf):
+    n = gf.numStrings
+    # only the vertices have rows, the other strings are edge targets with no edges of their own
+    rowOffsets = np.frombuffer(gf.rowOffsets, dtype=np.uint64).astype(np.int64)
+    indptr = np.concatenate([rowOffsets, np.full(n - gf.numVertices, rowOffsets[-1])])
+    targets = np.frombuffer(gf.targets, dtype=np.uint32).astype(np.int64)
+    weights = np.frombuffer(gf.weights, dtype=np.uint32).astype(np.float64)
+    matrix = sparse.csr_matrix((weights, targets, indptr), shape=(n, n))
+
+    urls = [gf.url(i) for i in range(n)]
+    domainIndex = {}
+    domains = np.fromiter((domainIndex.setdefault(urlTable.splitURL(url)[0], len(domainIndex)) for url in urls),
+                          dtype=np.int64, count=n)
+    return Adjacency(matrix, urls, domains, list(domainIndex), gf.numVertices)
+
+
+# Returns the weighted PageRank of each node (adding up to 1).
+# A page's score gets split between its links in proportion to their weights, and pages with
+# no links spread theirs over every page
+def pageRank(matrix, damping=damping, tol=tol, maxIter=maxIter):
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    outWeight = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = outWeight == 0
+    scale = np.zeros(n)
+    scale[~dangling] = 1 / outWeight[~dangling]
+    # T[j, i] is the chance of following the link from i to j
+    T = (sparse.diags(scale) @ matrix).T.tocsr()
+
+    rank = np.full(n, 1 / n)
+    for i in range(maxIter):
+        new = damping * (T @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+        change = np.abs(new - rank).sum()
+        rank = new
+        if change < tol:
+            break
+    return rank
+
+# Returns (hubs, authorities), the weighted HITS scores of each node (each adding up to 1).
+# Good hubs link to good authorities, and good authorities get linked to by good hubs
+def hits(matrix, tol=tol, maxIter=maxIter):
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+    AT = matrix.T.tocsr()
+    hubs = np.full(n, 1 / n)
+    authorities = np.full(n, 1 / n)
+    for i in range(maxIter):
+        newAuthorities = normalized(AT @ hubs)
+        newHubs = normalized(matrix @ newAuthorities)
+        change = np.abs(newHubs - hubs).sum() + np.abs(newAuthorities - authorities).sum()
+        hubs = newHubs
+        authorities = newAuthorities
+        if change < tol:
+            break
+    return hubs, authorities
+
+# Returns x scaled to add up to 1 (or x itself, if it's all 0)
+def normalized(x):
+    total = x.sum()
+    if total == 0:
+        return x
+    return x / total
+
+# Returns {"inDegree": ..., "outDegree": ..., "inWeight": ..., "outWeight": ...}, an array for each
+# (the number of links into/out of each node, and their total weight)
+def degrees(matrix):
+    return {
+        "inDegree": np.bincount(matrix.indices, minlength=matrix.shape[0]),
+        "outDegree": np.diff(matrix.indptr),
+        "inWeight": np.asarray(matrix.sum(axis=0)).ravel(),
+        "outWeight": np.asarray(matrix.sum(axis=1)).ravel()
+    }
+
+# Returns every score for every node of the matrix, ex: {"pagerank": array([...]), "hub": ..., ...}
+def scores(matrix):
+    hubs, authorities = hits(matrix)
+    results = {"pagerank": pageRank(matrix), "hub": hubs, "authority": authorities}
+    results.update(degrees(matrix))
+    return results
+
+
+# Returns (pageScores, domainScores) for an Adjacency, each like scores() returns.
+# domainScores also has "pages", the number of pages in V on each domain
+def analyze(adj):
+    pageScores = scores(adj.matrix)
+    domainScores = scores(adj.domainMatrix())
+    domainScores["pages"] = adj.domainPages()
+    return pageScores, domainScores
+
+# Returns [(name, score), ...] for the count highest scores
+def top(names, values, count=topCount):
+    count = min(count, len(values))
+    best = np.argpartition(-values, count - 1)[:count] if count > 0 else []
+    return sorted([(names[i], values[i]) for i in best], key=lambda item: -item[1])
+
+# Returns {name: {score: value, ...}, ...} (only the first `limit` names)
+def toProperties(names, results, limit=None):
+    if limit == None:
+        limit = len(names)
+    columns = {score: values[:limit].tolist() for score, values in results.items()}
+    return {names[i]: {score: column[i] for score, column in columns.items()} for i in range(limit)}
+
+# writes the top pages and domains by PageRank to the log
+def logTop(adj, pageScores, domainScores, count=topCount):
+    logger.write(f"Top {count} pages by PageRank:")
+    for url, score in top(adj.urls, pageScores["pagerank"][:adj.numVertices], count):
+        logger.write(f"\t{score:.6f}  {url}")
+    logger.write(f"Top {count} domains by PageRank:")
+    for domain, score in top(adj.domainNames, domainScores["pagerank"], count):
+        logger.write(f"\t{score:.6f}  {domain}")
+
+# Works out every score for G's pages and domains, and saves the page scores as properties
+# of G's vertices (see Graph.setProperty()). Returns (pageScores, domainScores) like analyze()
+def analyzeGraph(G, count=topCount):
+    adj = fromGraph(G)
+    pageScores, domainScores = analyze(adj)
+    for score, values in pageScores.items():
+        G.setProperty(score, dict(zip(adj.urls[:adj.numVertices], values[:adj.numVertices].tolist())))
+    logTop(adj, pageScores, domainScores, count)
+    return pageScores, domainScores
+
+# Works out every score for a saved .wgraph (without loading it into a Graph), and writes them to
+# a json file, ex: {"pages": {"https://example.com/": {"pagerank": 0.0012, ...}, ...}, "domains": {...}}
+def analyzeFile(path, output):
+    import graphFile
+    with graphFile.GraphFile(path) as gf:
+        adj = fromGraphFile(gf)
+    pageScores, domainScores = analyze(adj)
+    logTop(adj, pageScores, domainScores)
+    with open(output, "w") as f:
+        json.dump({"pages": toProperties(adj.urls, pageScores, adj.numVertices),
+                   "domains": toProperties(adj.domainNames, domainScores)}, f)
+
+
+# usage: python analytics.py [title]
+# (analyzes output/{title}.wgraph, and writes output/{title}_analytics.json)
+if __name__ == "__main__":
+    logger.setFile("log.txt")
+    title = "Crawl"
+    if len(sys.argv) > 1:
+        title = sys.argv[1]
+    analyzeFile(f"output/{title}.wgraph", f"output/{title}_analytics.json")
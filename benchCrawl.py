@@ -0,0 +1,212 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import syntheticWeb
+
+# End to end benchmark for the spider: crawls a made up web (see syntheticWeb.py) served from
+# a local server, so it can be run offline, over and over, without bothering anybody's site.
+#
+# Each crawl mode gets run in a fresh process (so peak memory is its own), and reports
+# pages/sec, CPU time (including any parse pool workers) and peak RSS.
+#
+# usage: python benchCrawl.py [--modes dfs,bfs,concurrent,sharded] [--pages 2000] [--domains 50] ...
+#        (python benchCrawl.py --help for all of the settings)
+
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description="Benchmark crawls against a local synthetic web")
+    parser.add_argument("--modes", default="dfs,bfs,concurrent,sharded", help="crawl modes to run, comma separated "
+                        "(shard-resume is the sharded crawl, killed after --kill-after seconds and then resumed)")
+    # the web
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--domains", type=int, default=50)
+    parser.add_argument("--fanout", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=4, help="levels of pages below the start page")
+    parser.add_argument("--page-bytes", type=int, default=8000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--disallow-domains", type=float, default=0.1, help="fraction of sites with Disallow rules")
+    parser.add_argument("--delay-domains", type=float, default=0.0, help="fraction of sites with a Crawl-delay")
+    parser.add_argument("--crawl-delay", type=float, default=0.05)
+    parser.add_argument("--slow-domains", type=float, default=0.0, help="fraction of sites that are slow")
+    parser.add_argument("--slow-seconds", type=float, default=0.05)
+    parser.add_argument("--failing-domains", type=float, default=0.0, help="fraction of sites that sometimes fail")
+    parser.add_argument("--fail-rate", type=float, default=0.3)
+    # the crawl
+    parser.add_argument("--max-depth", type=int, default=None, help="how deep to crawl (default: the whole web)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--parse-workers", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=4, help="processes the sharded mode splits the crawl between")
+    parser.add_argument("--kill-after", type=float, default=1.0, help="seconds before shard-resume kills its shards")
+    parser.add_argument("--check", action="store_true",
+                        help="fail unless every mode ends up with the same graph (pages, edges and total weight)")
+    parser.add_argument("--polite-delay", type=float, default=0.0,
+                        help="seconds between requests to a site without a Crawl-delay (the spider uses 0.5)")
+    parser.add_argument("--page-cache", action="store_true", help="crawl through a (new) page cache")
+    parser.add_argument("--json", default=None, help="also write the results to this json file")
+    # (used internally, to run one crawl in its own process)
+    parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--proxy", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--start", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def makeWeb(args):
+    return syntheticWeb.SyntheticWeb(args.pages, args.domains, args.fanout, args.depth, args.page_bytes, args.seed,
+                                     args.disallow_domains, args.delay_domains, args.crawl_delay,
+                                     args.slow_domains, args.slow_seconds, args.failing_domains, args.fail_rate)
+
+
+# Runs one crawl (in this process) and returns its results
+def runCrawl(args):
+    import logger
+    import httpSession
+    import metrics
+    import robotsStore
+    import pageCache
+    import scrape
+
+    folder = tempfile.mkdtemp(prefix="benchCrawl")
+    logger.setFile(os.path.join(folder, "log.txt"))
+    # the per page messages would swamp everything else
+    logger.minLevel = logger.WARNING
+    httpSession.proxy = args.proxy
+    scrape.robots = robotsStore.RobotsStore(None, scrape.requestHeaders["User-Agent"])
+    scrape.pages = None
+    if args.page_cache:
+        scrape.pages = pageCache.PageCache(os.path.join(folder, "pageCache"))
+    scrape.crawlMode = args.run
+    scrape.workers = args.workers
+    scrape.parseWorkers = args.parse_workers
+    scrape.defaultDelay = args.polite_delay
+    scrape.title = "benchCrawl"
+
+    maxDepth = args.max_depth
+    if maxDepth == None:
+        maxDepth = args.depth + 1
+
+    start = time.perf_counter()
+    if args.run == "sharded":
+        pagesFetched = runShards(args, folder, maxDepth)
+    elif args.run == "shard-resume":
+        pagesFetched = runShards(args, folder, maxDepth, args.kill_after)
+    else:
+        scrape.runSpider([args.start], maxDepth)
+        pagesFetched = sum(value for (kind, status), value in metrics.requests.items() if kind == "page")
+    wall = time.perf_counter() - start
+    # wait for the parse pool's workers to exit, so their CPU time gets counted
+    deadline = time.monotonic() + 10
+    while len(multiprocessing.active_children()) > 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    expanded = sum(1 for v in scrape.G.V if v.color == "black")
+    logger.flush()
+    return {
+        "mode": args.run,
+        "seconds": wall,
+        "pagesFetched": pagesFetched,
+        "pagesExpanded": expanded,
+        "pagesPerSecond": pagesFetched / wall if wall > 0 else 0,
+        "cpuSeconds": usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime,
+        # ru_maxrss is in KiB on Linux, and bytes on macOS
+        "peakRssMiB": max(usage.ru_maxrss, children.ru_maxrss) / (2**20 if sys.platform == "darwin" else 2**10),
+        "vertices": len(scrape.G.V),
+        "edges": len(scrape.G.E),
+        "weight": sum(e.weight for e in scrape.G.E)
+    }
+
+# Runs the crawl as args.shards processes forked off this one (see shard.py), merges them into
+# scrape.G, and returns how many pages they fetched between them.
+# With killAfter, the shards get killed (as in kill -9) after that many seconds, and then
+# resumed from their checkpoints (the pages fetched before the kill don't get counted)
+def runShards(args, folder, maxDepth, killAfter=None):
+    import metrics
+    import pageCache
+    import scrape
+    import shard
+
+    # (the shards save their graphs and checkpoints under output/)
+    os.chdir(folder)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    def runOne(index, resume):
+        if args.page_cache:
+            scrape.pages = pageCache.PageCache(os.path.join(folder, "pageCache", f"shard{index}"))
+        shard.runShard(scrape.title, index, args.shards, [args.start], maxDepth, resume)
+        results.put(sum(value for (kind, status), value in metrics.requests.items() if kind == "page"))
+
+    if killAfter != None:
+        processes = [context.Process(target=runOne, args=(index, False)) for index in range(args.shards)]
+        for process in processes:
+            process.start()
+        time.sleep(killAfter)
+        for process in processes:
+            process.kill()
+            process.join()
+        # (in case some of them finished first)
+        while not results.empty():
+            results.get()
+
+    processes = [context.Process(target=runOne, args=(index, killAfter != None)) for index in range(args.shards)]
+    for process in processes:
+        process.start()
+    pagesFetched = sum(results.get() for process in processes)
+    for process in processes:
+        process.join()
+    shard.merge(scrape.title, args.shards, scrape.G)
+    return pagesFetched
+
+# Runs one crawl in a new process, and returns its results
+def runChild(argv, mode, proxy, start):
+    command = [sys.executable, os.path.abspath(__file__)] + argv + ["--run", mode, "--proxy", proxy, "--start", start]
+    output = subprocess.run(command, capture_output=True, text=True)
+    for line in output.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{mode} crawl failed:\n{output.stderr[-2000:]}")
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    args = parseArgs(argv)
+
+    # the child process: just do the crawl
+    if args.run != None:
+        print("RESULT " + json.dumps(runCrawl(args)))
+        sys.exit(0)
+
+    web = makeWeb(args)
+    server = syntheticWeb.serve(web)
+    proxy = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"{len(web)} pages on {len(web.domains)} sites, starting from {web.startUrl()}")
+
+    results = []
+    print(f"{'mode':>12} {'seconds':>9} {'pages':>7} {'pages/s':>9} {'cpu s':>8} {'peak RSS MiB':>13} {'V':>7} {'E':>8} {'weight':>8}")
+    for mode in args.modes.split(","):
+        result = runChild(argv, mode, proxy, web.startUrl())
+        results.append(result)
+        print(f"{mode:>12} {result['seconds']:>9.2f} {result['pagesFetched']:>7} {result['pagesPerSecond']:>9.1f} "
+              f"{result['cpuSeconds']:>8.2f} {result['peakRssMiB']:>13.1f} {result['vertices']:>7} {result['edges']:>8} "
+              f"{result['weight']:>8}")
+    server.shutdown()
+
+    # every mode should have found the same graph as the first one
+    mismatched = [result["mode"] for result in results
+                  if (result["vertices"], result["edges"], result["weight"]) != (results[0]["vertices"], results[0]["edges"], results[0]["weight"])]
+    if len(mismatched) > 0:
+        print(f"WARNING: {', '.join(mismatched)} found a different graph than {results[0]['mode']}")
+
+    if args.json != None:
+        with open(args.json, "w") as f:
+            json.dump({"settings": {key: value for key, value in vars(args).items() if key not in ("run", "proxy", "start")},
+                       "results": results}, f, indent=4)
+    if args.check and len(mismatched) > 0:
+        sys.exit(1)
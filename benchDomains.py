@@ -0,0 +1,82 @@
+import random
+import sys
+import time
+
+import domainMatcher
+import urlTable
+
+# Benchmark for filtering links against the untrackedDomains list.
+# Compares the old way (checking the url against every entry in the list) with
+# domainMatcher, for a made up blocklist of n domains, and counts how many urls
+# each one blocks (the old substring check blocks some it shouldn't, ex: "x.com"
+# in "https://dropbox.com/").
+#
+# usage: python benchDomains.py [blocklist size] [number of urls]
+
+words = ["blog", "news", "shop", "mail", "cloud", "photo", "book", "code", "art", "web",
+         "dev", "home", "zone", "garden", "notes", "site", "space", "link", "box", "hub"]
+tlds = ["com", "net", "org", "dev", "io", "co.uk", "site", "zone"]
+
+
+def makeDomain(rng):
+    return rng.choice(words) + rng.choice(words) + str(rng.randrange(1000)) + "." + rng.choice(tlds)
+
+# Returns (blocklist, urls). About a quarter of the urls are on (subdomains of) blocked domains
+def makeData(nBlocked, nUrls, seed=0):
+    rng = random.Random(seed)
+    blocked = [makeDomain(rng) for i in range(nBlocked)] + [".gov", ".edu"]
+    urls = []
+    for i in range(nUrls):
+        if rng.random() < 0.25:
+            domain = rng.choice(blocked).lstrip(".")
+        else:
+            domain = makeDomain(rng)
+        if rng.random() < 0.5:
+            domain = rng.choice(["www", "docs", "a.b"]) + "." + domain
+        urls.append(f"https://{domain}/post{rng.randrange(100)}/")
+    return blocked, urls
+
+# the old siteCheck()
+def substringCheck(url, blocked):
+    for d in blocked:
+        if d in url:
+            return True
+    return False
+
+# the old countUrls() check
+def endswithCheck(url, blocked):
+    domain = urlTable.splitURL(url)[0]
+    for d in blocked:
+        if domain.endswith(d):
+            return True
+    return False
+
+# Returns (seconds per url, number of urls blocked)
+def run(urls, check):
+    start = time.perf_counter()
+    count = 0
+    for url in urls:
+        if check(url):
+            count += 1
+    return (time.perf_counter() - start) / len(urls), count
+
+
+if __name__ == "__main__":
+    nBlocked = 10_000
+    nUrls = 2_000
+    if len(sys.argv) > 1:
+        nBlocked = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        nUrls = int(sys.argv[2])
+    blocked, urls = makeData(nBlocked, nUrls)
+
+    start = time.perf_counter()
+    matcher = domainMatcher.DomainMatcher(blocked)
+    print(f"{len(blocked)} blocked domains, compiled in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    print(f"{'check':>10} {'us/url':>10} {'blocked':>8}")
+    for name, check in [("substring", lambda url: substringCheck(url, blocked)),
+                        ("endswith", lambda url: endswithCheck(url, blocked)),
+                        ("matcher", matcher.matchesUrl)]:
+        seconds, count = run(urls, check)
+        print(f"{name:>10} {seconds * 1e6:>10.2f} {count:>8}")
@@ -0,0 +1,276 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import graphHandler as gh
+
+# Benchmark for the graph core (graphHandler.Graph).
+# Builds a web-like graph with n edges, timing how long inserts and lookups take, along with
+# the whole-graph operations (exportJson, loadFromJson, graphToDomainGraph, graphToNxGraph).
+# If the hash indexes are doing their job, the time per insert/lookup should stay
+# (roughly) flat as n grows, instead of growing linearly with the size of the graph.
+#
+# The graphs are power-law, like the web: a few pages get linked to (and link out) far more
+# than the rest, and a few domains have far more pages than the rest. (--uniform for the old
+# graphs, where every page is as likely as any other.)
+#
+# It also measures memory, with a second pass under tracemalloc (so it doesn't slow down the
+# timings): how much the graph itself takes up (url strings and all), and the peak extra memory
+# each whole-graph operation needs. (And the peak RSS of the whole process, after each size.)
+# Each size's memory pass runs in a new process: the url table is shared by every Graph, so in
+# this one it would already have all of the urls from the timing pass, and they wouldn't count.
+#
+# usage: python benchGraph.py [n1 n2 ...] [--json results.json] [--uniform] [--no-memory]
+# The json has the settings, the version (git commit) and the results for each size, so runs
+# from different versions can be compared.
+
+sizes = [1_000, 10_000, 100_000, 1_000_000]
+
+# average number of links on a page (so |V| = n / fanout)
+fanout = 10
+
+lookups = 100_000
+
+# how skewed the power-law graphs are (the i'th most popular page/domain gets picked
+# about 1/i^exponent as often as the most popular one)
+pageExponent = 0.8
+domainExponent = 1.0
+
+# the per operation benchmarks (reported in seconds per operation), then the whole-graph ones (in seconds)
+perOpNames = ["addVertex_url", "addEdge", "addEdge_url", "getVertex+in", "getEdge"]
+bulkNames = ["exportJson", "loadFromJson", "graphToDomainGraph", "graphToNxGraph"]
+
+
+# returns n random edges as (u url, v url) between n/fanout made up pages
+def makeEdges(n, seed=0):
+    rng = random.Random(seed)
+    nPages = max(n // fanout, 1)
+    nDomains = max(nPages // 20, 1)
+    urls = [f"https://site{rng.randrange(nDomains)}.example/page{i}/" for i in range(nPages)]
+    edges = set(())
+    while len(edges) < n:
+        edges.add((urls[rng.randrange(nPages)], urls[rng.randrange(nPages)]))
+    return urls, list(edges)
+
+# Returns weights for picking from n things, where the i'th most popular gets about 1/i^exponent
+# (in a random order, so popularity has nothing to do with the number in the url)
+def powerLaw(rng, n, exponent):
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+# same as makeEdges(), but with power-law in/out degrees and domain sizes
+def makePowerLawEdges(n, seed=0):
+    rng = np.random.default_rng(seed)
+    nPages = max(n // fanout, 1)
+    nDomains = max(nPages // 20, 1)
+    domains = rng.choice(nDomains, size=nPages, p=powerLaw(rng, nDomains, domainExponent))
+    urls = [f"https://site{d}.example/page{i}/" for i, d in enumerate(domains)]
+
+    outWeights = powerLaw(rng, nPages, pageExponent)
+    inWeights = powerLaw(rng, nPages, pageExponent)
+    keys = np.zeros(0, dtype=np.int64)
+    # there's only so many edges between nPages pages
+    n = min(n, nPages * nPages)
+    while len(keys) < n:
+        extra = int((n - len(keys)) * 1.2) + 10
+        u = rng.choice(nPages, size=extra, p=outWeights)
+        v = rng.choice(nPages, size=extra, p=inWeights)
+        keys = np.unique(np.concatenate([keys, u * nPages + v]))
+    keys = rng.permutation(keys)[:n]
+    return urls, [(urls[key // nPages], urls[key % nPages]) for key in keys.tolist()]
+
+# times fn() and returns the number of seconds it took
+def timeIt(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+# runs fn() under tracemalloc, and returns the most extra memory it used at once (in bytes)
+def peakMemory(fn):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    fn()
+    return tracemalloc.get_traced_memory()[1] - before
+
+# Returns {name: fn, ...} for each of the benchmarks, in the order they have to run
+# (each one works on the graph the ones before it built).
+# With ownUrls, the vertices get their own copies of the url strings, like in a crawl (where
+# each url comes off the page it was found on), so the graph's memory includes them
+def operations(urls, edges, ownUrls=False):
+    G = gh.Graph()
+    rng = random.Random(1)
+    probes = [urls[rng.randrange(len(urls))] for i in range(lookups)]
+    # half of the edges go in as Edge objects (like the spiders do), and half by url
+    half = len(edges) // 2
+    saved = {}
+
+    def insertVertices():
+        for url in urls:
+            if ownUrls:
+                url = (url + " ")[:-1]
+            G.addVertex_url(url)
+
+    def insertEdges():
+        for u, v in edges[:half]:
+            G.addEdge(gh.Edge(G.getVertex(u), G.getVertex(v)))
+
+    def insertEdgesByUrl():
+        for u, v in edges[half:]:
+            G.addEdge_url(u, v)
+
+    def lookupVertices():
+        for url in probes:
+            G.getVertex(url)
+            url in G
+
+    def lookupEdges():
+        for u, v in edges[:lookups]:
+            G.getEdge(u, v)
+
+    def exportJson():
+        saved["json"] = G.exportJson()
+
+    def loadFromJson():
+        gh.Graph().loadFromJson(saved["json"])
+
+    def domainGraph():
+        gh.graphToDomainGraph(G)
+
+    def nxGraph():
+        gh.graphToNxGraph(G)
+
+    ops = {
+        "addVertex_url": (insertVertices, len(urls)),
+        "addEdge": (insertEdges, half),
+        "addEdge_url": (insertEdgesByUrl, len(edges) - half),
+        "getVertex+in": (lookupVertices, len(probes)),
+        "getEdge": (lookupEdges, min(lookups, len(edges))),
+        "exportJson": (exportJson, 1),
+        "loadFromJson": (loadFromJson, 1),
+        "graphToDomainGraph": (domainGraph, 1),
+        "graphToNxGraph": (nxGraph, 1),
+    }
+    return G, ops
+
+def bench(n, uniform=False, memory=True):
+    if uniform:
+        urls, edges = makeEdges(n)
+    else:
+        urls, edges = makePowerLawEdges(n)
+
+    G, ops = operations(urls, edges)
+    times = {}
+    for name, (fn, count) in ops.items():
+        times[name] = timeIt(fn) / count
+    result = {"edges": len(G.E), "vertices": len(G.V), "domains": len(G.domainPages()), "seconds": times}
+    del G, ops
+
+    if memory:
+        result["memoryBytes"] = runMemoryPass(n, uniform)
+    # the most this process has used so far (so it only grows from one size to the next)
+    # ru_maxrss is in KiB on Linux, and bytes on macOS
+    result["peakRssMiB"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+    return result
+
+# Runs the benchmarks again under tracemalloc, and returns the memory they took
+# ({"graph": bytes, name: peak bytes, ...}). Only makes sense in a new process (see runMemoryPass())
+def memoryPass(n, uniform=False):
+    if uniform:
+        urls, edges = makeEdges(n)
+    else:
+        urls, edges = makePowerLawEdges(n)
+
+    G, ops = operations(urls, edges, ownUrls=True)
+    tracemalloc.start()
+    mem = {}
+    for name, (fn, count) in ops.items():
+        if name in bulkNames:
+            mem[name] = peakMemory(fn)
+        else:
+            fn()
+        # the graph is done once the inserts are
+        if name == "addEdge_url":
+            mem["graph"] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return mem
+
+# Runs memoryPass() for n edges in a new process, and returns what it found
+def runMemoryPass(n, uniform=False):
+    command = [sys.executable, os.path.abspath(__file__), str(n), "--memory-pass"]
+    if uniform:
+        command.append("--uniform")
+    output = subprocess.run(command, capture_output=True, text=True)
+    for line in output.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"memory pass for {n} edges failed:\n{output.stderr[-2000:]}")
+
+# Returns the git commit of this checkout (None if it isn't one)
+def version():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+    except OSError:
+        return None
+    if output.returncode != 0:
+        return None
+    return output.stdout.strip()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the graph core on web-like graphs")
+    parser.add_argument("sizes", type=int, nargs="*", default=sizes, help="numbers of edges")
+    parser.add_argument("--json", default=None, help="write the results to this json file")
+    parser.add_argument("--uniform", action="store_true", help="uniformly random graphs instead of power-law ones")
+    parser.add_argument("--no-memory", action="store_true", help="skip the (slow) memory pass")
+    # (used internally, to run the memory pass in its own process)
+    parser.add_argument("--memory-pass", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # the child process: just measure the memory
+    if args.memory_pass:
+        for n in args.sizes:
+            print("RESULT " + json.dumps(memoryPass(n, args.uniform)))
+        sys.exit(0)
+
+    print(f"{'edges':>10} {'vertices':>10} " + " ".join(f"{name:>14}" for name in perOpNames))
+    results = []
+    for n in args.sizes:
+        result = bench(n, args.uniform, not args.no_memory)
+        results.append(result)
+        # microseconds per operation
+        print(f"{result['edges']:>10} {result['vertices']:>10} " + " ".join(f"{result['seconds'][name] * 1e6:>12.3f}us" for name in perOpNames))
+
+    print()
+    print(f"{'edges':>10} " + " ".join(f"{name:>20}" for name in bulkNames) + f" {'graph':>12}")
+    for result in results:
+        # seconds (and peak MiB, if we measured it)
+        cells = []
+        for name in bulkNames:
+            cell = f"{result['seconds'][name]:.3f}s"
+            if "memoryBytes" in result:
+                cell += f" {result['memoryBytes'][name] / 2**20:.1f}MiB"
+            cells.append(f"{cell:>20}")
+        graphMemory = ""
+        if "memoryBytes" in result:
+            graphMemory = f"{result['memoryBytes']['graph'] / 2**20:.1f}MiB"
+        print(f"{result['edges']:>10} " + " ".join(cells) + f" {graphMemory:>12}")
+
+    if args.json != None:
+        with open(args.json, "w") as f:
+            json.dump({"version": version(), "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "python": platform.python_version(),
+                       "settings": {"fanout": fanout, "lookups": lookups, "uniform": args.uniform,
+                                    "pageExponent": pageExponent, "domainExponent": domainExponent},
+                       "results": results}, f, indent=4)
+        print(f"\nSaved to {args.json}")
@@ -0,0 +1,89 @@
+import glob
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import scrape
+
+# Benchmark for pulling links out of pages, comparing BeautifulSoup against the
+# streaming extractor (linkExtractor). Runs scrape.extractLinks() over a folder of
+# saved html pages with each parser, checks that they find exactly the same
+# inlinks/outlinks, and reports pages/sec and peak memory.
+#
+# usage: python benchLinks.py [folder of .html files]
+# The name of each file is used as the page's url (with "_" for "/"), ex:
+#   example.com_blog_post1_.html -> https://example.com/blog/post1/
+# Without a folder, it makes up a corpus of pages to run on.
+
+parsers = ["bs4", "stream"]
+
+
+# Returns [(url, html), ...] for every .html file in the folder
+def loadCorpus(folder):
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.html"))):
+        name = os.path.basename(path)[:-len(".html")]
+        with open(path, encoding="utf-8", errors="replace") as f:
+            corpus.append(("https://" + name.replace("_", "/"), f.read()))
+    return corpus
+
+# Returns [(url, html), ...] for n made up blog-ish pages of roughly `size` characters
+def makeCorpus(n=200, size=100_000, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(n):
+        domain = f"site{rng.randrange(20)}.example"
+        parts = ["<!DOCTYPE html><html><head><title>Post</title>",
+                 "<style>a { color: red; }</style>",
+                 "<script>var s = '<a href=\"/not-a-link\">';</script></head><body>"]
+        length = 0
+        while length < size:
+            choice = rng.randrange(4)
+            if choice == 0:
+                part = f'<p>Some text with <a href="/post{rng.randrange(500)}/?ref=x#top">an inlink</a> in it.</p>'
+            elif choice == 1:
+                part = f'<li><a class="ext" href="https://other{rng.randrange(200)}.example/page{rng.randrange(50)}">out</a></li>'
+            elif choice == 2:
+                part = "<div><span>" + "Lorem ipsum dolor sit amet. " * rng.randrange(1, 20) + "</span></div>"
+            else:
+                part = f'<!-- <a href="/commented-out"> --><img src="/img{rng.randrange(100)}.png" alt="pic"/>'
+            parts.append(part)
+            length += len(part)
+        parts.append("</body></html>")
+        corpus.append((f"https://{domain}/post{i}/", "".join(parts)))
+    return corpus
+
+# Runs extractLinks over the corpus with the given parser.
+# Returns (seconds, peak bytes allocated, results)
+def run(corpus, parser):
+    scrape.linkParser = parser
+    results = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    for url, html in corpus:
+        results.append(scrape.extractLinks(html, url))
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        corpus = loadCorpus(sys.argv[1])
+    else:
+        corpus = makeCorpus()
+    totalBytes = sum(len(html) for url, html in corpus)
+    print(f"{len(corpus)} pages, {totalBytes / 1e6:.1f} MB of html")
+
+    # Note: tracemalloc slows everything down a bit, but it does so for both parsers
+    baseline = None
+    print(f"{'parser':>8} {'pages/sec':>10} {'MB/sec':>8} {'peak MB':>8}  same links")
+    for parser in parsers:
+        seconds, peak, results = run(corpus, parser)
+        if baseline == None:
+            baseline = results
+        same = results == baseline
+        print(f"{parser:>8} {len(corpus) / seconds:>10.1f} {totalBytes / 1e6 / seconds:>8.2f} {peak / 1e6:>8.2f}  {same}")
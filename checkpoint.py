@@ -0,0 +1,214 @@
+import glob
+import json
+import os
+
+import logger
+import graphHandler as gh
+import urlTable
+
+# Write-ahead log for a Graph, so a crawl can be backed up as it goes instead of
+# dumping the whole graph to disk every so often.
+#
+# Every new vertex, change to a vertex, new edge, and weight increment gets appended
+# to a log file as it happens (one json list per line):
+#   ["V", url, color, dist]     vertex added or changed
+#   ["E", u url, v url, weight] edge added, or its weight increased by `weight`
+#   ["Q", url, depth, retry]    page queued up in the crawl's frontier (see frontier.py)
+#   ["D", url]                  page done, and out of the frontier
+#   ["W", domain, until]        domain cooling down until time.time() == until
+#   ["C"]                       commit: everything before this is a finished unit of work
+# The crawler commits once it's done with a page, so if the crawl gets killed halfway
+# through a page, that half a page is thrown away when we load it back up.
+#
+# Once the log gets long, it's compacted: the whole graph is written out as a snapshot
+# (the same json Graph.save() writes, plus the frontier) and a fresh, empty log is started.
+# Each snapshot/log pair has a generation number, ex:
+#   output/temp/MyCrawl.3.snapshot.json
+#   output/temp/MyCrawl.3.wal
+# so the graph is always the latest snapshot, plus whatever was committed to its log.
+
+
+class CheckpointLog:
+    # prefix is where the files go, ex: "output/temp/MyCrawl"
+    # Starts a new generation with a snapshot of whatever is already in G
+    def __init__(self, G, prefix, compactEvery=500_000):
+        self.G = G
+        self.prefix = prefix
+        # compact the log once it has this many records in it
+        self.compactEvery = compactEvery
+        self.gen = latestGeneration(prefix)
+        if self.gen == None:
+            self.gen = 0
+        self.records = 0
+        self.file = None
+
+        directory = os.path.dirname(prefix)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self.compact()
+
+    # log that a vertex was added, or that its color or dist changed
+    def vertex(self, u):
+        self.__write(["V", u.url, u.color, u.dist])
+
+    # log that an edge was added (with the given weight), or that its weight went up by that much
+    def edge(self, u_url, v_url, weight):
+        self.__write(["E", u_url, v_url, weight])
+
+    # log that a page was queued up in the frontier, at the given depth
+    def queued(self, url, depth, retry):
+        self.__write(["Q", url, depth, retry])
+
+    # log that a page is done, and out of the frontier
+    def dequeued(self, url):
+        self.__write(["D", url])
+
+    # log that a domain is cooling down until time.time() == until
+    def cooling(self, domain, until):
+        self.__write(["W", domain, until])
+
+    # marks everything logged so far as done, and makes sure it's been handed to the OS.
+    # If the log has gotten long enough, it gets compacted into a new snapshot
+    def commit(self):
+        self.file.write('["C"]\n')
+        self.file.flush()
+        if self.records >= self.compactEvery:
+            self.compact()
+
+    # writes a snapshot of the whole graph, and starts a new (empty) log after it
+    def compact(self):
+        gen = self.gen + 1
+        logger.write(f"Compacting checkpoint log into snapshot {self.prefix}.{gen}")
+        writeSnapshot(self.G, snapshotPath(self.prefix, gen))
+
+        # start the new log, then we don't need the old files anymore
+        if self.file != None:
+            self.file.close()
+        self.file = open(walPath(self.prefix, gen), "a")
+        self.gen = gen
+        self.records = 0
+        removeGenerations(self.prefix, below=gen)
+
+    # stops logging. If remove is set, the checkpoint files are deleted
+    # (ex: once the crawl has finished and been saved properly)
+    def close(self, remove=False):
+        self.file.close()
+        if remove:
+            removeGenerations(self.prefix, below=self.gen + 1)
+
+    def __write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.records += 1
+
+
+# Returns the number of the newest snapshot for prefix, or None if there isn't one
+def latestGeneration(prefix):
+    gens = [gen for gen, path in listGenerations(prefix, ".snapshot.json")]
+    if len(gens) == 0:
+        return None
+    return max(gens)
+
+# Returns True if there's a checkpoint to load for prefix
+def exists(prefix):
+    return latestGeneration(prefix) != None
+
+# Loads the latest checkpoint for prefix into G: the snapshot, then the committed part of its log
+def restore(G, prefix):
+    gen = latestGeneration(prefix)
+    with open(snapshotPath(prefix, gen)) as f:
+        myJson = json.load(f)
+        G.loadFromJson(myJson)
+        if "frontier" in myJson:
+            G.frontier.loadFromJson(myJson["frontier"])
+
+    path = walPath(prefix, gen)
+    if not os.path.exists(path):
+        return
+    replayed = 0
+    for batch in committedBatches(path):
+        for record in batch:
+            replay(G, record)
+        replayed += len(batch)
+    logger.write(f"Replayed {replayed} records from {path}")
+
+    # pages that were finished after the snapshot need their links cached, like the loader does.
+    # (The depth-first spider commits a page's edges before it's done with the pages under it,
+    # so a gray page can have its edges in too, and it shouldn't get fetched again either)
+    for u in G.V:
+        if not u.isAdjacentCached() and (u.color == "black" or len(G.getOutEdges(u)) > 0):
+            u.setAdjacent([e.v.url for e in G.getOutEdges(u)])
+
+# applies a single log record to G
+def replay(G, record):
+    if record[0] == "V":
+        u = G.addVertex_url(record[1])
+        u.color = record[2]
+        u.dist = record[3]
+    elif record[0] == "E":
+        # same as Graph.addEdge_url(), but with the weight going on a brand new edge too
+        u = G.getVertex(record[1])
+        if u == None:
+            u = gh.Vertex(record[1], G)
+        v = G.getVertex(record[2])
+        if v == None:
+            v = gh.Vertex(record[2], G)
+        G.addEdge(gh.Edge(u, v, record[3]), record[3])
+    elif record[0] == "Q":
+        G.frontier.pending[urlTable.intern(record[1])] = (record[2], record[3])
+    elif record[0] == "D":
+        G.frontier.pending.pop(urlTable.intern(record[1]), None)
+    elif record[0] == "W":
+        G.frontier.cooling[record[1]] = record[2]
+
+# Yields lists of records from the log, one for each commit.
+# Anything after the last commit (or a line cut off halfway through) is skipped
+def committedBatches(path):
+    batch = []
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the crawl was killed in the middle of writing this line
+                break
+            if record[0] == "C":
+                yield batch
+                batch = []
+            else:
+                batch.append(record)
+
+# writes the graph (and its frontier) to path as json, without ever leaving a half written file there
+def writeSnapshot(G, path):
+    myJson = G.exportJson()
+    myJson["frontier"] = G.frontier.exportJson()
+    tempPath = path + ".tmp"
+    with open(tempPath, "w") as f:
+        json.dump(myJson, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tempPath, path)
+
+def snapshotPath(prefix, gen):
+    return f"{prefix}.{gen}.snapshot.json"
+
+def walPath(prefix, gen):
+    return f"{prefix}.{gen}.wal"
+
+# Returns [(gen, path), ...] for all the files of one kind (ex: ".wal") for prefix
+def listGenerations(prefix, suffix):
+    found = []
+    for path in glob.glob(glob.escape(prefix) + ".*" + suffix):
+        gen = path[len(prefix) + 1:-len(suffix)]
+        if gen.isdigit():
+            found.append((int(gen), path))
+    return found
+
+# deletes the snapshots and logs older than generation `below`, along with any half written
+# snapshots (left behind by a crawl that got killed while it was writing one)
+def removeGenerations(prefix, below):
+    for suffix in [".snapshot.json", ".wal"]:
+        for gen, path in listGenerations(prefix, suffix):
+            if gen < below:
+                os.remove(path)
+    for gen, path in listGenerations(prefix, ".snapshot.json.tmp"):
+        os.remove(path)
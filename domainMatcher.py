@@ -0,0 +1,63 @@
+import urlTable
+
+# Matches hosts against a list of domains (ex: the untrackedDomains in config.json).
+#
+# A host matches an entry if it IS that domain, or is a subdomain of it, ex: with
+# "github.com" in the list, "github.com" and "docs.github.com" match, but "notgithub.com"
+# and "github.com.example" don't. Entries with a dot in front (ex: ".org") work the
+# same way, so they block that whole TLD.
+#
+# The entries all go into one set, and checking a host just looks up each of its
+# suffixes ("docs.github.com", "github.com", "com") in it. So it costs one set lookup
+# per label in the host, no matter how long the list is.
+
+
+# Returns host in the form the matcher compares: lowercase, without a port, a login,
+# or a trailing "." ex: "User@Docs.GitHub.com.:443" -> "docs.github.com"
+def normalizeHost(host):
+    host = host.strip().lower()
+    at = host.rfind("@")
+    if at >= 0:
+        host = host[at+1:]
+    # ipv6 addresses have colons of their own, ex: "[::1]:8080"
+    if host.startswith("["):
+        end = host.find("]")
+        if end >= 0:
+            return host[:end+1]
+    colon = host.find(":")
+    if colon >= 0:
+        host = host[:colon]
+    return host.rstrip(".")
+
+
+class DomainMatcher:
+    def __init__(self, domains=()):
+        # ex: {"github.com", "org", ...}
+        self.__suffixes = set(())
+        for d in domains:
+            self.add(d)
+
+    def add(self, domain):
+        domain = normalizeHost(domain).lstrip(".")
+        if domain != "":
+            self.__suffixes.add(domain)
+
+    def __len__(self):
+        return len(self.__suffixes)
+
+    # Returns True if host (ex: "docs.github.com") is one of the domains, or a subdomain of one
+    def matches(self, host):
+        host = normalizeHost(host)
+        suffixes = self.__suffixes
+        if host in suffixes:
+            return True
+        dot = host.find(".")
+        while dot >= 0:
+            if host[dot+1:] in suffixes:
+                return True
+            dot = host.find(".", dot+1)
+        return False
+
+    # Returns True if the domain of url matches (see matches())
+    def matchesUrl(self, url):
+        return self.matches(urlTable.splitURL(url)[0])
@@ -0,0 +1,85 @@
+import time
+
+import urlTable
+
+# The crawl's to-do list: every page that's been queued up to be expanded but isn't done yet
+# (including the ones that are in flight), along with the depth it was queued at and how
+# many times fetching it has failed so far. It also remembers which domains are cooling down.
+#
+# It belongs to a Graph (G.frontier), and every change goes into the graph's checkpoint log
+# along with the vertices and edges, so the checkpoint has everything needed to pick the
+# crawl back up exactly where it stopped (see checkpoint.py).
+class Frontier:
+    def __init__(self, G):
+        self.G = G
+        # ex: {0: (2, 0), ...} (url id -> (depth, retry))
+        self.pending = {}
+        # ex: {"example.com": 1700000000.0, ...} (time.time() when each domain is allowed again)
+        self.cooling = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __contains__(self, u):
+        return u.id in self.pending
+
+    # marks that u is queued up at the given depth (replacing wherever it was queued before)
+    def push(self, u, depth, retry=0):
+        self.pending[u.id] = (depth, retry)
+        if self.G.log != None:
+            self.G.log.queued(u.url, depth, retry)
+
+    # Returns how many times fetching u has failed so far (0 if it isn't queued)
+    def retries(self, u):
+        depth, retry = self.pending.get(u.id, (None, 0))
+        return retry
+
+    # marks that u has been expanded, so it doesn't need doing again
+    def done(self, u):
+        if self.pending.pop(u.id, None) != None and self.G.log != None:
+            self.G.log.dequeued(u.url)
+
+    # marks that domain shouldn't get another request for `delay` seconds
+    def cool(self, domain, delay):
+        until = time.time() + delay
+        self.cooling[domain] = until
+        if self.G.log != None:
+            self.G.log.cooling(domain, until)
+
+    # Returns [(url, depth, retry), ...] for everything still queued, lowest depth first
+    def items(self):
+        items = [(urlTable.url(i), depth, retry) for i, (depth, retry) in self.pending.items()]
+        items.sort(key=lambda item: item[1])
+        return items
+
+    # Returns {depth: number of pages queued at that depth, ...}
+    def depthCounts(self):
+        counts = {}
+        # (copied first, since the metrics read this from another thread while the crawl carries on)
+        for depth, retry in list(self.pending.values()):
+            counts[depth] = counts.get(depth, 0) + 1
+        return counts
+
+    # Returns {domain: seconds, ...} for the domains that still have to wait before their next request
+    def coolingDomains(self, now=None):
+        if now == None:
+            now = time.time()
+        return {domain: until - now for domain, until in self.cooling.items() if until > now}
+
+    def clear(self):
+        self.pending.clear()
+        self.cooling.clear()
+
+    def exportJson(self):
+        now = time.time()
+        return {
+            "pending": [list(item) for item in self.items()],  # ex: [["https://example.com/a/", 2, 0], ...]
+            # (only the domains that haven't finished cooling down yet)
+            "cooling": {domain: until for domain, until in self.cooling.items() if until > now}
+        }
+
+    # loads what exportJson() wrote (without logging any of it)
+    def loadFromJson(self, myJson):
+        for url, depth, retry in myJson["pending"]:
+            self.pending[urlTable.intern(url)] = (depth, retry)
+        self.cooling.update(myJson["cooling"])
@@ -0,0 +1,211 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import graphHandler as gh
+
+# Compact binary file format for a Graph (".wgraph"), for crawls that are too big for json.
+#
+# Every url is stored once, in a string table. Vertex i is string i, and any edge targets
+# that aren't in V come after the vertices. Edges are stored as CSR (compressed sparse row):
+# the edges leaving vertex i are targets[rowOffsets[i]:rowOffsets[i+1]], with their weights
+# at the same positions in weights.
+#
+# Layout (everything little-endian, and each section starts on an 8 byte boundary):
+#   header          magic, then nStrings, nVertices, nEdges, stringBytes, propsBytes (uint64 each)
+#   stringOffsets   uint64[nStrings+1]  string i is stringData[stringOffsets[i]:stringOffsets[i+1]]
+#   rowOffsets      uint64[nVertices+1]
+#   targets         uint32[nEdges]      (string ids)
+#   weights         uint32[nEdges]
+#   dists           int32[nVertices]    (-1 for None)
+#   colors          uint8[nVertices]    (index into COLORS)
+#   stringData      utf-8 bytes
+#   props           json, the extra vertex properties (see Graph.setProperty()), as
+#                   {name: {vertex index: value, ...}, ...}
+#
+# (WGRAPH01 files are the same, just without propsBytes and the props.)
+#
+# GraphFile opens one through mmap, so nothing gets read off the disk until it's used,
+# and the arrays can be used in place (ex: for analysis) without building a Graph at all.
+
+MAGIC = b"WGRAPH02"
+HEADER = struct.Struct("<8s5Q")
+# the first version, which didn't have the props yet
+OLD_MAGIC = b"WGRAPH01"
+OLD_HEADER = struct.Struct("<8s4Q")
+COLORS = gh.COLORS
+
+# (name, typecode) of each array section, in the order they're written
+SECTIONS = [("stringOffsets", "Q"), ("rowOffsets", "Q"), ("targets", "I"),
+            ("weights", "I"), ("dists", "i"), ("colors", "B")]
+
+
+# Writes G to path in the binary format
+def writeGraph(G, path):
+    # give each url an id. Vertices come first, in the same order as V
+    ids = {}
+    urls = []
+    for v in G.V:
+        ids[v.url] = len(urls)
+        urls.append(v.url)
+
+    rowOffsets = array("Q", [0])
+    targets = array("I")
+    weights = array("I")
+    dists = array("i")
+    colors = array("B")
+    props = {}
+    for i, v in enumerate(G.V):
+        for e in G.getOutEdges(v):
+            target = gh.urlOf(e.v)
+            if target not in ids:
+                ids[target] = len(urls)
+                urls.append(target)
+            targets.append(ids[target])
+            weights.append(e.weight)
+        rowOffsets.append(len(targets))
+        dists.append(-1 if v.dist == None else v.dist)
+        colors.append(COLORS.index(v.color))
+        for name, value in G.getProperties(v).items():
+            props.setdefault(name, {})[i] = value
+
+    stringOffsets = array("Q", [0])
+    stringData = bytearray()
+    for url in urls:
+        stringData += url.encode("utf-8")
+        stringOffsets.append(len(stringData))
+    propsData = json.dumps(props).encode("utf-8")
+
+    arrays = {"stringOffsets": stringOffsets, "rowOffsets": rowOffsets, "targets": targets,
+              "weights": weights, "dists": dists, "colors": colors}
+
+    tempPath = path + ".tmp"
+    with open(tempPath, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(urls), len(G.V), len(targets), len(stringData), len(propsData)))
+        for name, typecode in SECTIONS:
+            pad(f)
+            a = arrays[name]
+            if sys.byteorder != "little":
+                a.byteswap()
+            a.tofile(f)
+        pad(f)
+        f.write(stringData)
+        pad(f)
+        f.write(propsData)
+    os.replace(tempPath, path)
+
+# pads the file with zeros up to the next multiple of 8 bytes
+def pad(f):
+    f.write(b"\0" * (-f.tell() % 8))
+
+
+# A graph file opened through mmap. The arrays (stringOffsets, rowOffsets, targets, weights,
+# dists, colors) are memoryviews straight onto the file
+class GraphFile:
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise ValueError("GraphFile needs a little-endian machine (try the json export instead)")
+        self.path = path
+        self.__file = open(path, "rb")
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__view = memoryview(self.__map)
+
+        magic = self.__map[:len(MAGIC)]
+        if magic == MAGIC:
+            magic, self.numStrings, self.numVertices, self.numEdges, stringBytes, propsBytes = HEADER.unpack_from(self.__map)
+            offset = HEADER.size
+        elif magic == OLD_MAGIC:
+            magic, self.numStrings, self.numVertices, self.numEdges, stringBytes = OLD_HEADER.unpack_from(self.__map)
+            propsBytes = 0
+            offset = OLD_HEADER.size
+        else:
+            raise ValueError(f"{path} is not a graph file")
+
+        lengths = {"stringOffsets": self.numStrings + 1, "rowOffsets": self.numVertices + 1,
+                   "targets": self.numEdges, "weights": self.numEdges,
+                   "dists": self.numVertices, "colors": self.numVertices}
+        for name, typecode in SECTIONS:
+            offset += -offset % 8
+            size = lengths[name] * array(typecode).itemsize
+            setattr(self, name, self.__view[offset:offset + size].cast(typecode))
+            offset += size
+        offset += -offset % 8
+        self.stringData = self.__view[offset:offset + stringBytes]
+        offset += stringBytes
+        offset += -offset % 8
+        self.propsData = self.__view[offset:offset + propsBytes]
+
+    # Returns the url with the given id
+    def url(self, i):
+        return str(self.stringData[self.stringOffsets[i]:self.stringOffsets[i + 1]], "utf-8")
+
+    # Returns (targets, weights) for the edges leaving vertex i
+    def outEdges(self, i):
+        start = self.rowOffsets[i]
+        end = self.rowOffsets[i + 1]
+        return self.targets[start:end], self.weights[start:end]
+
+    def color(self, i):
+        return COLORS[self.colors[i]]
+
+    def dist(self, i):
+        if self.dists[i] < 0:
+            return None
+        return self.dists[i]
+
+    # Returns the extra vertex properties, ex: {"pagerank": {0: 0.0012, ...}, ...} (name -> vertex index -> value)
+    def properties(self):
+        if len(self.propsData) == 0:
+            return {}
+        props = json.loads(str(self.propsData, "utf-8"))
+        # (json keys are always strings)
+        return {name: {int(i): value for i, value in column.items()} for name, column in props.items()}
+
+    # Loads everything into G (the same as Graph.loadFromJson() does with the json version)
+    def toGraph(self, G):
+        with gh.pausedGC():
+            return self.__toGraph(G)
+
+    def __toGraph(self, G):
+        urls = [self.url(i) for i in range(self.numStrings)]
+
+        vertices = []
+        for i in range(self.numVertices):
+            u = gh.Vertex(urls[i], G)
+            u.color = self.color(i)
+            u.dist = self.dist(i)
+            vertices.append(G.addVertex(u))
+        # edge targets that never got a vertex of their own share one Vertex each
+        for i in range(self.numVertices, self.numStrings):
+            vertices.append(gh.Vertex(urls[i], G))
+
+        for i in range(self.numVertices):
+            u = vertices[i]
+            targets, weights = self.outEdges(i)
+            G.addEdges(u, [vertices[t] for t in targets], weights)
+            # only pages we've actually fetched get their links cached
+            if u.color == "black":
+                u.setAdjacentIds([vertices[t].id for t in targets])
+
+        for name, column in self.properties().items():
+            G.setProperty(name, {vertices[i]: value for i, value in column.items()})
+        return G
+
+    def close(self):
+        # the views have to go before the map can be closed
+        for name, typecode in SECTIONS:
+            getattr(self, name).release()
+        self.stringData.release()
+        self.propsData.release()
+        self.__view.release()
+        self.__map.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,11 +1,21 @@
 import networkx as nx
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import random
 import pickle
 import shutil
 import json
+import os
+import gc
+import contextlib
+
+from array import array
 
 import logger
+import urlTable
+import frontier
+import layout
+import profiler
 
 # Classes
 
@@ -14,67 +24,148 @@ class Graph:
         self.V = []
         self.E = []
 
+        # Hash indexes over V and E, so lookups don't have to scan the lists.
+        # V and E are still the source of truth for iteration (and keep their order),
+        # so anything that adds to the graph must go through the add*() methods
+        # instead of appending to V or E directly.
+        # They're keyed by url id (see urlTable.py), ex: with "a" = 0 and "j" = 9
+        self.__vertexIndex = {} # ex: {0: <Vertex a>, ...}
+        self.__edgeIndex = {}   # ex: {edgeKey(0, 9): <Edge a->j>, ...}
+        self.__outEdges = {}    # ex: {0: [<Edge a->j>, <Edge a->k>], ...}
+
+        # The domain graph, kept up to date as pages and edges get added (see domainGraph()).
+        # They're keyed by domain id (see urlTable.py), ex: with "a.com" = 0 and "j.net" = 3
+        self.__domainPages = {} # ex: {0: 12, ...} (number of pages in V on each domain)
+        self.__domainEdges = {} # ex: {edgeKey(0, 3): 5, ...} (number of page edges from one domain to the other)
+
+        # Extra properties of the vertices (ex: what analytics.py works out), a column per property.
+        # They're saved along with color and dist in V_props
+        self.__props = {}       # ex: {"pagerank": {0: 0.0012, ...}, ...} (property -> url id -> value)
+
+        # checkpoint.CheckpointLog that every change gets written to, if there is one
+        self.log = None
+        # the pages a crawl of this graph still has to get to (see frontier.py)
+        self.frontier = frontier.Frontier(self)
+
     # checks if a given VERTEX is part of the Graph
     def __contains__(self, element):
-        # Vertex
-        # if it's a string, create a new vertex with that url value
-        if type(element) == str:
-            element = Vertex(element)
-        
-        if type(element) == Vertex:
-            #iterate through all elements in V. If one of the elements shares a url, it contains it
-            for v in self.V:
-                if v.url == element.url:
-                    return True
-            # otherwise, it does not contain it
-            return False
+        # Vertex, or a string (url)
+        if type(element) == str or type(element) == Vertex:
+            return idOf(element) in self.__vertexIndex
 
     # Returns a vertex with the same url as the element, or else returns None
     def getVertex(self, element):
-        # Vertex
-        # if it's a string, create a new vertex with that url value
-        if type(element) == str:
-            element = Vertex(element)
-        
-        if type(element) == Vertex:
-            #iterate through all elements in V. If one of the elements shares a url, it contains it
-            for v in self.V:
-                if v.url == element.url:
-                    return v
-            # otherwise, it does not contain it
-            return None
-    
+        # Vertex, or a string (url)
+        if type(element) == str or type(element) == Vertex:
+            return self.__vertexIndex.get(idOf(element))
+
+    # add the given Vertex, unless one with the same url already exists.
+    # Returns the Vertex that is actually in the graph
+    def addVertex(self, u):
+        v = self.__vertexIndex.get(u.id)
+        if v != None:
+            return v
+        self.V.append(u)
+        self.__vertexIndex[u.id] = u
+        d = urlTable.domainId(u.id)
+        self.__domainPages[d] = self.__domainPages.get(d, 0) + 1
+        if self.log != None:
+            self.log.vertex(u)
+        return u
+
     # add a Vertex with the given url, unless it already exists
     def addVertex_url(self, url, dist=None):
-        for u in self.V:
-            # if the vertex is already there
-            if u.url == url:
-                # update the dist if a shorter path was found
-                if dist != None and dist < u.dist:
-                    u.dist = dist
-                return u
+        u = self.__vertexIndex.get(urlTable.intern(url))
+        # if the vertex is already there
+        if u != None:
+            # update the dist if a shorter path was found
+            if dist != None and (u.dist == None or dist < u.dist):
+                u.dist = dist
+                self.logVertex(u)
+            return u
         # if it's new, add it
         u = Vertex(url, self)
-        self.V.append(u)
-        return u
+        u.dist = dist
+        return self.addVertex(u)
+
+    # Returns the edge from u to v (Vertex or url), or else returns None
+    def getEdge(self, u, v):
+        u = idOf(u)
+        v = idOf(v)
+        if u == None or v == None:
+            return None
+        return self.__edgeIndex.get(edgeKey(u, v))
+
+    # Returns a list of all the edges leaving u (Vertex or url).
+    # Don't modify the returned list, it's the graph's own index
+    def getOutEdges(self, u):
+        return self.__outEdges.get(idOf(u), [])
 
     # adds the edge if it doesn't exist, or else increments the weight
     # if you specify addWeight, it can add the same edge that many times
     # ex: addWeight=7 means add that edge 7 times, instead of having to
     # call the function multiple times
     def addEdge(self, myEdge, addWeight=1):
+        u = internOf(myEdge.u)
+        key = edgeKey(u, internOf(myEdge.v))
         # look for if the edge already exists
-        for e in self.E:
-            # if it does, increment the weight
-            if e.u == myEdge.u and e.v == myEdge.v:
-                e.weight += addWeight
-                return
-        # otherwise, add it to the list
+        e = self.__edgeIndex.get(key)
+        # if it does, increment the weight
+        if e != None:
+            e.weight += addWeight
+            if self.log != None:
+                self.log.edge(urlOf(myEdge.u), urlOf(myEdge.v), addWeight)
+            return
+        # otherwise, add it to the list (and the indexes)
+        if self.log != None:
+            self.log.edge(urlOf(myEdge.u), urlOf(myEdge.v), myEdge.weight)
         self.E.append(myEdge)
+        self.__edgeIndex[key] = myEdge
+        if u in self.__outEdges:
+            self.__outEdges[u].append(myEdge)
+        else:
+            self.__outEdges[u] = [myEdge]
+        self.__countDomainEdge(u, internOf(myEdge.v))
+
+    # Adds an edge from u to each Vertex in vs, with the matching weight from weights.
+    # Does the same thing as calling addEdge() for each one, just without the per-call
+    # overhead, for when we're loading lots of edges at once
+    def addEdges(self, u, vs, weights):
+        # the checkpoint log needs to hear about each edge, so just go one at a time
+        if self.log != None:
+            for v, weight in zip(vs, weights):
+                self.addEdge(Edge(u, v, weight), weight)
+            return
+
+        edgeIndex = self.__edgeIndex
+        if u.id not in self.__outEdges:
+            self.__outEdges[u.id] = []
+        outEdges = self.__outEdges[u.id]
+        for v, weight in zip(vs, weights):
+            key = edgeKey(u.id, v.id)
+            e = edgeIndex.get(key)
+            if e != None:
+                e.weight += weight
+                continue
+            e = Edge(u, v, weight)
+            edgeIndex[key] = e
+            outEdges.append(e)
+            self.E.append(e)
+            self.__countDomainEdge(u.id, v.id)
+
+    # counts a new page edge (between the pages with url ids u and v) towards the domain graph
+    def __countDomainEdge(self, u, v):
+        key = edgeKey(urlTable.domainId(u), urlTable.domainId(v))
+        self.__domainEdges[key] = self.__domainEdges.get(key, 0) + 1
 
     # Function overload that takes urls instead of an Edge object
     # adds the edge if it doesn't exist, or else increments the weight
     def addEdge_url(self, u_url, v_url, addWeight=1):
+        # if the edge is already there, we don't need the vertices at all
+        e = self.__edgeIndex.get(edgeKey(urlTable.intern(u_url), urlTable.intern(v_url)))
+        if e != None:
+            self.addEdge(e, addWeight)
+            return
         # check for existing vertices before creating new ones
         u = self.getVertex(u_url)
         if u == None:
@@ -82,9 +173,65 @@ class Graph:
         v = self.getVertex(v_url)
         if v == None:
             v = Vertex(v_url, self)
-        myEdge = Edge(u, v)
+        # a new edge starts off with the weight we're adding
+        myEdge = Edge(u, v, addWeight)
         self.addEdge(myEdge, addWeight)
 
+    # writes u to the checkpoint log (if there is one). Call this after changing u's color or dist
+    def logVertex(self, u):
+        if self.log != None:
+            self.log.vertex(u)
+
+    # marks the changes so far as a finished unit of work in the checkpoint log (if there is one)
+    def commit(self):
+        if self.log != None:
+            self.log.commit()
+
+    # Returns the domain graph: one vertex for each domain with a page in V, and an edge between
+    # two domains weighted by how many page edges go from one to the other.
+    # It's kept up to date as the graph grows, so this only costs as much as the domain graph itself
+    def domainGraph(self):
+        GG_domain = Graph()
+        vertices = {}
+        for d in self.__domainPages:
+            vertices[d] = GG_domain.addVertex(Vertex(urlTable.domainName(d)))
+        for key, weight in self.__domainEdges.items():
+            u = vertices.get(key >> 32)
+            if u == None:
+                u = Vertex(urlTable.domainName(key >> 32))
+            v = vertices.get(key & 0xFFFFFFFF)
+            if v == None:
+                v = Vertex(urlTable.domainName(key & 0xFFFFFFFF))
+            GG_domain.addEdge(Edge(u, v, weight), weight)
+        return GG_domain
+
+    # Returns the number of pages in V on each domain, ex: {"example.com": 12, ...}
+    def domainPages(self):
+        return {urlTable.domainName(d): count for d, count in self.__domainPages.items()}
+
+    # sets a property for a bunch of vertices at once.
+    # values is {vertex or url: value, ...}, ex: setProperty("pagerank", {"https://example.com/": 0.0012})
+    def setProperty(self, name, values):
+        column = self.__props.setdefault(name, {})
+        for element, value in values.items():
+            column[internOf(element)] = value
+
+    # Returns the value of the property for the vertex (or url), or default if it doesn't have one
+    def getProperty(self, element, name, default=None):
+        column = self.__props.get(name)
+        if column == None:
+            return default
+        return column.get(idOf(element), default)
+
+    # Returns all of the extra properties of the vertex (or url), ex: {"pagerank": 0.0012, "inDegree": 7}
+    def getProperties(self, element):
+        i = idOf(element)
+        props = {}
+        for name, column in self.__props.items():
+            if i in column:
+                props[name] = column[i]
+        return props
+
     def printGraphSize(self):
         logger.write(f"Graph Size:\n\tNodes: {len(self.V)}\n\tEdges: {len(self.E)}")
 
@@ -113,6 +260,7 @@ class Graph:
             myJson["V"].append(v.url)
             # append the property dictionary to the list of node properties
             props = {"color": v.color, "dist": v.dist}
+            props.update(self.getProperties(v))
             myJson["V_props"].append(props)
 
             # create an empty entry for the node in the edge and edge prop lists
@@ -129,17 +277,43 @@ class Graph:
 
         return myJson
 
-    # Load data with the given title into the Graph
+    # Load data with the given title into the Graph.
+    # If a crawl with that title didn't finish, its checkpoint gets loaded instead
     def load(self, title):
-        with open(f"output/{title}.json") as f:
+        import checkpoint
+        if checkpoint.exists(f"output/temp/{title}"):
+            logger.write("Found an unfinished crawl, loading its checkpoint...")
+            checkpoint.restore(self, f"output/temp/{title}")
+            return
+        # if there's both a binary and a json save, go with whichever is newer
+        jsonPath = f"output/{title}.json"
+        binaryPath = f"output/{title}.wgraph"
+        if os.path.exists(binaryPath) and (not os.path.exists(jsonPath) or os.path.getmtime(binaryPath) >= os.path.getmtime(jsonPath)):
+            self.loadBinary(title)
+            return
+        with open(jsonPath) as f:
             myJson = json.load(f)
             self.loadFromJson(myJson)
 
+    # Load the binary save (see graphFile.py) with the given title into the Graph
+    def loadBinary(self, title):
+        import graphFile
+        with graphFile.GraphFile(f"output/{title}.wgraph") as gf:
+            gf.toGraph(self)
+
     # given a json-like python dict, load the data into the Graph
     def loadFromJson(self, myJson):
         if type(myJson) != dict:
-            logger.write("ERROR: loadFromJson() requires a python dict as input, not "+type(myJson))
+            logger.error("loadFromJson() requires a python dict as input, not "+str(type(myJson)))
             return
+        # This is done in two passes, so that it only takes one look at each vertex and edge:
+        # first all of the vertices get made, then all of the edges get wired up between them.
+        # That way every edge points at the same Vertex objects that are in V.
+        with pausedGC():
+            self.__loadFromJson(myJson)
+
+    def __loadFromJson(self, myJson):
+
         # iterate through list of nodes
         for i in range(len(myJson["V"])):
             # grab the url at index i
@@ -153,27 +327,42 @@ class Graph:
             # distance from starting node(s)
             u.dist = myJson["V_props"][i]["dist"]
 
-            # add the adjacent property
+            # save the vertex to the graph
+            u = self.addVertex(u)
+
+            # anything else in there is an extra property (see setProperty())
+            for name, value in myJson["V_props"][i].items():
+                if name != "color" and name != "dist":
+                    self.__props.setdefault(name, {})[u.id] = value
+
+        # edge targets that never got a vertex of their own (they share one Vertex each)
+        # ex: {9: <Vertex j>, ...}
+        outside = {}
+
+        for url in myJson["V"]:
+            u = self.getVertex(url)
             edges = myJson["E"][url] # list
-            u.setAdjacent(edges)
+            edgeProps = myJson["E_props"][url] # list
+            ids = array("I", [urlTable.intern(v_url) for v_url in edges])
 
-            # save the edge to the graph
-            self.V.append(u)
+            # add the adjacent property
+            # (only for pages we've actually fetched, so the rest still get fetched on a resume)
+            if u.color == "black" and not u.isAdjacentCached():
+                u.setAdjacentIds(ids)
 
             # iterate through the adjacency list for u
-            for j in range(len(edges)):
-                v_url = edges[j]
-                # get the weight
-                edgeWeight = myJson["E_props"][url][j]["weight"]
-                # create the Edge object
-                # Notice that we're creating the edge using urls (str) not Vertex
-                #myEdge = Edge(u.url, v_url, weight=edgeWeight)
-
-                # add the edge to the Graph
-                self.addEdge_url(u.url, v_url, edgeWeight)
-
-                #self.E.append(myEdge)
-            
+            vs = []
+            for v_id in ids:
+                v = self.__vertexIndex.get(v_id)
+                if v == None:
+                    v = outside.get(v_id)
+                    if v == None:
+                        v = Vertex(urlTable.url(v_id), self)
+                        outside[v_id] = v
+                vs.append(v)
+            # add the edges to the Graph, with their weights
+            self.addEdges(u, vs, [props["weight"] for props in edgeProps])
+
     # save current Graph data to a json file, filename starting with title
     def save(self, title):
         import scrape
@@ -181,17 +370,58 @@ class Graph:
         with open(f"output/{title}.json", "w") as f:
             json.dump(myJson, f, indent=4)
 
+    # save the domain graph (see domainGraph()) to a json file of its own, filename starting with title.
+    # It's the same format as save(), so it can be loaded into a Graph without the page graph
+    def saveDomainGraph(self, title):
+        with open(f"output/{title}_domainGraph.json", "w") as f:
+            json.dump(self.domainGraph().exportJson(), f, indent=4)
+
+    # save current Graph data to a binary file (see graphFile.py), filename starting with title.
+    # Much smaller and faster to load than the json, but only this program can read it
+    def saveBinary(self, title):
+        import graphFile
+        graphFile.writeGraph(self, f"output/{title}.wgraph")
+
+# The colors a Vertex can be (see the DFS in scrape.py). A Vertex keeps its color as an index
+# into this list, ex: 2 for "black", so it doesn't need a whole string each
+COLORS = ["white", "gray", "black"]
+colorIds = {color: i for i, color in enumerate(COLORS)}
+
+# Vertex and Edge use __slots__ instead of a __dict__ each, since there are millions of them
+# in a big crawl, and the dicts were most of the graph's memory.
+# (so they can't be given any new attributes that aren't in the slots)
 class Vertex:
+    __slots__ = ("__adjacent", "__color", "dist", "G", "id")
+
     def __init__(self, url, G=None, GD=None):
         self.__adjacent = None
-        self.__adjacentDomains = None
         self.dist = None
         self.G = G
-        self.color = "white"
-        self.url = url
-    
+        self.__color = 0
+        # the url itself lives in urlTable, we just keep its id
+        self.id = urlTable.intern(url)
+
+    @property
+    def url(self):
+        return urlTable.url(self.id)
+
+    # changing the url gives the vertex the id of the new one.
+    # (A vertex that's already in a Graph stays filed under its old url, so only do this before adding it)
+    @url.setter
+    def url(self, url):
+        self.id = urlTable.intern(url)
+
+    # "white", "gray" or "black"
+    @property
+    def color(self):
+        return COLORS[self.__color]
+
+    @color.setter
+    def color(self, color):
+        self.__color = colorIds[color]
+
     def __hash__(self):
-        return hash(self.url)
+        return hash(self.id)
 
     def __str__(self):
         return self.url
@@ -199,76 +429,102 @@ class Vertex:
     # equality is based on if they have the same url
     def __eq__(self, v):
         if type(v) == Vertex:
-            return self.url == v.url
+            return self.id == v.id
         return False
         
     def setAdjacent(self, urls: list):
         # In case this ever gets called when it shouldn't be
         if self.__adjacent != None:
-            logger.write("Vertex.setAdjacent(): WARNING: non-empty contents of __adjacent being overwritten! len = "+len(self.__adjacent))
+            logger.warning("Vertex.setAdjacent(): non-empty contents of __adjacent being overwritten! len = "+str(len(self.__adjacent)))
         
         # wipe the list
-        self.__adjacent = []
+        self.__adjacent = array("I")
 
-        # iterate through each item in the list, append it to __adjacent
+        # iterate through each item in the list, append its id to __adjacent
         for url in urls:
-            self.__adjacent.append(url)
+            self.__adjacent.append(urlTable.intern(url))
+
+    # same as setAdjacent(), but with url ids (see urlTable.py) instead of urls
+    def setAdjacentIds(self, ids):
+        if self.__adjacent != None:
+            logger.warning("Vertex.setAdjacentIds(): non-empty contents of __adjacent being overwritten! len = "+str(len(self.__adjacent)))
+        self.__adjacent = array("I", ids)
 
     # Returns True if we've already fetched the webpage for this node
     def isAdjacentCached(self):
         return self.__adjacent != None
 
+    # Returns a list of the urls this page links to
     def getAdjacent(self):
+        return [urlTable.url(i) for i in self.getAdjacentIds()]
+
+    # Returns the url ids (see urlTable.py) of the pages this page links to
+    def getAdjacentIds(self):
         # If we haven't fetched the webpage and indexed URLs yet, do that.
         if self.__adjacent == None:
             self.__fetchPage()
         return self.__adjacent
 
+    @profiler.timed("vertex.fetchPage")
     def __fetchPage(self):
         import scrape
 
         # adjacent nodes
-        self.__adjacent = []
+        self.__adjacent = array("I")
 
         # Fetch webpage
-        if scrape.robotsCheck(self.url):
+        if scrape.robotsCheck(self.url)[0]:
             inlinks, outlinks, outdomains = scrape.parseWebpage(self.url)
         else:
             return
 
-        # temporary index we use to improve Big O speed for
-        # checking if a url has already been added.
-        urlsAdded = []
-
-        for url in inlinks+outlinks:
-            # If this url doesn't have a node yet, create one
-            v = self.G.getVertex(url)
-            if v == None:
-                v = Vertex(url, self.G)
-
-                # if the url is already in __adjacent, just skip it
-                # (no need to add twice)
-                if v.url in urlsAdded:
-                    continue
-
-            # NOTE: This whole for loop should just be ditched.
-            # I had initially wanted __adjacent to be a list of Vertex's
-            # Now, it's a list of urls (str). So really I could just replace
-            # this whole thing with a single line of code:
-                # self.__adjacent = inlinks+outlinks
-                
-            # Then add the node to the list of adjacent nodes
-            self.__adjacent.append(v.url)
-            # keep track of which urls we've added to __adjacent
-            # so the search complexity is easier for avoiding duplicates
-            urlsAdded.append(v.url)
-
-
+        # Then add the links to the list of adjacent nodes (skipping any duplicates)
+        self.__adjacent = array("I", [urlTable.intern(url) for url in scrape.dedupe(inlinks+outlinks)])
+
+
+
+# Turns off Python's garbage collector for the duration of a with block.
+# Loading a graph makes millions of objects that are all going to stick around, and otherwise
+# the collector keeps stopping to scan through all of them, which takes longer than the load
+@contextlib.contextmanager
+def pausedGC():
+    wasEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if wasEnabled:
+            gc.enable()
+
+# Returns the url of a Vertex, or the string itself if given a url
+def urlOf(element):
+    if type(element) == str:
+        return element
+    return element.url
+
+# Returns the url id of a Vertex or url, or None if the url doesn't have one yet
+def idOf(element):
+    if type(element) == str:
+        return urlTable.get(element)
+    return element.id
+
+# Returns the url id of a Vertex or url, giving the url one if it needs it
+def internOf(element):
+    if type(element) == str:
+        return urlTable.intern(element)
+    return element.id
+
+# Returns the key for the edge between two url ids in Graph's edge index.
+# (a single int is a lot smaller than a tuple, when there are millions of them)
+def edgeKey(u, v):
+    return (u << 32) | v
 
 # an edge pointing from u to v. Weight is a unit value (1) by default
 # while technically u and v are supposed to be Vertex type, you can also
 # pass in just a string (url/title), and everything still works
 class Edge:
+    __slots__ = ("u", "v", "weight")
+
     def __init__(self, u: Vertex, v:Vertex, weight=1):
         self.u = u
         self.v = v
@@ -281,9 +537,9 @@ class Edge:
 def graphToNxGraph(G: Graph):
     g = nx.DiGraph()
 
-    # Add the nodes/vertices
+    # Add the nodes/vertices (with any extra properties as node attributes)
     for v in G.V:
-        g.add_node(v)
+        g.add_node(v, **G.getProperties(v))
 
     # Add the edges
     for e in G.E:
@@ -291,58 +547,42 @@ def graphToNxGraph(G: Graph):
     
     return g
 
+# (G keeps its domain graph up to date as it goes, see Graph.domainGraph())
 def graphToDomainGraph(G: Graph):
-    import scrape
-    GG_domain = Graph()
-
-    # go through each vertex in the original graph
-    for v in G.V:
-        # grab the domain only
-        domain = scrape.splitURL(v.url)[0]
-        # if the domain is not already in the list, add it
-        if GG_domain.getVertex(domain) == None:
-            GG_domain.V.append(Vertex(domain))
-    
-    # go through the edges
-    for e in G.E:
-        # grab the domain of u
-        u_domain = scrape.splitURL(e.u.url)[0]
-        # grab the domain of v
-        v_domain = scrape.splitURL(e.v.url)[0]
-
-        # add the edge (this func increments weight if it already exists)
-        GG_domain.addEdge_url(u_domain, v_domain)
-
-    return GG_domain
+    return G.domainGraph()
 
 # Funcs
 
 # Draw the graph, with the labels raised slightly above the nodes
-def drawGraph(G: nx.DiGraph, output):
+# graphs with more nodes than this get drawn without labels
+labelLimit = 5000
+
+# Draws the graph to an image file.
+# The layout is layout.forceLayout() (nx.spring_layout() is O(V^2) per iteration, which
+# doesn't finish on big crawls). If layoutCache is given, positions are loaded from and saved
+# to that file, so drawing the same (or a bigger) graph again mostly reuses the old layout
+def drawGraph(G: nx.DiGraph, output, layoutCache=None):
     plt.figure(figsize=(100, 75))
-    pos_nodes = nx.spring_layout(G, weight="weight", k=None)
-    #pos_nodes = nx.spectral_layout(G)
-    #pos_nodes = nx.shell_layout(G)
-    #pos_nodes = nx.spectral_layout(G)
-    #pos_nodes = nx.community.louvain_communities(G)
-    
-    #nx.draw_networkx_nodes(G, pos_nodes, node_size=30)
-    #nx.draw_networkx_edges(G, pos_nodes, width=0.1, alpha=0.5)
-    nx.draw(G, pos_nodes, node_size=200, width=0.1)
-
-    pos_attrs = {}
-    for node, coords in pos_nodes.items():
-        pos_attrs[node] = (coords[0], coords[1] + 0.004)
-
-    node_attrs = nx.get_node_attributes(G, 'type')
-    custom_node_attrs = {}
-    for node, attr in node_attrs.items():
-        custom_node_attrs[node] = attr
-
-    nx.draw_networkx_labels(G, pos_attrs, font_size=16)
+    pos_nodes = layout.layoutGraph(G, layoutCache)
+
+    # edges all go in one LineCollection, and nodes in one scatter, instead of an artist per edge
+    ax = plt.gca()
+    segments = [(pos_nodes[u], pos_nodes[v]) for u, v in G.edges]
+    ax.add_collection(LineCollection(segments, linewidths=0.1, colors="k", alpha=0.5))
+    xy = list(pos_nodes.values())
+    ax.scatter([x for x, y in xy], [y for x, y in xy], s=200, zorder=2)
+    ax.set_axis_off()
+
+    # past a few thousand nodes the labels are just a black smudge (and take forever)
+    if G.number_of_nodes() <= labelLimit:
+        pos_attrs = {}
+        for node, coords in pos_nodes.items():
+            pos_attrs[node] = (coords[0], coords[1] + 0.004)
+        nx.draw_networkx_labels(G, pos_attrs, font_size=16)
 
     #plt.margins(x=0.5, y=1.0)
     plt.savefig(output)
+    plt.close()
 
 def drawGraph_simple(G: nx.DiGraph, output):
     nx.draw_networkx(G, with_labels=False)
@@ -359,13 +599,13 @@ if __name__ == "__main__":
     # Create nodes
     for i in range(n):
         node = Vertex(f"{i}")
-        G.V.append(node)
+        G.addVertex(node)
 
     # Create edges
     for i in range(n):
         for j in range(n):
             if random.randint(0, 100) < 25:
-                G.E.append(Edge(G.V[i], G.V[j]))
+                G.addEdge(Edge(G.V[i], G.V[j]))
 
     import scrape
 
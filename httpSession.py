@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import logger
+import metrics
+import urlTable
+
+# Shared HTTP session for everything the spider fetches (pages and robots.txt files).
+# The session keeps a pool of keep-alive connections for each host, so pulling lots of
+# pages off the same site only has to set up the TCP (and TLS) connection once.
+
+# how many hosts to keep a connection pool for (the least recently used one gets dropped)
+poolConnections = 100
+# how many connections to keep alive for each host
+poolMaxsize = 2
+# seconds to wait for a connection, and then for the server to send something back
+connectTimeout = 10
+readTimeout = 30
+# send every request through this HTTP proxy, ex: "http://127.0.0.1:8080" (None to go direct).
+# benchCrawl.py uses it to point the spider at syntheticWeb.py
+proxy = None
+
+session = None
+lock = threading.Lock()
+
+
+# HTTPAdapter that keeps count of how many connections it has opened, so we can tell
+# how often they're being reused
+class PoolAdapter(HTTPAdapter):
+    def __init__(self, *args, **kwargs):
+        # totals for the pools that have already been dropped
+        self.droppedConnections = 0
+        self.droppedRequests = 0
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # count up what a pool did before it gets thrown away
+        self.poolmanager.pools.dispose_func = self.__dropPool
+
+    def __dropPool(self, pool):
+        self.droppedConnections += pool.num_connections
+        self.droppedRequests += pool.num_requests
+        pool.close()
+
+    # Returns (requests, connections) made through this adapter so far
+    def stats(self):
+        connections = self.droppedConnections
+        requestCount = self.droppedRequests
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            # it might have been dropped since we grabbed the keys
+            if pool == None:
+                continue
+            connections += pool.num_connections
+            requestCount += pool.num_requests
+        return requestCount, connections
+
+
+# Returns the shared requests.Session, creating it the first time
+def getSession():
+    global session
+    with lock:
+        if session == None:
+            session = requests.Session()
+            if proxy != None:
+                session.proxies = {"http": proxy, "https": proxy}
+                # (otherwise any proxy settings in the environment would win)
+                session.trust_env = False
+            adapter = PoolAdapter(pool_connections=poolConnections, pool_maxsize=poolMaxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        return session
+
+# GET a url through the shared session, using our timeout policy
+# (and counting it towards the metrics, see metrics.py)
+def get(url, **kwargs):
+    kwargs.setdefault("timeout", (connectTimeout, readTimeout))
+    kind = "page"
+    if url.endswith("/robots.txt"):
+        kind = "robots"
+    start = time.perf_counter()
+    try:
+        reqs = getSession().get(url, **kwargs)
+    except Exception:
+        metrics.requestErrors.inc(kind=kind)
+        raise
+    metrics.fetchSeconds.observe(time.perf_counter() - start, domain=metrics.domainLabel(urlTable.splitURL(url)[0]))
+    metrics.requests.inc(kind=kind, status=reqs.status_code)
+    metrics.bytesDownloaded.inc(len(reqs.content))
+    return reqs
+
+# Returns (requests, connections) made through the shared session so far
+def connectionStats():
+    adapter = getSession().get_adapter("https://")
+    return adapter.stats()
+
+# Writes how often we've been able to reuse a connection to the log
+def logConnectionStats():
+    requestCount, connections = connectionStats()
+    if requestCount == 0:
+        return
+    reused = 1 - connections / requestCount
+    logger.write(f"HTTP: {requestCount} requests over {connections} connections ({reused:.1%} reused)")
+
+# a forked process (ex: benchCrawl.py forks its shards off itself, while shard.crawl() starts
+# them as new processes, which don't need this) can't share the keep-alive connections of the
+# process it was forked from (their responses would get mixed up), so it starts over with a
+# session of its own
+def afterFork():
+    global session, lock
+    session = None
+    lock = threading.Lock()
+
+os.register_at_fork(after_in_child=afterFork)
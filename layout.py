@@ -0,0 +1,237 @@
+import json
+import os
+
+import numpy as np
+
+# Force-directed layout for big graphs (what drawGraph() uses instead of nx.spring_layout).
+#
+# It's Fruchterman-Reingold, with every step done on whole numpy arrays at once:
+#   - edges pull their ends together (f = d^2 / k, scaled by the edge's weight)
+#   - nodes push each other apart (f = k^2 / d), but only nodes that are close get compared
+#     one on one. The nodes are split up by a grid (with about one node to a cell), and a
+#     node is pushed one on one by the nodes in its own cell and the 8 around it.
+#   - everything further away is approximated on the grid: each cell's nodes are lumped
+#     together, and the push between every pair of cells is done in one go as a
+#     convolution (with FFTs, like a particle-mesh simulation)
+# So each iteration costs about O(V log V + E) instead of O(V^2), and it always runs for a
+# fixed number of iterations, no matter how big the graph is.
+#
+# Positions can be cached in a json file (ex: {"https://example.com/": [0.25, 0.5], ...}), so
+# drawing the graph again, or drawing a slightly bigger crawl, starts from the old layout
+# (new nodes start out next to a neighbour that's already placed).
+
+# how many iterations to run
+iterations = 50
+# how far (as a fraction of the frame) a node can move in the first iteration, for a new layout,
+# and for one starting from cached positions (which only needs touching up)
+startTemperature = 0.1
+warmTemperature = 0.02
+# how many node pairs to work on at once (keeps memory down on huge graphs)
+chunkSize = 1_000_000
+# the most cells the grid can have on each side
+maxCells = 1024
+
+
+# Returns an (n, 2) array of positions in the unit square for a graph with n nodes and
+# edges src[i] -> dst[i] (node indexes), each with the given weight.
+# pos is where to start from (None for random), and fixed marks the nodes that already have
+# a good position, so it can start cooler if most of them do.
+# steps is how many iterations to run (None for the module's iterations setting)
+def forceLayout(n, src, dst, weights, pos=None, fixed=None, steps=None, seed=0):
+    if steps == None:
+        steps = iterations
+    rng = np.random.default_rng(seed)
+    if pos is None:
+        pos = rng.random((n, 2))
+    pos = np.array(pos, dtype=np.float64)
+    if n == 0:
+        return pos
+
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    # heavy edges pull harder, but not so much harder that they squash everything else
+    weights = np.log1p(np.asarray(weights, dtype=np.float64))
+
+    # the ideal distance between nodes, for n nodes spread out over the unit square
+    k = np.sqrt(1.0 / n)
+
+    temperature = startTemperature
+    if fixed is not None and np.count_nonzero(fixed) > n // 2:
+        temperature = warmTemperature
+    cooling = temperature / steps
+
+    for i in range(steps):
+        disp = repulsion(pos, k) + attraction(pos, src, dst, weights, k)
+
+        # move each node along its displacement, but no further than the temperature
+        length = np.sqrt((disp ** 2).sum(axis=1))
+        length[length == 0] = 1
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        np.clip(pos, 0, 1, out=pos)
+        temperature -= cooling
+    return pos
+
+# Returns the (n, 2) forces from the edges pulling their ends together
+def attraction(pos, src, dst, weights, k):
+    disp = np.zeros_like(pos)
+    if len(src) == 0:
+        return disp
+    delta = pos[dst] - pos[src]
+    dist = np.sqrt((delta ** 2).sum(axis=1))
+    force = delta * (dist * weights / k)[:, None]
+    n = len(pos)
+    for axis in range(2):
+        disp[:, axis] += np.bincount(src, weights=force[:, axis], minlength=n)
+        disp[:, axis] -= np.bincount(dst, weights=force[:, axis], minlength=n)
+    return disp
+
+# Returns the (n, 2) forces from the nodes pushing each other apart
+def repulsion(pos, k):
+    # The grid is laid over the square the nodes actually take up (not the whole frame),
+    # so the cells don't fill up as the nodes bunch together. It has about one node to a cell
+    # (a power of 2 on each side, which the FFTs like)
+    low = pos.min(axis=0)
+    span = max((pos.max(axis=0) - low).max(), 1e-12)
+    unit = (pos - low) / span
+    cells = 2 ** int(np.ceil(np.log2(max(np.sqrt(len(pos)), 4))))
+    cells = min(cells, maxCells)
+    return nearRepulsion(pos, unit, k, cells) + farRepulsion(pos, unit, k, cells, span)
+
+# Returns (cx, cy), the cell each node is in, for a grid with `cells` cells on each side
+# (unit is the positions scaled to the unit square)
+def cellsOf(unit, cells):
+    cx = np.minimum((unit[:, 0] * cells).astype(np.int64), cells - 1)
+    cy = np.minimum((unit[:, 1] * cells).astype(np.int64), cells - 1)
+    return cx, cy
+
+# pushing between nodes in the same or neighbouring (fine) cells, one pair at a time
+def nearRepulsion(pos, unit, k, cells):
+    n = len(pos)
+    disp = np.zeros_like(pos)
+    cx, cy = cellsOf(unit, cells)
+    cellOf = cx * cells + cy
+
+    # nodes sorted by cell, so the nodes in cell c are order[starts[c]:starts[c] + counts[c]]
+    order = np.argsort(cellOf, kind="stable")
+    counts = np.bincount(cellOf, minlength=cells * cells)
+    starts = np.cumsum(counts) - counts
+
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            nx_ = cx + dx
+            ny_ = cy + dy
+            ok = (nx_ >= 0) & (nx_ < cells) & (ny_ >= 0) & (ny_ < cells)
+            nodes = np.nonzero(ok)[0]
+            other = nx_[ok] * cells + ny_[ok]
+            # do it in chunks of nodes, so we never have too many pairs in memory at once
+            for a, b in chunks(counts[other], chunkSize):
+                reps = counts[other[a:b]]
+                total = reps.sum()
+                if total == 0:
+                    continue
+                # every (node, node in the other cell) pair
+                i = np.repeat(nodes[a:b], reps)
+                within = np.arange(total) - np.repeat(np.cumsum(reps) - reps, reps)
+                j = order[np.repeat(starts[other[a:b]], reps) + within]
+                keep = i != j
+                i = i[keep]
+                j = j[keep]
+                delta = pos[i] - pos[j]
+                dist2 = (delta ** 2).sum(axis=1)
+                # nodes sitting right on top of each other get nudged apart in a random-ish direction
+                same = dist2 == 0
+                if same.any():
+                    delta[same] = (np.stack([i[same] % 7, j[same] % 5], axis=1) + 1) * 1e-6
+                    dist2[same] = (delta[same] ** 2).sum(axis=1)
+                force = k * k / dist2
+                for axis in range(2):
+                    disp[:, axis] += np.bincount(i, weights=delta[:, axis] * force, minlength=n)
+    return disp
+
+# pushing from everything further away than the neighbouring cells. Each cell's nodes are
+# lumped together at the cell's middle, and the push on every cell from every other cell is
+# worked out all at once, as a convolution over the grid (done with FFTs)
+def farRepulsion(pos, unit, k, cells, span):
+    cx, cy = cellsOf(unit, cells)
+    mass = np.bincount(cx * cells + cy, minlength=cells * cells).reshape(cells, cells).astype(np.float64)
+
+    # the push from one node, for every offset from -(cells-1) to cells-1 cells away on each axis
+    # (with the neighbouring cells left out, since nearRepulsion() does those)
+    offsets = np.arange(-(cells - 1), cells)
+    dx, dy = np.meshgrid(offsets * (span / cells), offsets * (span / cells), indexing="ij")
+    dist2 = dx ** 2 + dy ** 2
+    dist2[(np.abs(offsets)[:, None] <= 1) & (np.abs(offsets)[None, :] <= 1)] = np.inf
+
+    # (padded out so the convolution doesn't wrap around)
+    shape = (3 * cells, 3 * cells)
+    massFFT = np.fft.rfft2(mass, shape)
+    disp = np.zeros_like(pos)
+    for axis, delta in enumerate([dx, dy]):
+        kernel = np.fft.rfft2(delta * k * k / dist2, shape)
+        force = np.fft.irfft2(massFFT * kernel, shape)[cells - 1:2 * cells - 1, cells - 1:2 * cells - 1]
+        disp[:, axis] = force[cx, cy]
+    return disp
+
+# Yields (start, end) ranges over counts, each adding up to about `size` (but at least one item)
+def chunks(counts, size):
+    if len(counts) == 0:
+        return
+    total = np.cumsum(counts)
+    ends = np.searchsorted(total, np.arange(size, total[-1] + size, size)) + 1
+    start = 0
+    for end in np.unique(np.minimum(ends, len(counts))):
+        yield start, end
+        start = end
+    if start < len(counts):
+        yield start, len(counts)
+
+
+# Returns {label: (x, y), ...} from a layout cache file (empty if there isn't one)
+def loadPositions(path):
+    if path == None or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {label: tuple(xy) for label, xy in json.load(f).items()}
+
+# writes {label: (x, y), ...} to a layout cache file
+def savePositions(path, positions):
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    tempPath = path + ".tmp"
+    with open(tempPath, "w") as f:
+        json.dump({label: [float(x), float(y)] for label, (x, y) in positions.items()}, f)
+    os.replace(tempPath, path)
+
+# Lays out an nx.DiGraph (with "weight"s on its edges) and returns {node: (x, y), ...}.
+# If cachePath is given, it starts from the positions saved there (matched up by str(node)),
+# and saves the new ones there afterwards
+def layoutGraph(g, cachePath=None, steps=None, seed=0):
+    nodes = list(g.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    n = len(nodes)
+    src = np.fromiter((index[u] for u, v in g.edges), dtype=np.int64, count=g.number_of_edges())
+    dst = np.fromiter((index[v] for u, v in g.edges), dtype=np.int64, count=g.number_of_edges())
+    weights = np.fromiter((w for u, v, w in g.edges(data="weight", default=1)), dtype=np.float64, count=g.number_of_edges())
+
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    fixed = np.zeros(n, dtype=bool)
+    cached = loadPositions(cachePath)
+    for i, node in enumerate(nodes):
+        xy = cached.get(str(node))
+        if xy != None:
+            pos[i] = xy
+            fixed[i] = True
+    # new nodes start out next to one of their neighbours that's already been placed
+    if fixed.any() and not fixed.all():
+        for a, b in [(src, dst), (dst, src)]:
+            placeable = fixed[a] & ~fixed[b]
+            pos[b[placeable]] = pos[a[placeable]] + (rng.random((np.count_nonzero(placeable), 2)) - 0.5) * np.sqrt(1.0 / n)
+        np.clip(pos, 0, 1, out=pos)
+
+    pos = forceLayout(n, src, dst, weights, pos, fixed, steps, seed)
+    positions = {node: (pos[i, 0], pos[i, 1]) for i, node in enumerate(nodes)}
+    if cachePath != None:
+        savePositions(cachePath, {str(node): xy for node, xy in positions.items()})
+    return positions
@@ -0,0 +1,58 @@
+from html.parser import HTMLParser
+
+# Pulls the links out of a page without building a DOM.
+#
+# BeautifulSoup's 'html.parser' is this same tokenizer with a whole tree built on top,
+# which we only ever used to run find_all('a'). Here we just listen for <a> tags as
+# the tokenizer goes past them, so the page is scanned once and nothing is kept except
+# the hrefs. Since the tokenizer is the same, we find the same links BeautifulSoup did
+# (tags inside comments and <script>/<style> are skipped, entities are unescaped, and
+# if an href shows up twice in a tag, the last one wins).
+
+
+class HrefParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # hrefs found since the last time someone collected them
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        href = None
+        for name, value in attrs:
+            if name == "href":
+                href = value
+        # ignore missing or empty links (<a href> with no value comes through as None)
+        if href == None or href == "":
+            return
+        self.hrefs.append(href)
+
+    # don't bother collecting page text
+    def handle_data(self, data):
+        pass
+
+
+# Yields the href of every <a> tag, as the html comes in.
+# html can be the whole page as a str, or any iterable of str chunks (like a streamed response),
+# so a link gets yielded as soon as its tag has been read.
+# <a> tags without an href (or with an empty one) are skipped.
+def iterHrefs(html):
+    if type(html) == str:
+        html = [html]
+    parser = HrefParser()
+    for chunk in html:
+        parser.feed(chunk)
+        yield from collect(parser)
+    parser.close()
+    yield from collect(parser)
+
+# empties the parser's list of hrefs, returning what was in it
+def collect(parser):
+    hrefs = parser.hrefs
+    parser.hrefs = []
+    return hrefs
+
+# Returns a list of the href of every <a> tag in the html
+def hrefs(html):
+    return list(iterHrefs(html))
@@ -1,18 +1,171 @@
+import atexit
 import datetime
+import json
+import os
+import threading
+import time
+
+# The log. write() hands each message off to a background thread, which prints it and appends
+# it to the log file in batches (keeping the file open), so logging a line doesn't mean
+# opening and closing the file every time.
+#
+# Messages have a level, and anything under minLevel gets dropped. Noisy messages (the ones
+# that come up for every page) can be given a key, and then only `rateLimit` messages a second
+# with that key get through. The rest get counted, and the next one that gets through says
+# how many were skipped.
+#
+# Call flush() to wait until everything so far is written (this happens at exit too).
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+levelNames = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+levels = {name: value for value, name in levelNames.items()}
 
 file = None
+# messages under this level don't get logged at all
+minLevel = INFO
+# write the file as json lines ({"time": ..., "level": ..., "msg": ...}) instead of plain text
+# (what gets printed stays plain text)
+jsonLines = False
+# most messages per second for each rate limit key
+rateLimit = 5
+# longest a message waits in the buffer before it gets written (in seconds),
+# and how many can pile up before the writer gets woken early
+flushInterval = 0.5
+maxBuffer = 1000
+
+# [(printed line, file line), ...] waiting to be written
+buffer = []
+lock = threading.Condition()
+writer = None
+# messages that have been handed to the writer, and how many of those it's done
+queued = 0
+written = 0
+# ex: {"fetch": (1700000000, 5, 12), ...} (key -> (second, messages in that second, messages skipped))
+limits = {}
+
 
 def setFile(f):
     global file
+    flush()
     file = f
 
 # Print's msg, prepended with a timestamp. It also saves it to the log file.
-def write(msg):
+# (In the background: see the top of the file.) Give noisy messages a key to rate limit them,
+# ex: write("Fetching resource: " + url, key="fetch")
+def write(msg, level=INFO, key=None):
+    if level < minLevel:
+        return
+    now = time.time()
+    skipped = 0
+    if key != None:
+        skipped = rateLimited(key, now)
+        if skipped == None:
+            return
+
     # Create the output
-    myTime = datetime.datetime.now().strftime("%b %d %Y %H:%M:%S")
+    msg = str(msg)
+    if skipped > 0:
+        msg += f" ({skipped} similar messages skipped)"
+    myTime = datetime.datetime.fromtimestamp(now).strftime("%b %d %Y %H:%M:%S")
     ouput = f"[{myTime}]: {msg}"
-    # Print it
-    print(ouput)
-    # Log it
-    with open(file, "a") as f:
-        f.write(ouput+"\n")
\ No newline at end of file
+    # (warnings and errors say so, so they stand out from the rest)
+    if level >= WARNING:
+        ouput = f"[{myTime}]: {levelNames.get(level, level).upper()}: {msg}"
+    line = ouput
+    if jsonLines:
+        line = json.dumps({"time": now, "level": levelNames.get(level, level), "msg": msg})
+
+    global queued
+    with lock:
+        startWriter()
+        buffer.append((ouput, line))
+        queued += 1
+        if len(buffer) >= maxBuffer:
+            lock.notify_all()
+
+def debug(msg, key=None):
+    write(msg, DEBUG, key)
+
+def warning(msg, key=None):
+    write(msg, WARNING, key)
+
+def error(msg, key=None):
+    write(msg, ERROR, key)
+
+# Returns None if a message with this key should be dropped, or else how many were dropped before it
+def rateLimited(key, now):
+    second = int(now)
+    with lock:
+        lastSecond, count, skipped = limits.get(key, (second, 0, 0))
+        if lastSecond != second:
+            count = 0
+        if count >= rateLimit:
+            limits[key] = (second, count, skipped + 1)
+            return None
+        limits[key] = (second, count + 1, 0)
+        return skipped
+
+# waits until everything that's been written so far is actually printed and in the log file
+def flush():
+    with lock:
+        target = queued
+        if writer == None:
+            return
+        lock.notify_all()
+        while written < target and writer.is_alive():
+            lock.wait(flushInterval)
+
+# (call with the lock held)
+def startWriter():
+    global writer
+    if writer == None or not writer.is_alive():
+        writer = threading.Thread(target=writeLoop, daemon=True)
+        writer.start()
+
+def writeLoop():
+    global buffer, written
+    f = None
+    fileName = None
+    while True:
+        with lock:
+            if len(buffer) == 0:
+                lock.wait(flushInterval)
+            batch = buffer
+            buffer = []
+        if len(batch) == 0:
+            continue
+        try:
+            # Print it
+            print("\n".join(ouput for ouput, line in batch))
+            # Log it
+            if file != fileName:
+                if f != None:
+                    f.close()
+                f = None
+                fileName = file
+                if file != None:
+                    f = open(file, "a")
+            if f != None:
+                f.write("".join(line + "\n" for ouput, line in batch))
+                f.flush()
+        except Exception as err:
+            print(f"WARNING: couldn't write to the log ({err})")
+        with lock:
+            written += len(batch)
+            lock.notify_all()
+
+# a forked process (ex: a parsePool worker) doesn't get the writer thread, and might
+# get the lock while some other thread was holding it, so it starts over
+def afterFork():
+    global lock, buffer, writer, queued, written
+    lock = threading.Condition()
+    buffer = []
+    writer = None
+    queued = 0
+    written = 0
+
+os.register_at_fork(after_in_child=afterFork)
+atexit.register(flush)
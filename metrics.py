@@ -0,0 +1,291 @@
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import logger
+
+# Counters, gauges and histograms for watching a crawl while it runs.
+#
+# Everything gets registered in one place (`registry`), and can be read two ways:
+#   - over HTTP, in the Prometheus text format, from a local server (see serve()):
+#       curl http://127.0.0.1:9100/metrics
+#   - as a json stats file that gets rewritten every so often (see startDumping()), ex:
+#       {"time": 1700000000.0, "uptime": 360.0,
+#        "metrics": {"webgraph_requests_total": {"kind=page,status=200": 1520, ...}, ...},
+#        "rates": {"webgraph_requests_total": {"kind=page,status=200": 4.2, ...}, ...}}
+#     where "rates" is how fast each counter went up (per second) since the last dump.
+#
+# Things that already keep count somewhere else (ex: the graph's size) get read by collectors,
+# functions that run right before the metrics are read and set the values (see addCollector()).
+
+# seconds, for the fetch and parse time histograms
+timeBuckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+# the most domains to keep separate fetch times for (the rest get counted as "other"),
+# so a big crawl doesn't make millions of series
+maxDomains = 500
+
+# ex: {"webgraph_requests_total": <Counter webgraph_requests_total>, ...}
+registry = {}
+collectors = []
+started = time.time()
+
+
+# One number per set of label values, ex: requests{kind="page", status="200"}
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # ex: {("page", "200"): 1520, ...} (label values -> value)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry[name] = self
+
+    # Returns the label values as a tuple, in the same order as self.labels
+    def key(self, labelValues):
+        return tuple(str(labelValues.get(label, "")) for label in self.labels)
+
+    # Returns [(label values, value), ...]
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+class Counter(Metric):
+    type = "counter"
+
+    # ex: requests.inc(kind="page", status=200)
+    def inc(self, amount=1, **labelValues):
+        key = self.key(labelValues)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    # for collectors, when something else is already keeping the count
+    def set(self, value, **labelValues):
+        key = self.key(labelValues)
+        with self.lock:
+            self.values[key] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labelValues):
+        key = self.key(labelValues)
+        with self.lock:
+            self.values[key] = value
+
+    # replaces every value at once, ex: {("0",): 12, ("1",): 340} (so labels that went away get dropped)
+    def setAll(self, values):
+        with self.lock:
+            self.values = dict(values)
+
+
+# Counts how many observations fell into each bucket (the same way Prometheus does: each bucket
+# counts everything less than or equal to its upper bound), along with their sum
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=timeBuckets):
+        super().__init__(name, help, labels)
+        self.buckets = list(buckets) + [math.inf]
+
+    # ex: fetchSeconds.observe(0.24, domain="example.com")
+    def observe(self, value, **labelValues):
+        key = self.key(labelValues)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts == None:
+                # [count in each bucket (not cumulative)..., sum]
+                counts = [0] * len(self.buckets) + [0.0]
+                self.values[key] = counts
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-1] += value
+
+    def items(self):
+        with self.lock:
+            return [(key, list(counts)) for key, counts in self.values.items()]
+
+
+# The metrics the spider keeps
+requests = Counter("webgraph_requests_total", "HTTP requests made, by kind (page or robots) and status code", ("kind", "status"))
+requestErrors = Counter("webgraph_request_errors_total", "HTTP requests that failed without a response", ("kind",))
+bytesDownloaded = Counter("webgraph_bytes_downloaded_total", "Bytes of response bodies downloaded")
+fetchSeconds = Histogram("webgraph_fetch_seconds", "Time taken by each HTTP request, by domain", ("domain",))
+parseSeconds = Histogram("webgraph_parse_seconds", "Time taken to pull the links out of each page")
+retries = Counter("webgraph_retries_total", "Fetches that failed and got tried again, by kind (page or robots)", ("kind",))
+robotsLookups = Counter("webgraph_robots_lookups_total", "robots.txt checks, by whether the rules were already cached", ("result",))
+pageCacheLookups = Counter("webgraph_page_cache_lookups_total", "Pages fetched, by whether their links came out of the page cache", ("result",))
+frontierPages = Gauge("webgraph_frontier_pages", "Pages queued up to be expanded, by depth", ("depth",))
+graphVertices = Gauge("webgraph_graph_vertices", "Vertices in the page graph")
+graphEdges = Gauge("webgraph_graph_edges", "Edges in the page graph")
+graphDomains = Gauge("webgraph_graph_domains", "Domains in the page graph")
+
+# the domains that get their own fetch times
+domainLabels = set(())
+domainLock = threading.Lock()
+
+# Returns the domain label to use for domain (see maxDomains)
+def domainLabel(domain):
+    if domain in domainLabels:
+        return domain
+    with domainLock:
+        if len(domainLabels) < maxDomains:
+            domainLabels.add(domain)
+            return domain
+    return "other"
+
+
+# fn gets called (with no arguments) right before the metrics are read
+def addCollector(fn):
+    collectors.append(fn)
+
+def collect():
+    for fn in collectors:
+        try:
+            fn()
+        except Exception as err:
+            logger.warning(f"Metrics collector failed ({err})")
+
+
+# Returns every metric in the Prometheus text format
+def prometheusText():
+    collect()
+    lines = []
+    for metric in list(registry.values()):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for key, value in sorted(metric.items()):
+            labels = list(zip(metric.labels, key))
+            if metric.type != "histogram":
+                lines.append(f"{metric.name}{labelText(labels)} {formatValue(value)}")
+                continue
+            total = 0
+            for bound, count in zip(metric.buckets, value):
+                total += count
+                le = "+Inf" if bound == math.inf else formatValue(bound)
+                lines.append(f"{metric.name}_bucket{labelText(labels + [('le', le)])} {total}")
+            lines.append(f"{metric.name}_sum{labelText(labels)} {formatValue(value[-1])}")
+            lines.append(f"{metric.name}_count{labelText(labels)} {total}")
+    return "\n".join(lines) + "\n"
+
+# ex: [("kind", "page"), ("status", "200")] -> '{kind="page",status="200"}'
+def labelText(labels):
+    if len(labels) == 0:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for name, value in labels]
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in escaped) + "}"
+
+def formatValue(value):
+    if type(value) == float and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
+
+
+# Returns {name: {"label=value,...": value, ...}, ...} for every metric.
+# Histograms come out as {"count": ..., "sum": ..., "buckets": {"0.005": ..., ..., "+Inf": ...}}
+# (with cumulative bucket counts, the same as Prometheus)
+def snapshot():
+    collect()
+    metricsJson = {}
+    for metric in list(registry.values()):
+        series = {}
+        for key, value in metric.items():
+            name = ",".join(f"{label}={v}" for label, v in zip(metric.labels, key))
+            if metric.type == "histogram":
+                buckets = {}
+                total = 0
+                for bound, count in zip(metric.buckets, value):
+                    total += count
+                    buckets["+Inf" if bound == math.inf else str(bound)] = total
+                value = {"count": total, "sum": value[-1], "buckets": buckets}
+            series[name] = value
+        metricsJson[metric.name] = series
+    return metricsJson
+
+
+# Writes the metrics to a json file every `interval` seconds, from a background thread
+class StatsDumper:
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self.__stop = threading.Event()
+        # the counters as of the last dump, and when that was (for working out the rates)
+        self.__last = {}
+        self.__lastTime = started
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            self.dump()
+
+    # writes the stats file right now
+    def dump(self):
+        try:
+            now = time.time()
+            metricsJson = snapshot()
+            rates = {}
+            elapsed = max(now - self.__lastTime, 1e-9)
+            for name, series in metricsJson.items():
+                if registry[name].type != "counter":
+                    continue
+                rates[name] = {key: (value - self.__last.get(name, {}).get(key, 0)) / elapsed for key, value in series.items()}
+            self.__last = {name: series for name, series in metricsJson.items() if registry[name].type == "counter"}
+            self.__lastTime = now
+
+            directory = os.path.dirname(self.path)
+            if directory != "":
+                os.makedirs(directory, exist_ok=True)
+            tempPath = self.path + ".tmp"
+            with open(tempPath, "w") as f:
+                json.dump({"time": now, "uptime": now - started, "metrics": metricsJson, "rates": rates}, f, indent=4)
+            os.replace(tempPath, self.path)
+        except Exception as err:
+            logger.warning(f"Couldn't write the stats file {self.path} ({err})")
+
+    # stops dumping (after writing one last time)
+    def stop(self):
+        self.__stop.set()
+        self.dump()
+
+
+# Answers GET /metrics (Prometheus text) and GET /stats.json
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = prometheusText().encode("utf-8")
+            contentType = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/stats.json":
+            body = json.dumps(snapshot()).encode("utf-8")
+            contentType = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # don't print a line for every scrape
+    def log_message(self, format, *args):
+        pass
+
+
+# Starts serving the metrics on host:port from a background thread, and returns the server
+# (call .shutdown() on it to stop). Only listens locally unless told otherwise
+def serve(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.write(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
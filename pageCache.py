@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import logger
+
+# On-disk cache of the pages we've fetched, so crawling the same neighbourhood again doesn't
+# have to download (and parse) every page again.
+#
+# What gets kept for each page isn't the html, but the links we pulled out of it
+# ([inlinks, outlinks, outdomains], the same as scrape.extractLinks() returns), stored as
+# a blob named after the sha1 of the page's domain and body:
+#   output/pageCache/links/3f/3f786850e387550fdab836ed7e6dc881de23001b.json
+# so two pages with the exact same html (on the same domain) share one blob, and a page that
+# comes back with the same body it had last time doesn't need to be parsed again.
+#
+# The index is a json-lines file mapping each url to its blob, along with the ETag and
+# Last-Modified headers it came with. The last record for a url wins:
+#   {"url": "https://example.com/", "etag": "\"abc\"", "lastModified": null,
+#    "links": "3f786850e...", "fetched": 1700000000.0}
+# Those headers get sent back as If-None-Match/If-Modified-Since next time, so a page that
+# hasn't changed just costs a 304.
+
+
+# Returns the blob key for a page body (the raw bytes, or the decoded str),
+# ex: "3f786850e387550fdab836ed7e6dc881de23001b"
+def contentKey(domain, body):
+    if type(body) == str:
+        body = body.encode("utf-8", errors="replace")
+    h = hashlib.sha1(domain.encode("utf-8"))
+    h.update(b"\n")
+    h.update(body)
+    return h.hexdigest()
+
+
+class PageCache:
+    # folder is where it all goes, ex: "output/pageCache"
+    def __init__(self, folder):
+        self.folder = folder
+        self.indexPath = os.path.join(folder, "index.jsonl")
+        # ex: {"https://example.com/": (etag, lastModified, key), ...}
+        self.__index = {}
+        # how many pages came out of the cache (304s, or the same body as before), and how many got parsed
+        self.hits = 0
+        self.misses = 0
+        # pages are fetched from more than one thread
+        self.__lock = threading.Lock()
+
+        os.makedirs(os.path.join(folder, "links"), exist_ok=True)
+        records, cutOff = self.__load()
+        # if most of the index is old records, rewrite it with just the current ones.
+        # Same if the last record got cut off, or the next one would get tacked onto the end of it
+        if records > 2 * len(self.__index) or cutOff:
+            self.compact()
+        self.__file = open(self.indexPath, "a")
+
+    def __len__(self):
+        return len(self.__index)
+
+    def __contains__(self, url):
+        return url in self.__index
+
+    # Returns the headers to send with a request for url, so the server can answer
+    # with a 304 if the page hasn't changed since we cached it
+    def validators(self, url):
+        headers = {}
+        entry = self.__index.get(url)
+        if entry == None:
+            return headers
+        etag, lastModified, key = entry
+        if etag != None:
+            headers["If-None-Match"] = etag
+        if lastModified != None:
+            headers["If-Modified-Since"] = lastModified
+        return headers
+
+    # Returns the cached (inlinks, outlinks, outdomains) for url, or None if we don't have them
+    def links(self, url):
+        entry = self.__index.get(url)
+        if entry == None:
+            return None
+        return self.blob(entry[2])
+
+    # Returns the (inlinks, outlinks, outdomains) stored under key, or None if there isn't a blob for it
+    def blob(self, key):
+        try:
+            with open(self.blobPath(key)) as f:
+                inlinks, outlinks, outdomains = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return inlinks, outlinks, outdomains
+
+    # saves the links we pulled out of url (whose body hashed to key), along with its validators
+    def put(self, url, etag, lastModified, key, links):
+        path = self.blobPath(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # the thread id keeps two threads saving the same blob from tripping over each other
+            tempPath = f"{path}.{threading.get_ident()}.tmp"
+            with open(tempPath, "w") as f:
+                json.dump(list(links), f)
+            os.replace(tempPath, path)
+
+        record = {"url": url, "etag": etag, "lastModified": lastModified, "links": key, "fetched": time.time()}
+        with self.__lock:
+            self.__index[url] = (etag, lastModified, key)
+            self.__file.write(json.dumps(record) + "\n")
+            self.__file.flush()
+
+    def blobPath(self, key):
+        return os.path.join(self.folder, "links", key[:2], key + ".json")
+
+    # rewrites the index with only the latest record for each url
+    def compact(self):
+        with self.__lock:
+            tempPath = self.indexPath + ".tmp"
+            with open(tempPath, "w") as f:
+                for url, (etag, lastModified, key) in self.__index.items():
+                    f.write(json.dumps({"url": url, "etag": etag, "lastModified": lastModified, "links": key}) + "\n")
+            os.replace(tempPath, self.indexPath)
+
+    def close(self):
+        self.__file.close()
+
+    # counts a page that came out of the cache, or one that had to be parsed
+    # (the counts get bumped from the fetching threads, so they go through the lock)
+    def countHit(self):
+        with self.__lock:
+            self.hits += 1
+
+    def countMiss(self):
+        with self.__lock:
+            self.misses += 1
+
+    # Writes how many pages came out of the cache to the log
+    def logStats(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return
+        logger.write(f"Page cache: {self.hits} of {total} pages unchanged ({self.hits / total:.1%})")
+
+    # reads the index into __index, and returns (how many records were in it, whether any got cut off)
+    def __load(self):
+        if not os.path.exists(self.indexPath):
+            return 0, False
+        records = 0
+        cutOff = False
+        with open(self.indexPath) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # cut off halfway through writing it
+                    cutOff = True
+                    continue
+                records += 1
+                self.__index[record["url"]] = (record["etag"], record["lastModified"], record["links"])
+        logger.write(f"Loaded {len(self.__index)} cached pages from {self.indexPath}")
+        return records, cutOff
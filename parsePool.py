@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+import logger
+import urlTable
+
+# A pool of worker processes that pull the links out of pages, so parsing isn't stuck on
+# one core (behind the GIL) with the threads doing the fetching.
+#
+# With it, spiderConcurrent() is a pipeline with three stages:
+#   fetcher threads  -- raw bytes -->  parser processes  -- links -->  main thread (the graph)
+# The fetchers only do network I/O, and hand over the page body as bytes (along with the
+# encoding from its headers). A worker decodes it, runs it through scrape.extractLinks(),
+# and hands back the standardized, deduplicated (inlinks, outlinks, outdomains).
+#
+# Only queueSize pages can be waiting on (or being parsed by) the workers at once. Once
+# that's full, the spider stops starting new fetches until the workers catch up, so
+# a slow parse stage can't pile up pages in memory.
+
+
+class ParsePool:
+    # processes is how many worker processes to run, and queueSize how many pages can be
+    # handed to them before full() says to stop
+    def __init__(self, processes, queueSize):
+        import scrape
+        self.processes = processes
+        self.queueSize = queueSize
+        # the futures for pages that haven't been parsed yet
+        self.__pending = set(())
+        self.__pool = ProcessPoolExecutor(max_workers=processes, initializer=initWorker,
+                                          initargs=(logger.file, scrape.linkParser))
+
+    def __len__(self):
+        return len(self.__pending)
+
+    # starts up all of the workers (and waits for them).
+    # Call this before starting any threads, since the workers get forked off this process
+    def start(self):
+        list(self.__pool.map(ping, range(self.processes)))
+
+    # Returns True if there are as many pages waiting as the queue can hold
+    def full(self):
+        return len(self.__pending) >= self.queueSize
+
+    # hands a fetched page to the workers, and returns a Future for ((inlinks, outlinks, outdomains), seconds)
+    # (seconds being how long the worker took to parse it)
+    def submit(self, pageURL, body, encoding):
+        future = self.__pool.submit(parsePage, pageURL, body, encoding)
+        self.__pending.add(future)
+        future.add_done_callback(self.__pending.discard)
+        return future
+
+    # stops the workers, dropping any pages that haven't been started on
+    def shutdown(self, wait=True):
+        self.__pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# Runs in each worker when it starts up, so it has the same settings as the spider
+# (they're already there if the worker was forked, but not if it was spawned)
+def initWorker(logFile, linkParser):
+    import scrape
+    logger.setFile(logFile)
+    scrape.linkParser = linkParser
+
+def ping(i):
+    return i
+
+# Runs in a worker: returns ((inlinks, outlinks, outdomains), seconds) for a page, with any duplicates
+# taken out of the links (the time gets sent back since the worker's own metrics never get read)
+def parsePage(pageURL, body, encoding):
+    import scrape
+    start = time.perf_counter()
+    inlinks, outlinks, outdomains = scrape.extractLinks(decode(body, encoding), pageURL)
+    inlinks = scrape.dedupe(inlinks)
+    outlinks = scrape.dedupe(outlinks)
+    links = (inlinks, outlinks, [urlTable.splitURL(link)[0] for link in outlinks])
+    return links, time.perf_counter() - start
+
+# Returns the page body as a str, decoded the same way requests' Response.text does it
+# (with the encoding from the headers, or else whatever it looks like)
+def decode(body, encoding):
+    if encoding == None:
+        encoding = requests.compat.chardet.detect(body)["encoding"]
+    try:
+        return str(body, encoding, errors="replace")
+    except (LookupError, TypeError):
+        return str(body, errors="replace")
@@ -0,0 +1,201 @@
+import cProfile
+import contextlib
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from array import array
+
+import logger
+
+# Where a crawl's time goes, stage by stage (robots checks, politeness sleeps, the network,
+# parsing, graph inserts, ...), plus cProfile and tracemalloc if they're asked for.
+#
+# Code marks its stages with either:
+#   with profiler.stage("fetch"):
+#       ...
+# or @profiler.timed("robots") on a whole function. Stages can be inside each other, and each
+# one only gets charged for its own time (not the time spent in the stages inside it), so the
+# shares in the report add up to (at most) the whole crawl. Ex: "robots" is the robots check
+# minus "robots.fetch", the time spent actually downloading the file.
+#
+# None of it does anything unless `enabled` is set (config "profile"), and then begin() and
+# finish() go around the crawl, and finish() writes the report:
+#   stage              calls   total (s)   p50 (ms)   p95 (ms)    share
+#   fetch               1520      80.213     45.102    120.311    65.0%
+#   ...
+# (the concurrent spider does stages on several threads at once, so there the shares can
+# add up to more than 100%)
+
+enabled = False
+# run cProfile over the crawl (only sees the main thread)
+useCProfile = False
+# trace memory allocations, and note how much is in use every tracemallocInterval seconds
+useTracemalloc = False
+tracemallocInterval = 60
+tracemallocFrames = 10
+
+# ex: {"fetch": array("d", [0.045, 0.121, ...]), ...} (seconds, for each time a stage ran)
+samples = {}
+lock = threading.Lock()
+# each thread's stack of the stages it's in
+local = threading.local()
+nullStage = contextlib.nullcontext()
+
+started = None
+profile = None
+# ex: [(seconds since begin(), bytes in use, peak bytes), ...]
+memorySamples = []
+sampler = None
+stopSampling = threading.Event()
+
+
+# A stage being timed (see the top of the file)
+class Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(local, "stack", None)
+        if stack == None:
+            stack = []
+            local.stack = stack
+        stack.append(self)
+        # time spent in stages inside this one
+        self.inner = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        stack = local.stack
+        stack.pop()
+        if len(stack) > 0:
+            stack[-1].inner += elapsed
+        record(self.name, elapsed - self.inner)
+        return False
+
+
+# Returns a with block that times the stage `name` (or does nothing if profiling is off)
+def stage(name):
+    if not enabled:
+        return nullStage
+    return Stage(name)
+
+# decorator that times every call to a function as the stage `name`
+def timed(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def timedFn(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with Stage(name):
+                return fn(*args, **kwargs)
+        return timedFn
+    return decorate
+
+def record(name, seconds):
+    with lock:
+        times = samples.get(name)
+        if times == None:
+            times = array("d")
+            samples[name] = times
+        times.append(seconds)
+
+
+# starts profiling (call right before the crawl)
+def begin():
+    global started, profile, sampler
+    if not enabled:
+        return
+    samples.clear()
+    memorySamples.clear()
+    started = time.perf_counter()
+    if useTracemalloc:
+        tracemalloc.start(tracemallocFrames)
+        stopSampling.clear()
+        sampler = threading.Thread(target=sampleMemory, daemon=True)
+        sampler.start()
+    if useCProfile:
+        profile = cProfile.Profile()
+        profile.enable()
+
+def sampleMemory():
+    while not stopSampling.wait(tracemallocInterval):
+        current, peak = tracemalloc.get_traced_memory()
+        memorySamples.append((time.perf_counter() - started, current, peak))
+        logger.write(f"Memory: {current / 2**20:.1f} MiB in use (peak {peak / 2**20:.1f} MiB)")
+
+# stops profiling, and writes the report to path (and the stage breakdown to the log)
+def finish(path):
+    global profile, sampler
+    if not enabled or started == None:
+        return
+    wall = time.perf_counter() - started
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    sections = [stageReport(wall)]
+    logger.write("Crawl profile:\n" + sections[0])
+
+    if profile != None:
+        profile.disable()
+        profile.dump_stats(os.path.splitext(path)[0] + ".prof")
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(30)
+        sections.append("cProfile (top 30 by cumulative time, full stats in the .prof file):\n" + out.getvalue())
+        profile = None
+
+    if sampler != None:
+        stopSampling.set()
+        sampler.join()
+        sampler = None
+        sections.append(memoryReport())
+        tracemalloc.stop()
+
+    with open(path, "w") as f:
+        f.write("\n\n".join(sections) + "\n")
+    logger.write(f"Profile saved to {path}")
+
+# Returns the per stage breakdown, as a table (see the top of the file)
+def stageReport(wall):
+    lines = [f"wall time: {wall:.3f} s",
+             f"{'stage':<20} {'calls':>8} {'total (s)':>11} {'p50 (ms)':>10} {'p95 (ms)':>10} {'share':>8}"]
+    with lock:
+        stages = [(name, sorted(times)) for name, times in samples.items()]
+    stages.sort(key=lambda item: -sum(item[1]))
+    tracked = 0
+    for name, times in stages:
+        total = sum(times)
+        tracked += total
+        lines.append(f"{name:<20} {len(times):>8} {total:>11.3f} {percentile(times, 50) * 1e3:>10.3f} "
+                     f"{percentile(times, 95) * 1e3:>10.3f} {share(total, wall):>8}")
+    lines.append(f"{'(everything else)':<20} {'':>8} {max(wall - tracked, 0):>11.3f} {'':>10} {'':>10} "
+                 f"{share(max(wall - tracked, 0), wall):>8}")
+    return "\n".join(lines)
+
+# Returns the memory samples, and where the memory still in use got allocated
+def memoryReport():
+    lines = ["tracemalloc:"]
+    for seconds, current, peak in memorySamples:
+        lines.append(f"  {seconds:>9.1f} s  {current / 2**20:>10.1f} MiB in use  (peak {peak / 2**20:.1f} MiB)")
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append(f"  at the end: {current / 2**20:.1f} MiB in use (peak {peak / 2**20:.1f} MiB)")
+    lines.append("top 20 allocation sites:")
+    for stat in tracemalloc.take_snapshot().statistics("lineno")[:20]:
+        lines.append(f"  {stat}")
+    return "\n".join(lines)
+
+# Returns the p-th percentile of a sorted list (0 if it's empty)
+def percentile(times, p):
+    if len(times) == 0:
+        return 0
+    return times[min(int(len(times) * p / 100), len(times) - 1)]
+
+def share(seconds, wall):
+    if wall <= 0:
+        return "-"
+    return f"{seconds / wall:.1%}"
@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+import urllib.robotparser as rp
+
+import logger
+
+# Disk-backed cache of robots.txt files, so a restarted (or resumed) crawl doesn't have to
+# download every one of them again.
+#
+# For each domain, the store keeps the robots.txt file itself (along with the HTTP status it
+# came back with), when we fetched it, and when that goes stale. The rules get parsed the
+# first time they're needed, and then every check is done against the url's own path, ex:
+# with "Disallow: /private/", example.com/blog/ is allowed and example.com/private/x/ isn't.
+#
+# On disk it's a json-lines file, one record per fetch, and the last record for a domain wins:
+#   {"domain": "example.com", "status": 200, "text": "User-agent: *...", "delay": 2,
+#    "fetched": 1700000000.0, "expires": 1700086400.0}
+# Domains we couldn't reach at all get "status": null, and a shorter ttl, so we try them
+# again sooner (but not on every restart).
+
+# seconds until a robots.txt file needs to be fetched again
+ttl = 24 * 60 * 60
+# same thing, but for domains where we couldn't get one at all
+unreachableTtl = 60 * 60
+
+
+# The robots.txt rules for one domain
+class RobotsEntry:
+    def __init__(self, domain, status, text, fetched, expires):
+        self.domain = domain
+        # HTTP status code, or None if the domain couldn't be reached
+        self.status = status
+        self.text = text
+        # time.time() of when it was fetched, and when it goes stale
+        self.fetched = fetched
+        self.expires = expires
+        self.__parser = None
+
+    # the parsed rules (parsed the first time they're used)
+    def parser(self):
+        if self.__parser == None:
+            rfp = rp.RobotFileParser()
+            # this is what RobotFileParser.read() does with the response
+            if self.status == None:
+                rfp.allow_all = True
+            elif self.status in (401, 403):
+                rfp.disallow_all = True
+            elif self.status >= 400 and self.status < 500:
+                rfp.allow_all = True
+            elif self.status < 400:
+                rfp.parse(self.text.splitlines())
+            self.__parser = rfp
+        return self.__parser
+
+    # Returns True if userAgent may fetch url
+    def allowed(self, url, userAgent):
+        return self.parser().can_fetch(userAgent, url)
+
+    # Returns the crawl-delay for userAgent (0 if there isn't one)
+    def delay(self, userAgent):
+        delay = self.parser().crawl_delay(userAgent)
+        if delay == None:
+            return 0
+        return delay
+
+    def expired(self, now=None):
+        if now == None:
+            now = time.time()
+        return now >= self.expires
+
+
+class RobotsStore:
+    # path is the file to keep it in (None to only keep it in memory)
+    def __init__(self, path=None, userAgent="*"):
+        self.path = path
+        self.userAgent = userAgent
+        # ex: {"example.com": <RobotsEntry example.com>, ...}
+        self.__entries = {}
+        self.__file = None
+        # how many check()s were answered from the store, and how many needed the file fetching first
+        self.hits = 0
+        self.misses = 0
+        # the spider fetches robots.txt files from more than one thread
+        self.__lock = threading.Lock()
+
+        if path != None:
+            directory = os.path.dirname(path)
+            if directory != "":
+                os.makedirs(directory, exist_ok=True)
+            records, cutOff = self.__load()
+            # if most of the file is old records, rewrite it with just the current ones.
+            # Same if the last record got cut off, or the next one would get tacked onto the end of it
+            if records > 2 * len(self.__entries) or cutOff:
+                self.compact()
+            self.__file = open(path, "a")
+
+    def __len__(self):
+        return len(self.__entries)
+
+    # Returns the entry for domain, or None if we don't have one (or it's gone stale)
+    def get(self, domain, now=None):
+        entry = self.__entries.get(domain)
+        if entry == None or entry.expired(now):
+            return None
+        return entry
+
+    # Returns (allowed, delay) for url, from its domain's cached rules.
+    # Returns None if the domain's robots.txt needs to be fetched first
+    def check(self, domain, url, now=None):
+        entry = self.get(domain, now)
+        if entry == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.allowed(url, self.userAgent), entry.delay(self.userAgent)
+
+    # Returns the crawl-delay for domain, even if its entry has gone stale (0 if there isn't one)
+    def delay(self, domain):
+        entry = self.__entries.get(domain)
+        if entry == None:
+            return 0
+        return entry.delay(self.userAgent)
+
+    # saves a robots.txt file we just fetched for domain (with the HTTP status it came back with),
+    # and returns its entry
+    def put(self, domain, status, text, now=None):
+        if now == None:
+            now = time.time()
+        expires = now + ttl
+        # server errors get retried sooner, the same as not getting through at all
+        if status == None or status >= 500:
+            expires = now + unreachableTtl
+        entry = RobotsEntry(domain, status, text, now, expires)
+        with self.__lock:
+            self.__entries[domain] = entry
+            if self.__file != None:
+                self.__file.write(json.dumps(self.__record(entry)) + "\n")
+                self.__file.flush()
+        return entry
+
+    # saves that we couldn't reach domain at all (so everything on it is allowed for now)
+    def unreachable(self, domain, now=None):
+        return self.put(domain, None, "", now)
+
+    # rewrites the file with only the latest record for each domain
+    def compact(self):
+        with self.__lock:
+            tempPath = self.path + ".tmp"
+            with open(tempPath, "w") as f:
+                for entry in self.__entries.values():
+                    f.write(json.dumps(self.__record(entry)) + "\n")
+            if self.__file != None:
+                self.__file.close()
+            os.replace(tempPath, self.path)
+            if self.__file != None:
+                self.__file = open(self.path, "a")
+
+    def close(self):
+        if self.__file != None:
+            self.__file.close()
+            self.__file = None
+
+    def __record(self, entry):
+        return {"domain": entry.domain, "status": entry.status, "text": entry.text,
+                "delay": entry.delay(self.userAgent), "fetched": entry.fetched, "expires": entry.expires}
+
+    # reads the file into __entries, and returns (how many records were in it, whether any got cut off)
+    def __load(self):
+        if not os.path.exists(self.path):
+            return 0, False
+        records = 0
+        cutOff = False
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # cut off halfway through writing it
+                    cutOff = True
+                    continue
+                records += 1
+                self.__entries[record["domain"]] = RobotsEntry(record["domain"], record["status"], record["text"],
+                                                               record["fetched"], record["expires"])
+        logger.write(f"Loaded {len(self.__entries)} robots.txt files from {self.path}")
+        return records, cutOff
@@ -0,0 +1,114 @@
+import heapq
+import itertools
+import time
+
+# Politeness scheduler for the concurrent spider.
+#
+# Work is queued up per domain, and each domain is in one of three states:
+#   idle    - nothing in flight, so its next item can go as soon as someone asks
+#   busy    - a request to it is in flight (we never send two at once)
+#   cooling - its last request finished, and it's waiting out its crawl-delay
+# Only the domain that is cooling down has to wait. Work for every other domain
+# can go ahead in the meantime.
+#
+# Within a domain, and across the domains that are ready, the item with the lowest
+# depth goes first (ties go to whoever was queued first).
+class DomainScheduler:
+    def __init__(self):
+        # ex: {"example.com": [(depth, order, item), ...], ...} (each one is a heap)
+        self.__queues = {}
+        # domains that have something in flight
+        self.__busy = set(())
+        # ex: {"example.com": 1234.5, ...} (time.monotonic() when it's allowed again)
+        self.__cooling = {}
+        # heap of (time.monotonic(), domain), so we know which domain wakes up next
+        self.__wakeups = []
+        # heap of (depth, order, domain) for idle domains with something queued.
+        # Entries can go stale (the domain got busy, or its first item changed),
+        # so they're checked when they come off the heap.
+        self.__ready = []
+        # tie-breaker, so items themselves never get compared
+        self.__order = itertools.count()
+        self.__size = 0
+
+    # number of items waiting (not counting the ones in flight)
+    def __len__(self):
+        return self.__size
+
+    # queue up an item for a domain, at the given depth
+    def push(self, domain, depth, item):
+        entry = (depth, next(self.__order), item)
+        if domain not in self.__queues:
+            self.__queues[domain] = []
+        heapq.heappush(self.__queues[domain], entry)
+        self.__size += 1
+        # if this is now the first thing in line for an idle domain, it's ready to go
+        if self.__isIdle(domain) and self.__queues[domain][0] is entry:
+            heapq.heappush(self.__ready, (depth, entry[1], domain))
+
+    # Returns (domain, depth, item) for the next item that's allowed to go, or None
+    # if every domain with work queued is either busy or cooling down.
+    # The domain is marked busy until release() is called for it.
+    def pop(self, now=None):
+        if now == None:
+            now = time.monotonic()
+        self.__wake(now)
+
+        while len(self.__ready) > 0:
+            depth, order, domain = heapq.heappop(self.__ready)
+            queue = self.__queues.get(domain)
+            # skip stale entries
+            if not self.__isIdle(domain) or not queue or queue[0][1] != order:
+                continue
+            depth, order, item = heapq.heappop(queue)
+            if len(queue) == 0:
+                del self.__queues[domain]
+            self.__size -= 1
+            self.__busy.add(domain)
+            return domain, depth, item
+        return None
+
+    # marks the domain as done with its request, and starts it cooling down
+    # for `delay` seconds before anything else gets sent to it
+    def release(self, domain, delay=0, now=None):
+        if now == None:
+            now = time.monotonic()
+        self.__busy.discard(domain)
+        if delay > 0:
+            self.__cooling[domain] = now + delay
+            heapq.heappush(self.__wakeups, (now + delay, domain))
+        else:
+            self.__cooling.pop(domain, None)
+            self.__markReady(domain)
+
+    # Returns the number of seconds until the next cooling domain is allowed again,
+    # or None if nothing is cooling down
+    def nextWakeup(self, now=None):
+        if now == None:
+            now = time.monotonic()
+        while len(self.__wakeups) > 0:
+            wakeAt, domain = self.__wakeups[0]
+            # skip stale entries
+            if self.__cooling.get(domain) != wakeAt:
+                heapq.heappop(self.__wakeups)
+                continue
+            return max(wakeAt - now, 0)
+        return None
+
+    def __isIdle(self, domain):
+        return domain not in self.__busy and domain not in self.__cooling
+
+    # put the domain back in the ready heap if it has anything queued
+    def __markReady(self, domain):
+        queue = self.__queues.get(domain)
+        if self.__isIdle(domain) and queue:
+            depth, order, item = queue[0]
+            heapq.heappush(self.__ready, (depth, order, domain))
+
+    # move every domain that has finished cooling down back to idle
+    def __wake(self, now):
+        while len(self.__wakeups) > 0 and self.__wakeups[0][0] <= now:
+            wakeAt, domain = heapq.heappop(self.__wakeups)
+            if self.__cooling.get(domain) == wakeAt:
+                del self.__cooling[domain]
+                self.__markReady(domain)
@@ -2,15 +2,30 @@ import datetime
 import requests
 from bs4 import BeautifulSoup
 import time
-import urllib.robotparser as rp
 import json
+import os
 import networkx as nx
 import signal
 import sys
-import socket
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import logger
 import graphHandler as gh
+import scheduler
+import httpSession
+import linkExtractor
+import checkpoint
+import urlTable
+import domainMatcher
+import robotsStore
+import pageCache
+import layout
+import analytics
+import parsePool
+import metrics
+import profiler
+import shard
 
 # Create an empty graph to start
 G = gh.Graph()
@@ -19,7 +34,11 @@ G = gh.Graph()
 interrupt = False
 spider_started = False
 
-robotCache = {}
+# robots.txt rules for each domain we've been to (see robotsStore.py)
+robots = robotsStore.RobotsStore(userAgent="WebGraphUtility")
+
+# ex: {"example.com": 1234.5, ...} (time.monotonic() of our last request to each domain)
+lastRequest = {}
 
 global lastSaved
 
@@ -50,25 +69,9 @@ class Data:
         return f"{self.linkDict}, {self.linkProgressDict}, {self.urlIndex}"
 
 # returns (domain, resource) as a 2-tuple of a URL. Does not verify input.
+# (if the url is in urlTable, urlTable.domain() is quicker, since it's already been split)
 def splitURL(link, getDomain=""):
-    # find the first "/" AFTER the protocol ("https://")
-    start = 8
-    if link.find("https://") < 0:
-        start = 7
-        if link.find("http://") < 0:
-            start = 0
-    split = link.find("/", start)
-    # if there is no "/" at the end, that means there is no resource
-    if split < 0:
-        split = len(link)
-        resource = ""
-    else:
-        # everything after the "/"
-        resource = link[split+1:]
-    # everything between "https://" and "/"
-    domain = link[start:split]
-
-    return domain, resource
+    return urlTable.splitURL(link)
 
 # Returns Second-Level Domain of a provided domain
 # 
@@ -115,33 +118,52 @@ def standardizeLink(link, getDomain):
 def parseWebpage(pageURL):
     getDomain, getResource = splitURL(pageURL)
     retry = 0
-    baseDelay = robotsCheck(pageURL)[1]
-    # even if they didn't specifically mention a delay in their robots.txt,
-    # let's be courtieous and wait 0.5 seconds between requests
-    if baseDelay == 0:
-        baseDelay = 0.5
+    baseDelay = politeDelay(robotsCheck(pageURL)[1])
     while(retry < 3):
-        logger.write("Fetching resource: "+pageURL)
-        delay = 5 * retry + baseDelay
-        logger.write("Waiting "+str(delay)+" seconds...")
-        # 1, 6, 11, 16 seconds, etc
-        time.sleep(delay)
+        logger.write("Fetching resource: "+pageURL, key="fetch")
+        # 0.5, 5.5, 10.5 seconds, etc. The base delay only counts from our last request
+        # to this domain, so we don't sit around if we've been busy with other sites
+        delay = 5 * retry + cooldown(getDomain, baseDelay)
+        if delay > 0:
+            logger.write("Waiting "+str(delay)+" seconds...", key="wait")
+            with profiler.stage("sleep"):
+                time.sleep(delay)
         try:
-            reqs = requests.get(pageURL, headers=requestHeaders)
-            soup = BeautifulSoup(reqs.text, 'html.parser')
-            break
+            return fetchLinks(pageURL)
         except Exception:
-            logger.write("Exception caught. Retrying...")
+            logger.warning("Exception caught. Retrying...")
+            metrics.retries.inc(kind="page")
             retry += 1
 
-    inlinks = []
-    outlinks = []
-    outdomains = []
-
     # If we weren't able to fetch the page, return empty lists
-    if(retry == 3):
-        return inlinks, outlinks, outdomains
+    return [], [], []
+
+# even if they didn't specifically mention a delay in their robots.txt,
+# let's be courtieous and wait defaultDelay (0.5) seconds between requests
+def politeDelay(delay):
+    if delay == 0:
+        return defaultDelay
+    return delay
+
+# returns how many more seconds we have to wait before sending another request
+# to domain, given that it wants `delay` seconds between requests
+def cooldown(domain, delay):
+    if domain not in lastRequest:
+        return 0
+    return max(lastRequest[domain] + delay - time.monotonic(), 0)
+
+# Returns the href of each <a> tag in the html (skipping missing or empty ones).
+# Uses the streaming extractor, unless config.json asks for BeautifulSoup.
+# BeautifulSoup is also the fallback if the streaming extractor chokes on a page.
+def getHrefs(html):
+    if linkParser == "stream":
+        try:
+            return linkExtractor.hrefs(html)
+        except Exception as err:
+            logger.warning(f"Link extractor failed ({err}), falling back to BeautifulSoup")
 
+    soup = BeautifulSoup(html, 'html.parser')
+    hrefs = []
     # iterate through each <a> tag
     for a in soup.find_all('a'):
         # get the link
@@ -151,22 +173,108 @@ def parseWebpage(pageURL):
             continue
         if link == "":
             continue
-        # standardize it
-        link = standardizeLink(link, getDomain) 
-        # input validation
-        if link == None or link == "":
-            continue
+        hrefs.append(link)
+    return hrefs
+
+# Makes a single attempt at fetching the page, returning the html.
+# Raises an exception if the request fails
+def fetchPage(pageURL):
+    return fetchResponse(pageURL).text
+
+# Makes a single attempt at GETting the page (with any extra headers), returning the response.
+# Raises an exception if the request fails
+def fetchResponse(pageURL, headers={}):
+    domain = splitURL(pageURL)[0]
+    try:
+        with profiler.stage("fetch"):
+            reqs = httpSession.get(pageURL, headers={**requestHeaders, **headers})
+    finally:
+        lastRequest[domain] = time.monotonic()
+    return reqs
+
+# Writes how the connection pool and the page cache have been doing to the log
+def logFetchStats():
+    httpSession.logConnectionStats()
+    if pages != None:
+        pages.logStats()
+
+# Makes a single attempt at fetching the page, without pulling the links out of it.
+# Returns (links, page):
+#   - if the links came out of the page cache (the page hasn't changed since last time: a 304,
+#     or the same body), links is (inlinks, outlinks, outdomains) and page is None
+#   - otherwise links is None, and page is (body, encoding, cacheEntry), with the body as raw bytes.
+#     Once the links have been pulled out of it, they go to cacheLinks() with the cacheEntry
+# Raises an exception if the request fails
+def fetchUnparsed(pageURL):
+    if pages == None:
+        reqs = fetchResponse(pageURL)
+        return None, (reqs.content, reqs.encoding, None)
+
+    reqs = fetchResponse(pageURL, pages.validators(pageURL))
+    if reqs.status_code == 304:
+        links = pages.links(pageURL)
+        if links != None:
+            pages.countHit()
+            return links, None
+        # we lost the links somehow, so get the whole page again.
+        # That's another request to the same site, so it has to wait its turn like any other
+        domain = splitURL(pageURL)[0]
+        delay = cooldown(domain, politeDelay(robotsCheck(pageURL)[1]))
+        if delay > 0:
+            logger.write("Waiting "+str(delay)+" seconds...", key="wait")
+            with profiler.stage("sleep"):
+                time.sleep(delay)
+        reqs = fetchResponse(pageURL)
+
+    key = pageCache.contentKey(splitURL(pageURL)[0], reqs.content)
+    # only cache proper pages (not errors, which might be gone next time)
+    cacheEntry = None
+    if reqs.status_code == 200:
+        cacheEntry = (reqs.headers.get("ETag"), reqs.headers.get("Last-Modified"), key)
+    links = pages.blob(key)
+    if links != None:
+        pages.countHit()
+        cacheLinks(pageURL, cacheEntry, links)
+        return links, None
+    pages.countMiss()
+    return None, (reqs.content, reqs.encoding, cacheEntry)
+
+# saves the links pulled out of a page in the page cache (cacheEntry is from fetchUnparsed())
+def cacheLinks(pageURL, cacheEntry, links):
+    if pages != None and cacheEntry != None:
+        etag, lastModified, key = cacheEntry
+        pages.put(pageURL, etag, lastModified, key, links)
+
+# given the html of a page, returns (inlinks, outlinks, outdomains) for all of the links on it
+def extractLinks(html, pageURL):
+    getDomain, getResource = splitURL(pageURL)
 
-        # Isolate the domain
-        domain, resource = splitURL(link)
+    inlinks = []
+    outlinks = []
+    outdomains = []
 
-        # same domain -> inlinks
-        if(domain == getDomain):
-            inlinks.append(link)
-        # different domain (or subdomain) -> outlinks
-        else:
-            outlinks.append(link)
-            outdomains.append(domain)
+    with profiler.stage("parse.html"):
+        hrefs = getHrefs(html)
+
+    # iterate through each link
+    with profiler.stage("parse.links"):
+        for link in hrefs:
+            # standardize it
+            link = standardizeLink(link, getDomain) 
+            # input validation
+            if link == None or link == "":
+                continue
+
+            # Isolate the domain
+            domain, resource = splitURL(link)
+
+            # same domain -> inlinks
+            if(domain == getDomain):
+                inlinks.append(link)
+            # different domain (or subdomain) -> outlinks
+            else:
+                outlinks.append(link)
+                outdomains.append(domain)
 
     
     return inlinks, outlinks, outdomains
@@ -220,69 +328,69 @@ def countUrls(links, urls):
 
         # add link to urls if it's not from one of the untracked domains
         domain, resource = splitURL(link)
-        track = True
-        # go through each untracked domain
-        for u in untrackedDomains:
-            # if our domain is a subdomain of the untracked domains, ignore it
-            if domain.endswith(u):
-                track = False
+        # if our domain is (a subdomain of) one of the untracked domains, ignore it
+        track = not untrackedMatcher.matches(domain)
         # otherwise, add it
         if(track):
             urls.add(link)
 
 # returns True if the url is allowed to be scraped
+@profiler.timed("robots")
 def robotsCheck(url):
     domain, resource = splitURL(url)
-    global robotCache
 
-    if domain not in robotCache:
-        rfp = rp.RobotFileParser()
-
-        # use whatever protocol we were linked to the page with
-        if url.find("https://") != -1:
-            robotURL = "https://"+domain+"/robots.txt"
-        else:
-            robotURL = "http://"+domain+"/robots.txt"
-
-
-        rfp.set_url(robotURL)
+    result = robots.check(domain, url)
+    if result == None:
         retry = 0
-        logger.write(f"Fetching robots file {robotURL}")
         while(retry < 3):
             try:
-                rfp.read()
-                break
+                return fetchRobots(url)
             except Exception:
                 retry += 1
                 if interrupt:
                     break
                 # Don't sleep on the last loop
                 if retry < 3:
-                    logger.write(f"Couldn't get robots file for {domain}. Waiting {5} seconds...")
-                    time.sleep(5)
-        else:
-            logger.write("Couldn't get resource. Skipping check.")
-            allowed = True
-            delay = 0
-            robotCache.update({domain: [allowed, delay]})
-            return allowed, delay
-
-
-        delay = rfp.crawl_delay(requestHeaders["User-Agent"])
-        if delay == None:
-            delay = 0
+                    logger.warning(f"Couldn't get robots file for {domain}. Waiting {5} seconds...")
+                    metrics.retries.inc(kind="robots")
+                    with profiler.stage("sleep"):
+                        time.sleep(5)
+        return robotsUnreachable(domain)
+
+    # load from cache
+    return result
+
+# Makes a single attempt at fetching the robots.txt file for url's domain, and caches the result.
+# Returns (allowed, delay), the same as robotsCheck(). Raises an exception if the request fails
+def fetchRobots(url):
+    domain, resource = splitURL(url)
 
-        allowed = rfp.can_fetch(requestHeaders["User-Agent"], url)
-        if allowed == None:
-            allowed = rfp.can_fetch("*", url)
-        
-        # save to cache
-        robotCache.update({domain: [allowed, delay]})
+    # use whatever protocol we were linked to the page with
+    if url.find("https://") != -1:
+        robotURL = "https://"+domain+"/robots.txt"
     else:
-        # load from cache
-        allowed = robotCache[domain][0]
-        delay = robotCache[domain][1]
+        robotURL = "http://"+domain+"/robots.txt"
 
+    logger.write(f"Fetching robots file {robotURL}", key="robots")
+    try:
+        with profiler.stage("robots.fetch"):
+            reqs = httpSession.get(robotURL, headers=requestHeaders)
+    finally:
+        lastRequest[domain] = time.monotonic()
+
+    # save to cache (the rules are only kept for ok responses, see robotsStore.RobotsEntry)
+    text = ""
+    if reqs.status_code < 400:
+        text = reqs.content.decode("utf-8", errors="replace")
+    entry = robots.put(domain, reqs.status_code, text)
+    return entry.allowed(url, robots.userAgent), entry.delay(robots.userAgent)
+
+# gives up on fetching the robots.txt file for domain, and caches that it's all allowed (for a while)
+def robotsUnreachable(domain):
+    logger.warning("Couldn't get resource. Skipping check.")
+    robots.unreachable(domain)
+    allowed = True
+    delay = 0
     return allowed, delay
 
 # depricated in favor of just using a library (wrapped up inside of robotsCheck())
@@ -469,11 +577,6 @@ def spiderDFS(startingUrls, maxDepth):
     global lastSaved
     lastSaved = time.monotonic()
 
-
-    # if it takes more than 30 seconds to grab something, honestly it deserves to
-    # just timeout at that point
-    socket.setdefaulttimeout(30) 
-
     # Keep crawling until we've finished our DFS on each starting node
     while len(startingUrls) > 0:
         # Dequeue an item from the front of the line
@@ -492,28 +595,28 @@ def spiderDFS(startingUrls, maxDepth):
         spiderDFS_visit(u, 0, maxDepth)
         if interrupt:
             break
+    logFetchStats()
 
 # returns true if you should fetch the site, false otherwise.
 # It's based on both the untrackedDomains, and (eventually) the robots.txt protocol
 def siteCheck(url):
-    track = True
-    for d in untrackedDomains:
-        if d in url:
-            track = False
-            break
+    track = not untrackedMatcher.matchesUrl(url)
 
     # put a robots.txt check here eventually
     
     return track
 
-# visits a node, recursively tracing down until it hits a leaf or reaches maxDepth
-def spiderDFS_visit(u: gh.Vertex, depth: int, maxDepth: int):
+# visits a node, recursively tracing down until it hits a leaf or reaches maxDepth.
+# If its edges are already in G (ex: it got committed right before a crash, see spiderDFS_resume()),
+# pass expanded=True so they don't get added a second time
+@profiler.timed("dfs.visit")
+def spiderDFS_visit(u: gh.Vertex, depth: int, maxDepth: int, expanded=False):
     # if this is our fist time on this node, add it to the graph
-    if(G.getVertex(u) == None):
-        G.V.append(u)
+    u = G.addVertex(u)
 
     u.dist = depth
     u.color = "gray"
+    G.logVertex(u)
     
     # Base Case #1
     # Stop digging if we've hit our maxDepth or if this is a no-go site
@@ -525,17 +628,28 @@ def spiderDFS_visit(u: gh.Vertex, depth: int, maxDepth: int):
         return
 
     if not u.isAdjacentCached():
-            logger.write(f"Depth: {depth}")
-
-    # iterate through each of the adjacent nodes (shares an edge)
-    for v in u.getAdjacent():
-        # create the corresponding node, unless it already exists
-        # (that's how this func works)
-        v = G.addVertex_url(v)
-
-        # Create the edge in the graph
-        G.addEdge(gh.Edge(u, v))
-
+            logger.write(f"Depth: {depth}", key="depth")
+
+    # add each of the adjacent nodes (shares an edge), and the edge to it
+    adjacent = []
+    with profiler.stage("graph"):
+        for v in u.getAdjacent():
+            # create the corresponding node, unless it already exists
+            # (that's how this func works)
+            v = G.addVertex_url(v)
+            adjacent.append(v)
+
+            # Create the edge in the graph
+            if not expanded:
+                G.addEdge(gh.Edge(u, v))
+
+    # that's the whole page, so it's a finished unit of work for the checkpoint log.
+    # (It has to be committed before going any deeper: each child commits too, and that
+    # would take half of this page's edges along with it)
+    with profiler.stage("checkpoint"):
+        G.commit()
+
+    for v in adjacent:
         # Recursive Case
         ## we check unvisited nodes, as well as nodes who have "unoptimized" paths
         ## (see my explanation inside spiderDFS())
@@ -548,36 +662,468 @@ def spiderDFS_visit(u: gh.Vertex, depth: int, maxDepth: int):
         # Base Case #2
         else:
             pass
+    # if we got stopped partway, it stays gray so spiderDFS_resume() comes back to the rest
+    if interrupt:
+        return
     u.color = "black"
+    with profiler.stage("checkpoint"):
+        G.logVertex(u)
+        G.commit()
 
     # Save to disk if it's been a while
+    with profiler.stage("autosave"):
+        autosave()
+
+# Saves a backup of G to disk if it's been a while since the last one
+def autosave():
     global lastSaved
     now = time.monotonic()
     if now - lastSaved >= (10 * 60):   # 10 minutes
-        logger.write("Automatically saving backup to disk...")
-        # This probably deserves proper error handling at some point
+        logFetchStats()
+        logger.write(f"Progress: {len(G.V)} pages on {len(G.domainPages())} domains")
+        # the domain graph is cheap to write out, so keep an up to date copy of it around
         try:
-            G.save(f"temp/{title}_backup__{getTimestamp()}")
-            logger.write("Backup saved! Resuming crawl...")
+            G.saveDomainGraph(title)
         except Exception as err:
-            logger.write("WARNING: backup failed! See below:")
-            logger.write(err)
+            logger.error("Couldn't save the domain graph! See below:")
+            logger.error(err)
+        # With a checkpoint log, everything is already on disk
+        # (and it compacts itself as it grows), so there's nothing to do
+        if G.log == None:
+            logger.write("Automatically saving backup to disk...")
+            # This probably deserves proper error handling at some point
+            try:
+                G.save(f"temp/{title}_backup__{getTimestamp()}")
+                logger.write("Backup saved! Resuming crawl...")
+            except Exception as err:
+                logger.error("Backup failed! See below:")
+                logger.error(err)
         lastSaved = now
 
+# Returns the vertices a crawl of a loaded graph should pick back up from, lowest dist first:
+# everything still in the frontier (if the graph came from a checkpoint), and any other gray
+# vertices (the edge of the old crawl, ex: when going deeper than last time)
+def resumePoints(maxDepth):
+    points = {}
+    for v in G.V:
+        if v.color == "gray" and v.dist != None:
+            points[v.id] = v
+    for url, depth, retry in G.frontier.items():
+        v = G.getVertex(url)
+        if v != None and v.color != "black":
+            points[v.id] = v
+    return sorted([v for v in points.values() if v.dist < maxDepth and siteCheck(v.url)], key=lambda v: v.dist)
+
+# spider that does a breadth-first search out from all of the starting urls at once,
+# crawling a maximum distance of `maxDepth` from any of them.
+#
+# Unlike spiderDFS(), every page is reached at its true (shortest) distance first, so each one
+# is only expanded once, and its edges are only added once. There's no recursion either,
+# just one queue of pages for each depth, so the only thing that grows is the frontier.
+def spiderBFS(startingUrls, maxDepth):
+    logger.write("STARTING SPIDER!")
+
+    global spider_started
+    spider_started = True
+
+    global lastSaved
+    lastSaved = time.monotonic()
+
+    # frontier[d] is the line of pages waiting to be expanded at depth d
+    frontier = [deque() for d in range(maxDepth)]
+
+    # marks that we've found a path of length depth to v, and queues it up if it needs expanding.
+    # Pages at maxDepth (or on untracked domains) stay gray, as the threshold of discovery
+    def discover(v, depth):
+        if v.color != "white" and v.dist != None and v.dist <= depth:
+            return
+        v.dist = depth
+        if v.color == "white":
+            v.color = "gray"
+        G.logVertex(v)
+        if depth < maxDepth and siteCheck(v.url):
+            frontier[depth].append(v)
+            G.frontier.push(v, depth)
+
+    # if we're resuming on top of a loaded graph, carry on from the edge of the old crawl
+    for v in resumePoints(maxDepth):
+        frontier[v.dist].append(v)
+    for url in startingUrls:
+        discover(G.addVertex_url(url), 0)
+
+    for depth in range(maxDepth):
+        queue = frontier[depth]
+        while len(queue) > 0 and not interrupt:
+            u = queue.popleft()
+            # a shorter path was found since this was queued
+            if u.dist != depth:
+                continue
+
+            if not u.isAdjacentCached():
+                logger.write(f"Depth: {depth}", key="depth")
+            # a page that was already expanded (ex: in a loaded graph) just passes its new
+            # distance on to its children, without adding its edges again
+            addEdges = u.color != "black"
+            for v in u.getAdjacent():
+                v = G.addVertex_url(v)
+                if addEdges:
+                    G.addEdge(gh.Edge(u, v))
+                discover(v, depth + 1)
+
+            u.color = "black"
+            G.logVertex(u)
+            G.frontier.done(u)
+            G.commit()
+
+            # Save to disk if it's been a while
+            autosave()
+        # the queue for this depth is done with, so let it go
+        frontier[depth] = None
+        if interrupt:
+            break
+    logFetchStats()
+
+    return G
+
+# spider using a pool of worker threads, so that up to `workers` requests are in flight at
+# once, crawling a maximum distance of `maxDepth` from any of the starting urls.
+#
+# Politeness is handled per domain by a DomainScheduler: only one request per domain is ever
+# in flight, and after each one the domain cools down for its crawl-delay (or 0.5 seconds)
+# before it gets another. Retries are put back in line with a longer cooldown instead of
+# sleeping in place, so while one host is cooling down, the workers get on with the others.
+#
+# The graph itself is only ever touched from this (the main) thread. The worker threads
+# just fetch pages and hand back the links.
+#
+# Pages are expanded lowest-depth first, so almost every page is expanded at its true
+# distance. If a shorter path to an already expanded page does turn up, we just push the
+# new distance down to its children (from the cached links, without fetching or adding
+# the edges again).
+#
+# If it's given a shard (see shard.py), it only crawls that shard's domains: pages on any other
+# domain get sent to their own shard instead, and it keeps going until every shard is done.
+def spiderConcurrent(startingUrls, maxDepth, workers=8, parseWorkers=0, crawlShard=None):
+    logger.write(f"STARTING SPIDER! ({workers} workers, {parseWorkers} parse workers)")
+
+    global spider_started
+    spider_started = True
+
+    global lastSaved
+    lastSaved = time.monotonic()
+
+    # pages waiting to be fetched, queued up by domain
+    sched = scheduler.DomainScheduler()
+    # pages whose links we already have, as (depth, Vertex). These don't need to wait in line
+    toExpand = []
+    # requests in flight, ex: {<Future>: ("page", <Vertex>, depth, retry, "example.com"), ...}
+    inFlight = {}
+    # pages the parse pool is working on, ex: {<Future>: (<Vertex>, cacheEntry), ...}
+    parsing = {}
+    # ex: {"example.com": 2, ...} (how many times we've failed to get its robots.txt)
+    robotsRetries = {}
+
+    # queues v up to be visited at the given depth
+    def push(v, depth):
+        v.dist = depth
+        if v.color == "white":
+            v.color = "gray"
+        G.logVertex(v)
+        # Stop digging if we've hit our maxDepth or if this is a no-go site
+        # (the node stays gray to mark the threshold of discovery)
+        if depth >= maxDepth or not siteCheck(v.url):
+            return
+        # another shard's page stays gray here too, and its own shard takes it from there
+        if crawlShard != None and not crawlShard.owns(v):
+            crawlShard.send(v, depth)
+            return
+        enqueue(v, depth)
+
+    # puts v in line to be expanded at the given depth (and keeps track of it in the frontier)
+    def enqueue(v, depth, retry=0):
+        G.frontier.push(v, depth, retry)
+        if v.isAdjacentCached():
+            toExpand.append((depth, v))
+        else:
+            sched.push(urlTable.domain(v.id), depth, (v, retry))
+
+    # same as sched.release(), but the cooldown gets remembered in the frontier too
+    def release(domain, delay=0):
+        sched.release(domain, delay)
+        if delay > 0:
+            G.frontier.cool(domain, delay)
+
+    # adds u's links to the graph (the first time it's expanded),
+    # and queues up any children that we've found a shorter path to
+    def expand(u):
+        addEdges = u.color != "black"
+        for v in u.getAdjacent():
+            v = G.addVertex_url(v)
+            if addEdges:
+                G.addEdge(gh.Edge(u, v))
+            if (v.color == "white") or (v.dist > u.dist + 1):
+                push(v, u.dist + 1)
+        u.color = "black"
+        G.logVertex(u)
+        G.frontier.done(u)
+
+    # if we're resuming on top of a loaded graph, carry on from the edge of the old crawl,
+    # with the same retry counts and cooldowns it had
+    for v in resumePoints(maxDepth):
+        # (another shard's pages are its own to crawl, see Shard.resend())
+        if crawlShard != None and not crawlShard.owns(v):
+            continue
+        enqueue(v, v.dist, G.frontier.retries(v))
+    for domain, delay in G.frontier.coolingDomains().items():
+        sched.release(domain, delay)
+    for url in startingUrls:
+        v = G.addVertex_url(url)
+        if v.color == "white" or v.dist != 0:
+            push(v, 0)
+
+    # the parse pool gets started first, since its workers are forked off this process (see parsePool.py)
+    parser = None
+    fetch = fetchParsed
+    if parseWorkers > 0:
+        parser = parsePool.ParsePool(parseWorkers, parseQueue)
+        parser.start()
+        fetch = fetchUnparsed
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while not interrupt:
+            # pages other shards have found on our domains
+            if crawlShard != None:
+                for url, depth in crawlShard.receive():
+                    v = G.addVertex_url(url)
+                    if v.color == "white" or v.dist > depth:
+                        push(v, depth)
+            if len(sched) == 0 and len(inFlight) == 0 and len(parsing) == 0 and len(toExpand) == 0:
+                # (the other shards might still send us more)
+                if crawlShard == None or crawlShard.finished():
+                    break
+                continue
+
+            while len(toExpand) > 0:
+                depth, u = toExpand.pop()
+                # skip it if a shorter path was found since this was queued
+                if depth == u.dist:
+                    expand(u)
+
+            # Start as many requests as we have free workers for
+            # (unless the parse pool has fallen behind, then let it catch up first)
+            now = time.monotonic()
+            while len(inFlight) < workers and (parser == None or not parser.full()):
+                item = sched.pop(now)
+                if item == None:
+                    break
+                domain, depth, (u, retry) = item
+                # a shorter path was found since this was queued, skip this copy
+                # (or the page got fetched, and expanded at the shorter distance, while this copy waited)
+                if depth > u.dist or u.isAdjacentCached():
+                    sched.release(domain)
+                    continue
+                # grab the robots.txt file first if we haven't got it yet
+                result = robots.check(domain, u.url)
+                if result == None:
+                    inFlight[pool.submit(fetchRobots, u.url)] = ("robots", u, depth, retry, domain)
+                    continue
+                allowed, delay = result
+                if not allowed:
+                    sched.release(domain)
+                    u.setAdjacent([])
+                    expand(u)
+                    continue
+                logger.write(f"Depth: {depth}", key="depth")
+                logger.write("Fetching resource: "+u.url, key="fetch")
+                inFlight[pool.submit(fetch, u.url)] = ("page", u, depth, retry, domain)
+
+            # wait for a request (or a parse) to finish, or for the next domain to finish cooling down
+            timeout = sched.nextWakeup()
+            # (or to check for pages from the other shards)
+            if crawlShard != None and (timeout == None or timeout > crawlShard.pollInterval):
+                timeout = crawlShard.pollInterval
+            if len(inFlight) == 0 and len(parsing) == 0:
+                if timeout != None:
+                    time.sleep(timeout)
+                continue
+            done, notDone = wait(list(inFlight) + list(parsing), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future in parsing:
+                    u, cacheEntry = parsing.pop(future)
+                    try:
+                        (inlinks, outlinks, outdomains), seconds = future.result()
+                        metrics.parseSeconds.observe(seconds)
+                        cacheLinks(u.url, cacheEntry, (inlinks, outlinks, outdomains))
+                    except Exception as err:
+                        # fetching it again wouldn't help, so it just doesn't have any links
+                        logger.warning(f"Couldn't parse {u.url} ({err})")
+                        inlinks, outlinks = [], []
+                    u.setAdjacent(dedupe(inlinks + outlinks))
+                    expand(u)
+                    continue
+
+                kind, u, depth, retry, domain = inFlight.pop(future)
+                if kind == "robots":
+                    try:
+                        allowed, delay = future.result()
+                    except Exception:
+                        robotsRetries[domain] = robotsRetries.get(domain, 0) + 1
+                        if robotsRetries[domain] < 3:
+                            logger.warning(f"Couldn't get robots file for {domain}. Waiting {5} seconds...")
+                            metrics.retries.inc(kind="robots")
+                            sched.push(domain, depth, (u, retry))
+                            release(domain, 5)
+                            continue
+                        allowed, delay = robotsUnreachable(domain)
+                    # now we can get the page itself (once the domain has cooled down)
+                    sched.push(domain, depth, (u, retry))
+                    release(domain, politeDelay(delay))
+                    continue
+
+                delay = politeDelay(robots.delay(domain))
+                try:
+                    links, page = future.result()
+                except Exception:
+                    retry += 1
+                    if retry < 3:
+                        logger.warning(f"Exception caught. Retrying {u.url} in {5 * retry + delay} seconds...")
+                        metrics.retries.inc(kind="page")
+                        enqueue(u, depth, retry)
+                        release(domain, 5 * retry + delay)
+                        continue
+                    # If we weren't able to fetch the page, it just doesn't have any links
+                    logger.warning(f"Giving up on {u.url}")
+                    links, page = ([], [], []), None
+                release(domain, delay)
+                # hand it off to the parse pool if it still needs parsing
+                if links == None:
+                    body, encoding, cacheEntry = page
+                    parsing[parser.submit(u.url, body, encoding)] = (u, cacheEntry)
+                    continue
+                inlinks, outlinks, outdomains = links
+                u.setAdjacent(dedupe(inlinks + outlinks))
+                expand(u)
+
+            # Save to disk if it's been a while
+            G.commit()
+            if crawlShard != None:
+                crawlShard.sync()
+            autosave()
+    finally:
+        # Don't wait around for the requests in flight if we've been interrupted
+        pool.shutdown(wait=False, cancel_futures=True)
+        if parser != None:
+            parser.shutdown(wait=False)
+    logFetchStats()
+
+    return G
+
+# Makes a single attempt at fetching the page, returning (inlinks, outlinks, outdomains)
+# (going through the page cache, if there is one)
+def fetchLinks(pageURL):
+    links, page = fetchUnparsed(pageURL)
+    if links == None:
+        body, encoding, cacheEntry = page
+        start = time.perf_counter()
+        with profiler.stage("parse.decode"):
+            html = parsePool.decode(body, encoding)
+        links = extractLinks(html, pageURL)
+        metrics.parseSeconds.observe(time.perf_counter() - start)
+        cacheLinks(pageURL, cacheEntry, links)
+    return links
+
+# fetchUnparsed(), but with the links pulled out right away (in the same thread)
+def fetchParsed(pageURL):
+    return fetchLinks(pageURL), None
+
+# returns the list without any duplicates, keeping the order of first appearance
+def dedupe(urls):
+    return list(dict.fromkeys(urls))
+
+# runs the spider, keeping a checkpoint log as it goes, then saves the graph under `title`
+# If resume is set, it carries on from the crawl that was loaded into G
+def crawlAndSave(startingUrls, maxDepth, resume=False):
+    if crawlMode == "sharded":
+        crawlSharded(maxDepth, resume)
+    else:
+        G.log = checkpoint.CheckpointLog(G, f"output/temp/{title}", checkpointCompactEvery)
+        profiler.begin()
+        runSpider(startingUrls, maxDepth, resume)
+        profiler.finish(f"output/{title}_profile.txt")
+    logger.write("Saving data...")
+    if saveFormat == "json" or saveFormat == "both":
+        G.save(title)
+    if saveFormat == "binary" or saveFormat == "both":
+        G.saveBinary(title)
+    G.saveDomainGraph(title)
+    # it's all saved properly now, so the checkpoint isn't needed anymore.
+    # Unless we were interrupted: then it's kept, since it's got the frontier to resume from
+    if G.log != None:
+        G.log.close(remove=not interrupt)
+        G.log = None
+    logger.write("Saved!")
+
+# runs the crawl as `shards` processes, each crawling its own share of the domains
+# (see shard.py), then merges what they found into G.
+# Each shard reads config.json for itself, and keeps its own checkpoint to resume from
+def crawlSharded(maxDepth, resume=False):
+    global spider_started
+    # (so Ctrl+C waits for the shards to stop, instead of quitting right away)
+    spider_started = True
+    logger.write(f"STARTING SPIDER! ({shards} shards)")
+    if not shard.crawl(title, shards, maxDepth, resume):
+        logger.warning("Not every shard finished properly, merging what there is")
+    logger.write("Merging the shards...")
+    shard.merge(title, shards, G)
+
+# runs the spider using the crawl mode given in config.json.
+# The bfs and concurrent spiders pick up a loaded crawl by themselves, but spiderDFS
+# has to be told to resume
+def runSpider(startingUrls, maxDepth, resume=False):
+    if crawlMode == "concurrent":
+        spiderConcurrent(startingUrls, maxDepth, workers, parseWorkers, crawlShard)
+    elif crawlMode == "bfs":
+        spiderBFS(startingUrls, maxDepth)
+    elif resume:
+        spiderDFS_resume(maxDepth, startingUrls)
+    else:
+        spiderDFS(startingUrls, maxDepth)
+
 
-# after having finished spiderDFS to a given depth, you can call spiderDFS_resume in order
-# to crawl to a deeper depth. Not intended to resume from a crash or outage.
+# after having finished spiderDFS to a given depth (or after it got interrupted, or crashed
+# and was loaded back up from its checkpoint), you can call spiderDFS_resume in order to
+# carry on from where it stopped, or to crawl to a deeper depth.
 # Recall that G = (V, E)
 #
-# NOTE: this will have the effect of *resetting* depth of grey nodes to zero,
-# essentially restarting the crawl on them instead
+# Each gray node picks back up at the depth it was found at, and any starting urls that
+# haven't been crawled yet get started too.
 # to just start at your starting nodes, doing depth normally, call spiderDFS() normally
-def spiderDFS_resume(maxDepth):
-    startingNodes = []
-    for v in G.V:
-        if v.color != "black":
-            startingNodes.append(v)
-    spiderDFS(startingNodes, maxDepth)
+def spiderDFS_resume(maxDepth, startingUrls=[]):
+    logger.write("RESUMING SPIDER!")
+
+    global spider_started
+    spider_started = True
+
+    global lastSaved
+    lastSaved = time.monotonic()
+
+    for v in resumePoints(maxDepth):
+        # skip it if it's been crawled (from a shorter path) since we started
+        if v.color == "black":
+            continue
+        # if its page was done before we stopped (it just hadn't finished the pages under it),
+        # its links are already cached and its edges are already in G
+        spiderDFS_visit(v, v.dist, maxDepth, expanded=v.isAdjacentCached())
+        if interrupt:
+            break
+    for url in startingUrls:
+        if interrupt:
+            break
+        v = G.addVertex_url(url)
+        if v.color == "white" or v.dist != 0:
+            spiderDFS_visit(v, 0, maxDepth)
+    logFetchStats()
     return G
 
 # probably not using this one. Just call spiderDFS() yourself.
@@ -589,8 +1135,126 @@ def spiderDFS_init(startingNodes, maxDepth):
 
 
 robotsTxt = {}
+
+# domains we don't crawl (from config.json), and the matcher siteCheck() checks them with
+untrackedDomains = []
+untrackedMatcher = domainMatcher.DomainMatcher(untrackedDomains)
+
+# "dfs" (spiderDFS), "bfs" (spiderBFS), "concurrent" (spiderConcurrent) or "sharded" (crawlSharded)
+crawlMode = "dfs"
+# number of processes a sharded crawl is split between (see shard.py)
+shards = 4
+# the shard this process is, if it's one of the processes of a sharded crawl
+crawlShard = None
+# number of pages spiderConcurrent() fetches at once
+workers = 8
+# number of worker processes spiderConcurrent() parses pages with (0 to parse them in the fetching threads),
+# and how many fetched pages can be waiting for them before it stops fetching more (see parsePool.py).
+# Only the "concurrent" and "sharded" modes have a parse pool: "dfs" and "bfs" parse each page
+# as they fetch it, whatever these are set to. (ex: crawlMode "concurrent" with parseWorkers 8)
+parseWorkers = 0
+parseQueue = 32
+
+# seconds to wait between requests to the same domain, if its robots.txt doesn't say
+defaultDelay = 0.5
+
+# number of records the checkpoint log can hold before it gets compacted into a snapshot
+checkpointCompactEvery = 500_000
+
+# how the graph gets saved at the end of a crawl: "json", "binary" (graphFile.py), or "both"
+saveFormat = "both"
+
+# how links get pulled out of a page: "stream" (linkExtractor) or "bs4" (BeautifulSoup)
+linkParser = "stream"
+
 requestHeaders = {"User-Agent":"WebGraphUtility", "From":"riverseeber12@gmail.com"}
 
+# where the robots.txt files get kept between runs
+robotsFile = "output/robots.jsonl"
+
+# where the page cache goes (None to always fetch and parse every page in full)
+pageCacheFolder = "output/pageCache"
+# the page cache itself, once it's been opened (see pageCache.py)
+pages = None
+
+# port to serve the crawl's metrics on (None to not serve them), and where to write them
+# out to every statsInterval seconds (None to not write them). See metrics.py
+metricsPort = 9100
+statsFile = "output/stats.json"
+statsInterval = 60
+
+
+# sets the metrics that get read off the graph and the caches (see metrics.addCollector())
+def collectMetrics():
+    metrics.graphVertices.set(len(G.V))
+    metrics.graphEdges.set(len(G.E))
+    metrics.graphDomains.set(len(G.domainPages()))
+    metrics.frontierPages.setAll({(str(depth),): count for depth, count in G.frontier.depthCounts().items()})
+    metrics.robotsLookups.set(robots.hits, result="hit")
+    metrics.robotsLookups.set(robots.misses, result="miss")
+    if pages != None:
+        metrics.pageCacheLookups.set(pages.hits, result="hit")
+        metrics.pageCacheLookups.set(pages.misses, result="miss")
+
+# loads the settings from config.json (see the globals above), and returns the whole config
+def loadConfig(path="config.json"):
+    global untrackedDomains, untrackedMatcher, crawlMode, workers, parseWorkers, parseQueue, shards
+    global linkParser, saveFormat, checkpointCompactEvery, robotsFile, pageCacheFolder
+    global metricsPort, statsFile, statsInterval
+    with open(path, "r") as f:
+        config = json.load(f)
+    # initialize the values
+    untrackedDomains = config["untrackedDomains"]
+    untrackedMatcher = domainMatcher.DomainMatcher(untrackedDomains)
+    crawlMode = config.get("crawlMode", crawlMode)
+    workers = config.get("workers", workers)
+    parseWorkers = config.get("parseWorkers", parseWorkers)
+    parseQueue = config.get("parseQueue", parseQueue)
+    shards = config.get("shards", shards)
+    linkParser = config.get("linkParser", linkParser)
+    saveFormat = config.get("saveFormat", saveFormat)
+    checkpointCompactEvery = config.get("checkpointCompactEvery", checkpointCompactEvery)
+    httpSession.poolConnections = config.get("poolConnections", httpSession.poolConnections)
+    httpSession.poolMaxsize = config.get("poolMaxsize", httpSession.poolMaxsize)
+    httpSession.connectTimeout = config.get("connectTimeout", httpSession.connectTimeout)
+    httpSession.readTimeout = config.get("readTimeout", httpSession.readTimeout)
+    logger.setFile("output/"+config["logFile"])
+    logger.minLevel = logger.levels[config.get("logLevel", "info")]
+    logger.jsonLines = config.get("logJson", logger.jsonLines)
+    logger.rateLimit = config.get("logRateLimit", logger.rateLimit)
+    profiler.enabled = config.get("profile", profiler.enabled)
+    profiler.useCProfile = config.get("cProfile", profiler.useCProfile)
+    profiler.useTracemalloc = config.get("tracemalloc", profiler.useTracemalloc)
+    profiler.tracemallocInterval = config.get("tracemallocInterval", profiler.tracemallocInterval)
+    robotsStore.ttl = config.get("robotsTtl", robotsStore.ttl)
+    robotsStore.unreachableTtl = config.get("robotsUnreachableTtl", robotsStore.unreachableTtl)
+    robotsFile = config.get("robotsFile", robotsFile)
+    pageCacheFolder = config.get("pageCache", pageCacheFolder)
+    layout.iterations = config.get("layoutIterations", layout.iterations)
+    gh.labelLimit = config.get("labelLimit", gh.labelLimit)
+    metricsPort = config.get("metricsPort", metricsPort)
+    statsFile = config.get("statsFile", statsFile)
+    statsInterval = config.get("statsInterval", statsInterval)
+    return config
+
+# opens the robots.txt store and the page cache (from robotsFile and pageCacheFolder)
+def openStores():
+    global robots, pages
+    robots = robotsStore.RobotsStore(robotsFile, requestHeaders["User-Agent"])
+    if pageCacheFolder != None:
+        pages = pageCache.PageCache(pageCacheFolder)
+
+# starts serving the metrics (see metrics.py), and returns the StatsDumper writing them to statsFile (if there is one)
+def startMetrics():
+    metrics.addCollector(collectMetrics)
+    if metricsPort != None:
+        try:
+            metrics.serve(metricsPort)
+        except OSError as err:
+            logger.warning(f"Couldn't serve metrics on port {metricsPort} ({err})")
+    if statsFile != None:
+        return metrics.StatsDumper(statsFile, statsInterval)
+    return None
 
 def getTimestamp():
     dt = datetime.datetime.now()
@@ -605,6 +1269,7 @@ def interrupt_handler(sig, frame):
     if not interrupt and spider_started:
         logger.write("""\nINTERRUPT SIGNAL RECIEVED: Closing gracefully...
 (to force quit, send the interrupt again)\n""")
+        logger.flush()
     else:
         exit()
     # To keep track of if this is the first interrupt
@@ -615,14 +1280,14 @@ if __name__ == "__main__":
     # register interrupt_handler() to be called when pressing Ctrl+C
     signal.signal(signal.SIGINT, interrupt_handler)
 
-    # load config.json
-    with open("config.json", "r") as f:
-        config = json.load(f)
-    # initialize the values
+    config = loadConfig()
     startUrls = config["startUrls"]
-    untrackedDomains = config["untrackedDomains"]
     maxDepth = config["maxDepth"]
-    logger.setFile("output/"+config["logFile"])
+    openStores()
+    stats = startMetrics()
+
+    # (so the log messages so far don't get printed in the middle of the questions)
+    logger.flush()
 
     # handle runtime options
     spiderOpt = int(input("""What would you like to do?
@@ -654,23 +1319,31 @@ if __name__ == "__main__":
 
     # run the spider
     if spiderOpt == 1:
-        spiderDFS(startUrls, maxDepth)
-        logger.write("Saving data...")
-        G.save(title)
-        logger.write("Saved!")
+        crawlAndSave(startUrls, maxDepth)
     
+    # if all we're doing is looking at the domain graph, it can be loaded without the page graph
+    DomainGraph = None
+    domainPath = f"output/{title}_domainGraph.json"
+    if spiderOpt == 3 and analysisOpt == 2 and os.path.exists(domainPath):
+        logger.write("Loading the domain graph from disk...")
+        DomainGraph = gh.Graph()
+        with open(domainPath) as f:
+            DomainGraph.loadFromJson(json.load(f))
+        logger.write("Successfully loaded graph!")
+
     #load from disk
-    if spiderOpt == 2 or spiderOpt == 3:
+    # (a sharded crawl gets resumed from each shard's own checkpoint instead)
+    elif spiderOpt == 3 or (spiderOpt == 2 and crawlMode != "sharded"):
         logger.write("Loading from disk...")
         G.load(title)
         logger.write("Successfully loaded graph!")
 
-    # resume spider (basically the same thing as start, just load the data first)
+    # resume spider (carries on from the frontier of the crawl we just loaded)
     if spiderOpt == 2:
-        spiderDFS(startUrls, maxDepth)
-        logger.write("Saving data...")
-        G.save(title)
-        logger.write("Saved!")
+        crawlAndSave(startUrls, maxDepth, resume=True)
+    # one last write of the stats, with how the crawl ended up
+    if stats != None and (spiderOpt == 1 or spiderOpt == 2):
+        stats.dump()
 
     # Save Graph to disk
     if spiderOpt == 1 or spiderOpt == 2:
@@ -686,19 +1359,22 @@ if __name__ == "__main__":
         if analysisOpt == 1 or analysisOpt == 3:
             logger.write("PAGE GRAPH")
             G.printGraphSize()
+            analytics.analyzeGraph(G)
 
             # Then convert to nx.Graph
             g = gh.graphToNxGraph(G)
             logger.write("DRAWING...")    
-            gh.drawGraph(g, f"output/{title}_pageGraph__{timestamp}.jpg")
+            gh.drawGraph(g, f"output/{title}_pageGraph__{timestamp}.jpg", f"output/{title}_pageGraph.layout.json")
         
         if analysisOpt == 2 or analysisOpt == 3:
             # Convert page Graph into one representing domains only
             logger.write("DOMAIN GRAPH")
-            DomainGraph = gh.graphToDomainGraph(G)
+            if DomainGraph == None:
+                DomainGraph = gh.graphToDomainGraph(G)
             DomainGraph.printGraphSize()
+            analytics.analyzeGraph(DomainGraph)
 
             # to nx.Graph
             g_domain = gh.graphToNxGraph(DomainGraph)
             logger.write("DRAWING...")
-            gh.drawGraph(g_domain, f"output/{title}_domainGraph__{timestamp}.jpg")
+            gh.drawGraph(g_domain, f"output/{title}_domainGraph__{timestamp}.jpg", f"output/{title}_domainGraph.layout.json")
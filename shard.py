@@ -0,0 +1,381 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import zlib
+
+import logger
+import graphHandler as gh
+import urlTable
+
+# Sharded crawls: the crawl gets split up between several processes (or machines), each one
+# running its own spiderConcurrent() over its own share of the domains, and then their graphs
+# get merged into one at the end.
+#
+# Every domain belongs to exactly one shard, by the crc32 of the domain (see owner()), so each
+# site only ever gets crawled (and checked against its robots.txt, and kept polite) by one of
+# them. When a shard finds a link to a page on someone else's domain, it keeps the page as a
+# gray vertex at the edge of its own graph, and sends (url, depth) to its owner, which crawls
+# it from there. Everything happens in a shared folder, so the shards don't need to be on the
+# same machine, just to be able to see the same files:
+#   output/shards/MyCrawl/
+#       status0.json                    shard 0's status (see Shard.status())
+#       spool/to1_from0.jsonl           pages shard 0 has sent shard 1, ex: ["https://a.com/x/", 3]
+#       shard0.json, shard0.wgraph      shard 0's graph, once it's done (see Graph.save())
+#       ...
+# (and each shard's checkpoint goes in output/temp/shards/MyCrawl/)
+#
+# The crawl is over once every shard has run out of pages, and every page that's been sent
+# has been received. Each shard writes down how many pages it's sent to (and received from)
+# each other shard, and whether it's idle. Once two looks in a row at all of those come out the
+# same, with everyone idle and nothing in the spool still waiting, nobody can get more work.
+#
+# From scrape.py: crawlMode "sharded" (with "shards" in config.json) runs the shards as
+# processes on this machine, then merges them. By hand, ex: across 3 machines:
+#   python shard.py clear MyCrawl           (once, to start from a clean folder)
+#   python shard.py worker MyCrawl 0 3      (on the first machine, and 1 3, 2 3 on the others)
+#   python shard.py merge MyCrawl 3         (once they've all finished)
+# Add --resume to the workers to pick an interrupted crawl back up from its checkpoints.
+
+folder = "output/shards"
+# how often (in seconds) a shard looks for pages that have been sent to it, and writes its status
+pollInterval = 0.2
+
+
+# Returns which of `count` shards the domain belongs to
+def owner(domain, count):
+    return zlib.crc32(domain.encode("utf-8")) % count
+
+# Returns the title (and so where the files go, see Graph.save()) of shard `index` of the crawl
+def shardTitle(title, index):
+    return f"shards/{title}/shard{index}"
+
+# Returns path with the shard number added on, ex: "output/log.txt" -> "output/log_shard2.txt"
+def shardPath(path, index):
+    root, ext = os.path.splitext(path)
+    return f"{root}_shard{index}{ext}"
+
+# deletes everything from an old sharded crawl with this title (its statuses, spool, graphs and checkpoints)
+def clear(title):
+    shutil.rmtree(f"{folder}/{title}", ignore_errors=True)
+    shutil.rmtree(f"output/temp/shards/{title}", ignore_errors=True)
+
+
+# One shard's end of a sharded crawl (see the top of the file).
+# spiderConcurrent() hands it the pages that belong to other shards, and asks it for the pages
+# other shards have sent, and whether the whole crawl is done yet
+class Shard:
+    def __init__(self, title, index, count, resume=False):
+        self.index = index
+        self.count = count
+        self.pollInterval = pollInterval
+        self.path = f"{folder}/{title}"
+        os.makedirs(f"{self.path}/spool", exist_ok=True)
+        # ex: {3: True, ...} (domain id -> if it's ours)
+        self.__owned = {}
+        # ex: {17: 2, ...} (url id -> lowest depth we've sent it at, so it only gets sent again if it gets shallower)
+        self.__sent = {}
+        # the spool files we're writing to, and how many pages we've written to each (ex: {1: 120, ...})
+        self.__outbox = {}
+        self.sentCounts = {}
+        # how far we've read into each spool file sent to us, in bytes and in pages
+        self.offsets = {}
+        self.receivedCounts = {}
+        self.idle = False
+        # when we last looked in the spool, and last wrote our status
+        self.__lastReceive = 0
+        self.__lastWrite = 0
+        # what all of the statuses said last time we looked (see finished())
+        self.__lastLook = None
+
+        if resume:
+            self.__resume()
+        self.writeStatus()
+
+    # picks up where this shard left off: what it had read of its spool, and what it had sent
+    def __resume(self):
+        try:
+            with open(self.statusPath(self.index)) as f:
+                status = json.load(f)
+            self.offsets = {int(src): offset for src, offset in status["offsets"].items()}
+            self.receivedCounts = {int(src): n for src, n in status["received"].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+        # count what's actually in the spool, since some of it may have been written after the last status
+        for dst in range(self.count):
+            path = self.spoolPath(dst, self.index)
+            if dst != self.index and os.path.exists(path):
+                with open(path, "rb") as f:
+                    self.sentCounts[dst] = sum(1 for line in f if line.endswith(b"\n"))
+
+    def statusPath(self, index):
+        return f"{self.path}/status{index}.json"
+
+    def spoolPath(self, dst, src):
+        return f"{self.path}/spool/to{dst}_from{src}.jsonl"
+
+    # Returns True if the Vertex v is on one of this shard's domains
+    def owns(self, v):
+        d = urlTable.domainId(v.id)
+        owned = self.__owned.get(d)
+        if owned == None:
+            owned = owner(urlTable.domain(v.id), self.count) == self.index
+            self.__owned[d] = owned
+        return owned
+
+    # sends v (found at the given depth) to the shard that owns it
+    def send(self, v, depth):
+        sent = self.__sent.get(v.id)
+        if sent != None and sent <= depth:
+            return
+        self.__sent[v.id] = depth
+        dst = owner(urlTable.domain(v.id), self.count)
+        f = self.__outbox.get(dst)
+        if f == None:
+            f = open(self.spoolPath(dst, self.index), "a")
+            self.__outbox[dst] = f
+        f.write(json.dumps([v.url, depth]) + "\n")
+        self.sentCounts[dst] = self.sentCounts.get(dst, 0) + 1
+
+    # Returns [(url, depth), ...] for the pages other shards have sent us since last time
+    # (only actually looks every pollInterval seconds)
+    def receive(self):
+        now = time.monotonic()
+        if now - self.__lastReceive < self.pollInterval:
+            return []
+        self.__lastReceive = now
+
+        received = []
+        for src in range(self.count):
+            path = self.spoolPath(self.index, src)
+            if src == self.index or not os.path.exists(path):
+                continue
+            offset = self.offsets.get(src, 0)
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # (leave any line that's only partly written until next time)
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                url, depth = json.loads(line)
+                received.append((url, depth))
+                self.receivedCounts[src] = self.receivedCounts.get(src, 0) + 1
+            self.offsets[src] = offset + end
+        if len(received) > 0:
+            self.idle = False
+        return received
+
+    # writes out what we've sent so far, then our status (at most every pollInterval seconds, unless forced).
+    # Call after every commit to the checkpoint log, so the status (with how much of the spool
+    # we've read) never gets ahead of what the checkpoint has
+    def sync(self, force=False):
+        for f in self.__outbox.values():
+            f.flush()
+        now = time.monotonic()
+        if force or now - self.__lastWrite >= self.pollInterval:
+            self.__lastWrite = now
+            self.writeStatus()
+
+    # our status, ex: {"idle": False, "sent": {"1": 120}, "received": {"1": 80}, "offsets": {"1": 5120}}
+    def status(self):
+        return {"idle": self.idle, "sent": self.sentCounts, "received": self.receivedCounts, "offsets": self.offsets}
+
+    def writeStatus(self):
+        tempPath = self.statusPath(self.index) + ".tmp"
+        with open(tempPath, "w") as f:
+            json.dump(self.status(), f)
+        os.replace(tempPath, self.statusPath(self.index))
+
+    # Returns True once the whole crawl is done (see the top of the file).
+    # Only call it when this shard has nothing left to do itself
+    def finished(self):
+        if not self.idle:
+            self.idle = True
+            self.sync(force=True)
+        # give the other shards a moment, instead of reading their statuses as fast as we can
+        time.sleep(self.pollInterval)
+
+        statuses = {}
+        for i in range(self.count):
+            if i == self.index:
+                statuses[i] = json.loads(json.dumps(self.status()))
+                continue
+            try:
+                with open(self.statusPath(i)) as f:
+                    statuses[i] = json.load(f)
+            except (OSError, ValueError):
+                # it hasn't started yet (or is writing its status right now)
+                self.__lastLook = None
+                return False
+
+        look = json.dumps(statuses, sort_keys=True)
+        sameAsLast = look == self.__lastLook
+        self.__lastLook = look
+        if not sameAsLast or not all(status["idle"] for status in statuses.values()):
+            return False
+        # everything that's been sent has been received
+        for src in statuses:
+            for dst in statuses:
+                if statuses[src]["sent"].get(str(dst), 0) != statuses[dst]["received"].get(str(src), 0):
+                    return False
+        return True
+
+    # sends any pages on other shards' domains that a resumed graph was waiting on
+    # (in case they didn't make it into the spool before the crawl stopped)
+    def resend(self, G):
+        for v in G.V:
+            if v.color == "gray" and v.dist != None and not self.owns(v):
+                self.send(v, v.dist)
+        self.sync(force=True)
+
+    def close(self):
+        self.sync(force=True)
+        for f in self.__outbox.values():
+            f.close()
+        self.__outbox = {}
+
+
+# Runs shard `index` of `count` of the crawl with this title, in this process, with the settings
+# scrape.py already has (ex: from scrape.loadConfig()). Saves the shard's graph when it's done
+def runShard(title, index, count, startingUrls, maxDepth, resume=False):
+    import scrape
+
+    scrape.title = shardTitle(title, index)
+    scrape.crawlMode = "concurrent"
+    scrape.crawlShard = Shard(title, index, count, resume)
+    if resume:
+        loadShard(scrape.G, title, index)
+        scrape.crawlShard.resend(scrape.G)
+    # each of the starting urls only gets started by its owner
+    startingUrls = [url for url in startingUrls if owner(urlTable.splitURL(url)[0], count) == index]
+    try:
+        scrape.crawlAndSave(startingUrls, maxDepth, resume)
+    finally:
+        scrape.crawlShard.close()
+        scrape.crawlShard = None
+
+# loads what shard `index` of the crawl had into G (its checkpoint, or its saved graph).
+# Returns False if there isn't anything
+def loadShard(G, title, index):
+    import checkpoint
+    name = shardTitle(title, index)
+    if not checkpoint.exists(f"output/temp/{name}") and not os.path.exists(f"output/{name}.json") \
+            and not os.path.exists(f"output/{name}.wgraph"):
+        return False
+    G.load(name)
+    return True
+
+# Merges the graphs of all `count` shards of the crawl into G (a new Graph if not given), and returns it.
+# Each page gets the lowest dist any shard found it at, but whether it was crawled (and the
+# edges leaving it) only come from the shard that owns it, so a page can't be counted twice
+def merge(title, count, G=None):
+    if G == None:
+        G = gh.Graph()
+    for index in range(count):
+        shard = gh.Graph()
+        if not loadShard(shard, title, index):
+            logger.warning(f"Shard {index} of {title} doesn't have a graph to merge")
+            continue
+        with gh.pausedGC():
+            for v in shard.V:
+                u = G.addVertex_url(v.url, v.dist)
+                # other shards' copies of the page are only ever gray
+                color = v.color
+                if owner(urlTable.domain(v.id), count) != index:
+                    color = "white" if color == "white" else "gray"
+                if gh.colorIds[color] > gh.colorIds[u.color]:
+                    u.color = color
+                    G.logVertex(u)
+                if color == "black" and v.isAdjacentCached() and not u.isAdjacentCached():
+                    u.setAdjacentIds(v.getAdjacentIds())
+            for v in shard.V:
+                if owner(urlTable.domain(v.id), count) != index:
+                    continue
+                edges = shard.getOutEdges(v)
+                if len(edges) > 0:
+                    G.addEdges(G.getVertex(v.url), [G.addVertex_url(e.v.url) for e in edges], [e.weight for e in edges])
+        logger.write(f"Merged shard {index}: {len(shard.V)} pages, {len(shard.E)} edges")
+    return G
+
+# Runs all `count` shards of the crawl with this title as processes on this machine
+# (each one reads config.json for itself), and waits for them to finish
+def crawl(title, count, maxDepth, resume=False):
+    if not resume:
+        clear(title)
+    command = [sys.executable, os.path.abspath(__file__), "worker", title, "", str(count), "--depth", str(maxDepth)]
+    if resume:
+        command.append("--resume")
+    processes = []
+    for index in range(count):
+        command[4] = str(index)
+        processes.append(subprocess.Popen(list(command)))
+    logger.write(f"Started {count} shards")
+    failed = 0
+    for index, process in enumerate(processes):
+        # (Ctrl+C goes to the shards too, and they stop gracefully on their own)
+        while True:
+            try:
+                returncode = process.wait()
+                break
+            except KeyboardInterrupt:
+                pass
+        if returncode != 0:
+            failed += 1
+            logger.warning(f"Shard {index} exited with {returncode}")
+    return failed == 0
+
+# sets up this process to be shard `index` (from config.json), and runs it
+def worker(title, index, count, maxDepth=None, resume=False):
+    import signal
+    import metrics
+    import scrape
+
+    signal.signal(signal.SIGINT, scrape.interrupt_handler)
+    config = scrape.loadConfig()
+    if maxDepth == None:
+        maxDepth = config["maxDepth"]
+    # each shard keeps its own log, robots.txt store, page cache and metrics, so they don't
+    # get in each other's way (and it's only ever the same shard that needs the same domains)
+    logger.setFile(shardPath(logger.file, index))
+    scrape.robotsFile = shardPath(scrape.robotsFile, index)
+    if scrape.pageCacheFolder != None:
+        scrape.pageCacheFolder = os.path.join(scrape.pageCacheFolder, f"shard{index}")
+    if scrape.metricsPort != None:
+        scrape.metricsPort += 1 + index
+    if scrape.statsFile != None:
+        scrape.statsFile = shardPath(scrape.statsFile, index)
+    scrape.openStores()
+    stats = scrape.startMetrics()
+
+    logger.write(f"Shard {index} of {count} for {title}")
+    runShard(title, index, count, config["startUrls"], maxDepth, resume)
+    if stats != None:
+        stats.dump()
+    logger.flush()
+
+
+# usage: python shard.py clear <title>
+#        python shard.py worker <title> <index> <count> [--depth N] [--resume]
+#        python shard.py merge <title> <count>
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) >= 2 and args[0] == "clear":
+        clear(args[1])
+    elif len(args) >= 4 and args[0] == "worker":
+        maxDepth = None
+        if "--depth" in args:
+            maxDepth = int(args[args.index("--depth") + 1])
+        worker(args[1], int(args[2]), int(args[3]), maxDepth, "--resume" in args)
+    elif len(args) >= 3 and args[0] == "merge":
+        title = args[1]
+        G = merge(title, int(args[2]))
+        G.printGraphSize()
+        G.save(title)
+        G.saveBinary(title)
+        G.saveDomainGraph(title)
+        logger.write(f"Saved the merged graph as {title}")
+    else:
+        print("usage: python shard.py clear <title> | worker <title> <index> <count> [--depth N] [--resume] | merge <title> <count>")
+        sys.exit(1)
@@ -0,0 +1,203 @@
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A made up web of many sites, served from one local HTTP server, for benchmarking crawls
+# without hitting anyone's real site (see benchCrawl.py).
+#
+# The crawler reaches it by using the server as its HTTP proxy (httpSession.proxy), so every
+# site gets its own domain, ex: http://site3.test/p120/, while really all of the requests go
+# to 127.0.0.1. (Sites are plain http, since a proxy would need to tunnel https.)
+#
+# The pages are laid out in `depth` levels below the start page (http://site0.test/p0/), and each
+# page links to `fanout` pages, mostly in the next level down, and some anywhere at all.
+# Everything is made from the seed, so the same settings always make the same web.
+# Some of the sites can also be made difficult:
+#   - robots.txt rules that disallow some of their pages, or ask for a crawl-delay
+#   - slow: every response takes slowSeconds longer
+#   - failing: failRate of the responses are a 500 error
+
+
+class SyntheticWeb:
+    def __init__(self, pages=2000, domains=50, fanout=8, depth=4, pageBytes=8000, seed=0,
+                 disallowDomains=0.1, delayDomains=0.0, crawlDelay=1.0,
+                 slowDomains=0.0, slowSeconds=0.2, failingDomains=0.0, failRate=0.3):
+        rng = random.Random(seed)
+        self.pageBytes = pageBytes
+        self.crawlDelay = crawlDelay
+        self.slowSeconds = slowSeconds
+        self.failRate = failRate
+        self.rng = rng
+        # random.Random isn't safe to share between the server's threads
+        self.lock = threading.Lock()
+
+        # the domain each page is on (the start page is on site0)
+        self.domains = [f"site{d}.test" for d in range(domains)]
+        self.pageDomain = [0] + [rng.randrange(domains) for i in range(1, pages)]
+
+        # split the pages up into levels, each one `fanout` times bigger than the last (until they run out)
+        levels = [[0]]
+        start = 1
+        while start < pages:
+            size = len(levels[-1]) * fanout
+            if len(levels) == depth:
+                size = pages - start
+            levels.append(list(range(start, min(start + size, pages))))
+            start += size
+
+        # ex: [[4, 19, 3], ...] (the pages each page links to)
+        self.links = [[] for i in range(pages)]
+        for level, below in zip(levels, levels[1:] + [[]]):
+            for i in level:
+                for j in range(fanout):
+                    # mostly down a level, but sometimes anywhere (back up, or across)
+                    if len(below) > 0 and rng.random() < 0.8:
+                        self.links[i].append(rng.choice(below))
+                    else:
+                        self.links[i].append(rng.randrange(pages))
+        # make sure every page has at least one link into it, so they can all be reached
+        for level, below in zip(levels, levels[1:]):
+            for j in below:
+                self.links[rng.choice(level)].append(j)
+
+        # which sites are difficult (never the start page's site)
+        others = list(range(1, domains))
+        self.disallow = set(rng.sample(others, int(disallowDomains * len(others))))
+        self.delayed = set(rng.sample(others, int(delayDomains * len(others))))
+        self.slow = set(rng.sample(others, int(slowDomains * len(others))))
+        self.failing = set(rng.sample(others, int(failingDomains * len(others))))
+
+    def __len__(self):
+        return len(self.links)
+
+    def url(self, i):
+        return f"http://{self.domains[self.pageDomain[i]]}/p{i}/"
+
+    def startUrl(self):
+        return self.url(0)
+
+    # Returns (status, content type, body) for a request to domain/path
+    def respond(self, domain, path):
+        d = self.domainIndex(domain)
+        if d == None:
+            return 404, "text/plain", b"no such site"
+        if d in self.slow:
+            time.sleep(self.slowSeconds)
+        if d in self.failing:
+            with self.lock:
+                fail = self.rng.random() < self.failRate
+            if fail:
+                return 500, "text/plain", b"something broke"
+        if path == "/robots.txt":
+            return 200, "text/plain", self.robots(d).encode("utf-8")
+
+        i = self.pageIndex(path)
+        if i == None or self.pageDomain[i] != d:
+            return 404, "text/plain", b"no such page"
+        return 200, "text/html; charset=utf-8", self.page(i).encode("utf-8")
+
+    # Returns the robots.txt file for site d
+    def robots(self, d):
+        lines = ["User-agent: *"]
+        if d in self.delayed:
+            lines.append(f"Crawl-delay: {self.crawlDelay}")
+        if d in self.disallow:
+            # every fifth page on the site
+            for i in range(len(self.links)):
+                if self.pageDomain[i] == d and i % 5 == 0:
+                    lines.append(f"Disallow: /p{i}/")
+        return "\n".join(lines) + "\n"
+
+    # Returns the html for page i, padded out to about pageBytes
+    def page(self, i):
+        parts = [f"<!DOCTYPE html><html><head><title>Page {i}</title></head><body><h1>Page {i}</h1>"]
+        for j in self.links[i]:
+            parts.append(f'<p>See <a href="{self.url(j)}">page {j}</a> for more.</p>')
+        size = sum(len(part) for part in parts)
+        filler = "<p>" + "lorem ipsum dolor sit amet " * 8 + "</p>"
+        while size < self.pageBytes:
+            parts.append(filler)
+            size += len(filler)
+        parts.append("</body></html>")
+        return "".join(parts)
+
+    def domainIndex(self, domain):
+        if not domain.startswith("site") or not domain.endswith(".test"):
+            return None
+        try:
+            d = int(domain[len("site"):-len(".test")])
+        except ValueError:
+            return None
+        if d >= len(self.domains):
+            return None
+        return d
+
+    def pageIndex(self, path):
+        if not path.startswith("/p") or not path.endswith("/"):
+            return None
+        try:
+            i = int(path[2:-1])
+        except ValueError:
+            return None
+        if i >= len(self.links):
+            return None
+        return i
+
+
+# Answers requests for a SyntheticWeb, as a proxy would (with the whole url in the request
+# line), or as a plain server (with the site in the Host header)
+class SyntheticHandler(BaseHTTPRequestHandler):
+    web = None
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        domain = parts.hostname
+        if domain == None:
+            domain = self.headers.get("Host", "").split(":")[0]
+        status, contentType, body = self.web.respond(domain, parts.path or "/")
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # don't print a line for every request
+    def log_message(self, format, *args):
+        pass
+
+
+# (a crawler that gets killed halfway through a request isn't worth a traceback)
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+# Starts serving web on 127.0.0.1 (on any free port, unless given one) from a background thread.
+# Returns the server, ex: proxy = f"http://127.0.0.1:{server.server_address[1]}"
+def serve(web, port=0):
+    handler = type("Handler", (SyntheticHandler,), {"web": web})
+    server = QuietServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# usage: python syntheticWeb.py [port]
+# (serves the default web until it's stopped, ex: to crawl it by hand)
+if __name__ == "__main__":
+    port = 8080
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+    web = SyntheticWeb()
+    server = serve(web, port)
+    print(f"Serving {len(web)} pages on {len(web.domains)} sites, proxy: http://127.0.0.1:{port}, start: {web.startUrl()}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
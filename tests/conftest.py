@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# the modules all live at the top of the repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger
+
+
+# sends the log to a file in the test's own folder (and puts the logger back how it was after)
+@pytest.fixture
+def logFile(tmp_path, monkeypatch):
+    path = str(tmp_path / "log.txt")
+    logger.setFile(path)
+    monkeypatch.setattr(logger, "minLevel", logger.INFO)
+    monkeypatch.setattr(logger, "jsonLines", False)
+    monkeypatch.setattr(logger, "limits", {})
+    yield path
+    logger.setFile(None)
@@ -0,0 +1,106 @@
+import os
+
+import checkpoint
+import graphHandler as gh
+
+
+def edgeSet(G):
+    return sorted((gh.urlOf(e.u), gh.urlOf(e.v), e.weight) for e in G.E)
+
+# crawls a page by hand, the way the spiders log it: the page, its links, then a commit
+def crawlPage(G, url, links, commit=True):
+    u = G.addVertex_url(url)
+    u.color = "black"
+    G.logVertex(u)
+    for link in links:
+        G.addEdge_url(url, link)
+    if commit:
+        G.commit()
+
+def restored(prefix):
+    H = gh.Graph()
+    checkpoint.restore(H, prefix)
+    return H
+
+
+def test_committed_pages_come_back(tmp_path):
+    prefix = str(tmp_path / "Crawl")
+    G = gh.Graph()
+    G.log = checkpoint.CheckpointLog(G, prefix)
+    crawlPage(G, "https://a.example/", ["https://a.example/x/", "https://b.example/"])
+    crawlPage(G, "https://a.example/x/", ["https://a.example/", "https://b.example/"])
+    G.log.close()
+
+    assert checkpoint.exists(prefix)
+    H = restored(prefix)
+    assert sorted(v.url for v in H.V) == sorted(v.url for v in G.V)
+    assert edgeSet(H) == edgeSet(G)
+    assert H.getVertex("https://a.example/").color == "black"
+    # finished pages get their links cached, like they do when a save gets loaded
+    assert H.getVertex("https://a.example/x/").isAdjacentCached()
+
+def test_half_a_page_gets_thrown_away(tmp_path):
+    prefix = str(tmp_path / "Crawl")
+    G = gh.Graph()
+    G.log = checkpoint.CheckpointLog(G, prefix)
+    crawlPage(G, "https://a.example/", ["https://b.example/"])
+    crawlPage(G, "https://b.example/", ["https://c.example/", "https://d.example/"], commit=False)
+    G.log.file.flush()
+    # and then the crawl got killed halfway through writing a line
+    G.log.file.write('["E", "https://b.example/", "https://e.exa')
+    G.log.close()
+
+    H = restored(prefix)
+    assert edgeSet(H) == [("https://a.example/", "https://b.example/", 1)]
+    assert H.getVertex("https://b.example/") == None
+
+def test_compaction_starts_a_new_generation(tmp_path):
+    prefix = str(tmp_path / "Crawl")
+    G = gh.Graph()
+    G.log = checkpoint.CheckpointLog(G, prefix, compactEvery=5)
+    assert G.log.gen == 1
+    for i in range(10):
+        crawlPage(G, f"https://a.example/{i}/", [f"https://a.example/{i + 1}/", "https://b.example/"])
+    assert G.log.gen > 1
+    # only the latest generation is kept
+    assert sorted(os.listdir(tmp_path)) == [f"Crawl.{G.log.gen}.snapshot.json", f"Crawl.{G.log.gen}.wal"]
+    crawlPage(G, "https://b.example/", ["https://a.example/0/"])
+    G.log.close()
+
+    H = restored(prefix)
+    assert sorted(v.url for v in H.V) == sorted(v.url for v in G.V)
+    assert edgeSet(H) == edgeSet(G)
+
+def test_reopening_carries_on_from_the_latest_generation(tmp_path):
+    prefix = str(tmp_path / "Crawl")
+    G = gh.Graph()
+    G.log = checkpoint.CheckpointLog(G, prefix)
+    crawlPage(G, "https://a.example/", ["https://b.example/"])
+    G.log.close()
+
+    H = restored(prefix)
+    H.log = checkpoint.CheckpointLog(H, prefix)
+    assert H.log.gen == 2
+    crawlPage(H, "https://b.example/", ["https://a.example/"])
+    H.log.close(remove=True)
+    assert not checkpoint.exists(prefix)
+    assert os.listdir(tmp_path) == []
+
+def test_half_written_snapshots_get_cleaned_up(tmp_path):
+    prefix = str(tmp_path / "Crawl")
+    G = gh.Graph()
+    G.log = checkpoint.CheckpointLog(G, prefix)
+    crawlPage(G, "https://a.example/", ["https://b.example/"])
+    G.log.close()
+    # a crawl that got killed while it was writing its next snapshot (twice)
+    for gen in [2, 3]:
+        with open(f"{prefix}.{gen}.snapshot.json.tmp", "w") as f:
+            f.write('{"V": ["https://a.exa')
+    # (someone else's files are left alone)
+    with open(str(tmp_path / "Crawl_shard0.2.snapshot.json.tmp"), "w") as f:
+        f.write("{")
+
+    H = restored(prefix)
+    H.log = checkpoint.CheckpointLog(H, prefix)
+    H.log.close()
+    assert sorted(os.listdir(tmp_path)) == ["Crawl.2.snapshot.json", "Crawl.2.wal", "Crawl_shard0.2.snapshot.json.tmp"]
@@ -0,0 +1,34 @@
+from domainMatcher import DomainMatcher, normalizeHost
+
+
+def test_domains_and_their_subdomains_match():
+    matcher = DomainMatcher(["github.com", "x.com"])
+    assert matcher.matches("github.com")
+    assert matcher.matches("docs.github.com")
+    assert matcher.matches("a.b.github.com")
+    assert not matcher.matches("notgithub.com")
+    assert not matcher.matches("github.com.example")
+    assert not matcher.matches("example.com")
+
+def test_a_dot_in_front_blocks_the_whole_tld():
+    matcher = DomainMatcher([".org", ".gov"])
+    assert matcher.matches("wikipedia.org")
+    assert matcher.matches("en.wikipedia.org")
+    assert not matcher.matches("organic.com")
+
+def test_hosts_get_normalized():
+    assert normalizeHost("User@Docs.GitHub.com.:443") == "docs.github.com"
+    assert normalizeHost("[::1]:8080") == "[::1]"
+    matcher = DomainMatcher(["GitHub.com"])
+    assert matcher.matches("DOCS.GITHUB.COM:443")
+    assert matcher.matches("github.com.")
+
+def test_urls_match_by_their_domain():
+    matcher = DomainMatcher(["github.com"])
+    assert matcher.matchesUrl("https://docs.github.com/en/")
+    assert not matcher.matchesUrl("https://example.com/github.com/")
+
+def test_empty_entries_are_ignored():
+    matcher = DomainMatcher(["", " ", "."])
+    assert len(matcher) == 0
+    assert not matcher.matches("example.com")
@@ -0,0 +1,57 @@
+import checkpoint
+import frontier
+import graphHandler as gh
+
+
+def test_queued_pages_come_lowest_depth_first():
+    G = gh.Graph()
+    a = G.addVertex_url("https://a.example/")
+    b = G.addVertex_url("https://b.example/")
+    c = G.addVertex_url("https://c.example/")
+    G.frontier.push(a, 2)
+    G.frontier.push(b, 0)
+    G.frontier.push(c, 1, retry=2)
+    # queueing it again just moves it
+    G.frontier.push(a, 1)
+
+    assert len(G.frontier) == 3
+    assert b in G.frontier
+    assert [(url, depth) for url, depth, retry in G.frontier.items()][0] == ("https://b.example/", 0)
+    assert G.frontier.depthCounts() == {0: 1, 1: 2}
+    assert G.frontier.retries(c) == 2
+
+    G.frontier.done(b)
+    assert b not in G.frontier
+    assert G.frontier.retries(b) == 0
+
+def test_cooling_domains_run_out(monkeypatch):
+    G = gh.Graph()
+    monkeypatch.setattr(frontier.time, "time", lambda: 1000)
+    G.frontier.cool("a.example", 5)
+    G.frontier.cool("b.example", 50)
+    assert G.frontier.coolingDomains(now=1010) == {"b.example": 40}
+    # only the domains still cooling down get saved
+    monkeypatch.setattr(frontier.time, "time", lambda: 1010)
+    assert G.frontier.exportJson()["cooling"] == {"b.example": 1050}
+
+def test_the_frontier_comes_back_from_a_checkpoint(tmp_path):
+    prefix = str(tmp_path / "Crawl")
+    G = gh.Graph()
+    # some of it goes into the snapshot, and the rest into the log after it
+    G.frontier.push(G.addVertex_url("https://a.example/"), 0)
+    G.log = checkpoint.CheckpointLog(G, prefix)
+    b = G.addVertex_url("https://b.example/")
+    c = G.addVertex_url("https://c.example/")
+    G.frontier.push(b, 1)
+    G.frontier.push(c, 1, retry=1)
+    G.frontier.done(G.getVertex("https://a.example/"))
+    G.frontier.cool("b.example", 3600)
+    G.commit()
+    # this never got committed
+    G.frontier.done(c)
+    G.log.close()
+
+    H = gh.Graph()
+    checkpoint.restore(H, prefix)
+    assert H.frontier.items() == [("https://b.example/", 1, 0), ("https://c.example/", 1, 1)]
+    assert list(H.frontier.coolingDomains()) == ["b.example"]
@@ -0,0 +1,99 @@
+import graphFile
+import graphHandler as gh
+
+
+# a small graph, with an edge out to a page that never got a vertex of its own
+def makeGraph():
+    G = gh.Graph()
+    urls = [f"https://site{i % 3}.example/page{i}/" for i in range(20)]
+    for i, url in enumerate(urls):
+        u = G.addVertex_url(url)
+        u.dist = i % 4 if i < 18 else None
+        u.color = gh.COLORS[i % len(gh.COLORS)]
+    for i in range(len(urls)):
+        for j in (i + 1, i * 7 + 3, 2):
+            G.addEdge_url(urls[i], urls[j % len(urls)])
+    G.addEdge_url(urls[0], "https://elsewhere.example/")
+    G.addEdge_url(urls[0], "https://elsewhere.example/")
+    return G, urls
+
+def edgeSet(G):
+    return sorted((gh.urlOf(e.u), gh.urlOf(e.v), e.weight) for e in G.E)
+
+def load(path):
+    H = gh.Graph()
+    with graphFile.GraphFile(path) as gf:
+        gf.toGraph(H)
+    return H
+
+def assertSameGraph(G, H):
+    assert [v.url for v in H.V] == [v.url for v in G.V]
+    assert edgeSet(H) == edgeSet(G)
+    for v in G.V:
+        w = H.getVertex(v.url)
+        assert (w.color, w.dist) == (v.color, v.dist)
+        assert H.getProperties(w) == G.getProperties(v)
+
+# rewrites a WGRAPH02 file the way the first version wrote them (no propsBytes, and no props)
+def downgrade(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, numStrings, numVertices, numEdges, stringBytes, propsBytes = graphFile.HEADER.unpack_from(data)
+    # (both headers are a multiple of 8 bytes, so the sections stay lined up)
+    old = graphFile.OLD_HEADER.pack(graphFile.OLD_MAGIC, numStrings, numVertices, numEdges, stringBytes)
+    with open(path, "wb") as f:
+        f.write(old + data[graphFile.HEADER.size:len(data) - propsBytes])
+
+
+def test_round_trip_with_properties(tmp_path):
+    G, urls = makeGraph()
+    G.setProperty("pagerank", {url: 1 / (i + 1) for i, url in enumerate(urls)})
+    G.setProperty("inDegree", {urls[i]: i for i in range(0, len(urls), 2)})
+    G.setProperty("label", {urls[1]: "hub"})
+    path = str(tmp_path / "graph.wgraph")
+    graphFile.writeGraph(G, path)
+
+    with open(path, "rb") as f:
+        assert f.read(8) == graphFile.MAGIC
+    H = load(path)
+    assertSameGraph(G, H)
+    assert H.getProperty(urls[1], "label") == "hub"
+    assert H.getProperty(urls[1], "inDegree") == None
+
+def test_round_trip_without_properties(tmp_path):
+    G, urls = makeGraph()
+    path = str(tmp_path / "graph.wgraph")
+    graphFile.writeGraph(G, path)
+    with graphFile.GraphFile(path) as gf:
+        assert gf.properties() == {}
+    assertSameGraph(G, load(path))
+
+def test_old_files_still_load(tmp_path):
+    G, urls = makeGraph()
+    G.setProperty("pagerank", {urls[0]: 0.5})
+    path = str(tmp_path / "graph.wgraph")
+    graphFile.writeGraph(G, path)
+    downgrade(path)
+
+    with open(path, "rb") as f:
+        assert f.read(8) == graphFile.OLD_MAGIC
+    with graphFile.GraphFile(path) as gf:
+        assert gf.properties() == {}
+    H = load(path)
+    assert [v.url for v in H.V] == [v.url for v in G.V]
+    assert edgeSet(H) == edgeSet(G)
+    assert H.getProperties(urls[0]) == {}
+
+def test_arrays_can_be_used_in_place(tmp_path):
+    G, urls = makeGraph()
+    path = str(tmp_path / "graph.wgraph")
+    graphFile.writeGraph(G, path)
+    with graphFile.GraphFile(path) as gf:
+        targets, weights = gf.outEdges(0)
+        out = {gf.url(t): w for t, w in zip(targets, weights)}
+        # (the views onto the file have to be let go before it can be closed)
+        targets.release()
+        weights.release()
+        assert out["https://elsewhere.example/"] == 2
+        assert gf.color(0) == G.V[0].color
+        assert gf.dist(19) == None
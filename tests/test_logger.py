@@ -0,0 +1,44 @@
+import json
+
+import logger
+
+
+def readLines(path):
+    logger.flush()
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_minLevel_drops_info_and_keeps_warning_levels(logFile, monkeypatch):
+    monkeypatch.setattr(logger, "minLevel", logger.WARNING)
+    monkeypatch.setattr(logger, "jsonLines", True)
+    logger.write("just some info")
+    logger.debug("some debugging")
+    logger.warning("something's off")
+    logger.error("something broke")
+
+    records = [json.loads(line) for line in readLines(logFile)]
+    assert [(record["level"], record["msg"]) for record in records] == [
+        ("warning", "something's off"),
+        ("error", "something broke"),
+    ]
+
+
+def test_plain_text_lines_say_their_level(logFile):
+    logger.write("just some info")
+    logger.warning("something's off")
+
+    lines = readLines(logFile)
+    assert len(lines) == 2
+    assert lines[0].endswith("]: just some info")
+    assert lines[1].endswith("]: WARNING: something's off")
+
+
+def test_rate_limited_messages_get_counted(logFile, monkeypatch):
+    monkeypatch.setattr(logger, "rateLimit", 2)
+    # all in the same second, so only the first two get through
+    monkeypatch.setattr(logger.time, "time", lambda: 1700000000.5)
+    for i in range(5):
+        logger.write(f"page {i}", key="fetch")
+
+    assert [line.split("]: ")[1] for line in readLines(logFile)] == ["page 0", "page 1"]
@@ -0,0 +1,62 @@
+from pageCache import PageCache, contentKey
+
+links = (["https://example.com/about/"], ["https://other.example/"], ["other.example"])
+
+
+def test_links_come_back_with_their_validators(tmp_path):
+    cache = PageCache(str(tmp_path))
+    key = contentKey("example.com", b"<html>hi</html>")
+    cache.put("https://example.com/", '"v1"', "Mon, 01 Jan 2024 00:00:00 GMT", key, links)
+
+    assert "https://example.com/" in cache
+    assert cache.validators("https://example.com/") == {"If-None-Match": '"v1"',
+                                                        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    assert cache.links("https://example.com/") == links
+    assert cache.validators("https://example.com/new/") == {}
+    assert cache.links("https://example.com/new/") == None
+    cache.close()
+
+def test_the_same_body_shares_a_blob(tmp_path):
+    # (as bytes or str, it's the same page)
+    key = contentKey("example.com", b"<html>same</html>")
+    assert contentKey("example.com", "<html>same</html>") == key
+    assert contentKey("other.example", b"<html>same</html>") != key
+
+    cache = PageCache(str(tmp_path))
+    cache.put("https://example.com/a/", None, None, key, links)
+    # a page that comes back with a body we've already parsed doesn't need parsing again
+    assert cache.blob(key) == links
+    assert cache.blob(contentKey("example.com", b"<html>changed</html>")) == None
+    cache.close()
+
+def test_the_index_survives_a_restart(tmp_path):
+    cache = PageCache(str(tmp_path))
+    for version in range(3):
+        key = contentKey("example.com", f"version {version}")
+        cache.put("https://example.com/", f'"v{version}"', None, key, links)
+    cache.close()
+
+    reopened = PageCache(str(tmp_path))
+    assert len(reopened) == 1
+    # the last record for a url wins
+    assert reopened.validators("https://example.com/") == {"If-None-Match": '"v2"'}
+    reopened.close()
+    # (most of the index was old records, so it got compacted on the way in)
+    with open(reopened.indexPath) as f:
+        assert len(f.readlines()) == 1
+
+def test_a_cut_off_record_doesnt_swallow_the_next_one(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put("https://example.com/", None, None, contentKey("example.com", "a"), links)
+    cache.close()
+    # the crawl got killed halfway through writing a record
+    with open(cache.indexPath, "a") as f:
+        f.write('{"url": "https://exa')
+
+    cache = PageCache(str(tmp_path))
+    cache.put("https://example.com/b/", '"b"', None, contentKey("example.com", "b"), links)
+    cache.close()
+    reopened = PageCache(str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.links("https://example.com/b/") == links
+    reopened.close()
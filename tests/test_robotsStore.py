@@ -0,0 +1,81 @@
+import robotsStore
+from robotsStore import RobotsStore
+
+rules = """User-agent: *
+Disallow: /private/
+Crawl-delay: 2
+
+User-agent: picky-bot
+Disallow: /
+"""
+
+
+def test_rules_are_checked_against_each_path():
+    store = RobotsStore()
+    store.put("example.com", 200, rules, now=0)
+    assert store.check("example.com", "https://example.com/blog/", now=1) == (True, 2)
+    assert store.check("example.com", "https://example.com/private/x/", now=1) == (False, 2)
+
+    picky = RobotsStore(userAgent="picky-bot")
+    picky.put("example.com", 200, rules, now=0)
+    assert picky.check("example.com", "https://example.com/blog/", now=1) == (False, 0)
+
+def test_statuses_follow_robotparser():
+    store = RobotsStore()
+    store.put("locked.example", 403, "", now=0)
+    store.put("missing.example", 404, "", now=0)
+    store.unreachable("down.example", now=0)
+    assert store.check("locked.example", "https://locked.example/", now=1) == (False, 0)
+    assert store.check("missing.example", "https://missing.example/", now=1) == (True, 0)
+    assert store.check("down.example", "https://down.example/", now=1) == (True, 0)
+
+def test_entries_go_stale(monkeypatch):
+    monkeypatch.setattr(robotsStore, "ttl", 100)
+    monkeypatch.setattr(robotsStore, "unreachableTtl", 10)
+    store = RobotsStore()
+    store.put("example.com", 200, rules, now=0)
+    store.put("flaky.example", 503, "", now=0)
+    store.unreachable("down.example", now=0)
+
+    assert store.check("flaky.example", "https://flaky.example/", now=9) != None
+    assert store.check("flaky.example", "https://flaky.example/", now=10) == None
+    assert store.check("down.example", "https://down.example/", now=10) == None
+    assert store.check("example.com", "https://example.com/", now=99) != None
+    assert store.check("example.com", "https://example.com/", now=100) == None
+    # (the crawl-delay is still known while the file is being fetched again)
+    assert store.delay("example.com") == 2
+    assert (store.hits, store.misses) == (2, 3)
+
+def test_the_store_survives_a_restart(tmp_path):
+    path = str(tmp_path / "robots.jsonl")
+    store = RobotsStore(path)
+    store.put("example.com", 200, "User-agent: *\nDisallow: /\n")
+    store.put("example.com", 200, "User-agent: *\nDisallow: /blog/\n")
+    store.put("example.com", 200, rules)
+    store.close()
+
+    reopened = RobotsStore(path)
+    assert len(reopened) == 1
+    # the last record for a domain wins
+    assert reopened.check("example.com", "https://example.com/blog/") == (True, 2)
+    reopened.close()
+    # (most of the file was old records, so it got compacted on the way in)
+    with open(path) as f:
+        assert len(f.readlines()) == 1
+
+def test_a_cut_off_record_doesnt_swallow_the_next_one(tmp_path):
+    path = str(tmp_path / "robots.jsonl")
+    store = RobotsStore(path)
+    store.put("example.com", 200, rules)
+    store.close()
+    # the crawl got killed halfway through writing a record
+    with open(path, "a") as f:
+        f.write('{"domain": "other.exa')
+
+    store = RobotsStore(path)
+    store.put("other.example", 200, rules)
+    store.close()
+    reopened = RobotsStore(path)
+    assert len(reopened) == 2
+    assert reopened.check("other.example", "https://other.example/private/") == (False, 2)
+    reopened.close()
@@ -0,0 +1,54 @@
+from scheduler import DomainScheduler
+
+
+def test_lowest_depth_goes_first():
+    sched = DomainScheduler()
+    sched.push("a.example", 2, "a-deep")
+    sched.push("b.example", 0, "b-start")
+    sched.push("c.example", 1, "c-mid")
+    assert sched.pop(now=0) == ("b.example", 0, "b-start")
+    assert sched.pop(now=0) == ("c.example", 1, "c-mid")
+    assert sched.pop(now=0) == ("a.example", 2, "a-deep")
+    assert sched.pop(now=0) == None
+
+def test_ties_go_in_the_order_they_were_queued():
+    sched = DomainScheduler()
+    for item in ["first", "second", "third"]:
+        sched.push("a.example", 1, item)
+    popped = []
+    for i in range(3):
+        domain, depth, item = sched.pop(now=0)
+        popped.append(item)
+        sched.release(domain, now=0)
+    assert popped == ["first", "second", "third"]
+
+def test_a_busy_domain_never_gets_two_at_once():
+    sched = DomainScheduler()
+    sched.push("a.example", 0, "a1")
+    sched.push("a.example", 0, "a2")
+    sched.push("b.example", 5, "b1")
+    assert sched.pop(now=0)[2] == "a1"
+    # a.example is still in flight, so b.example goes next even though it's deeper
+    assert sched.pop(now=0)[2] == "b1"
+    assert sched.pop(now=0) == None
+    assert len(sched) == 1
+    sched.release("a.example", now=0)
+    assert sched.pop(now=0)[2] == "a2"
+    assert len(sched) == 0
+
+def test_only_the_cooling_domain_waits():
+    sched = DomainScheduler()
+    sched.push("slow.example", 0, "s1")
+    sched.push("slow.example", 0, "s2")
+    sched.push("fast.example", 1, "f1")
+    assert sched.pop(now=0)[2] == "s1"
+    sched.release("slow.example", delay=2, now=0)
+    assert sched.nextWakeup(now=0.5) == 1.5
+
+    # slow.example is cooling down, but fast.example doesn't have to wait for it
+    assert sched.pop(now=1)[2] == "f1"
+    sched.release("fast.example", now=1)
+    assert sched.pop(now=1.9) == None
+    assert sched.pop(now=2)[2] == "s2"
+    sched.release("slow.example", now=2)
+    assert sched.nextWakeup(now=2) == None
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+import checkpoint
+import graphHandler as gh
+import scrape
+
+
+# a small made up web: each page links to a few pages a level below it, and back up to the start
+def makeWeb(levels=4, fanout=3, seed=0):
+    rng = random.Random(seed)
+    start = "https://site0.example/"
+    web = {start: []}
+    level = [start]
+    for depth in range(1, levels):
+        below = [f"https://site{rng.randrange(4)}.example/{depth}/{i}/" for i in range(len(level) * fanout)]
+        for url in level:
+            web[url] = rng.sample(below, fanout) + [start]
+        for url in below:
+            web.setdefault(url, [start])
+        level = below
+    return start, web
+
+class Killed(Exception):
+    pass
+
+# points the spider at the made up web, through a fresh graph with a checkpoint log.
+# After `killAfter` fetches, the next one "kills" the crawl (just the once)
+@pytest.fixture
+def spider(monkeypatch, tmp_path):
+    fetched = []
+
+    def setUp(web, killAfter=None):
+        def parseWebpage(url):
+            nonlocal killAfter
+            if killAfter != None and len(fetched) >= killAfter:
+                killAfter = None
+                raise Killed()
+            fetched.append(url)
+            return web.get(url, []), [], []
+        monkeypatch.setattr(scrape, "parseWebpage", parseWebpage)
+        monkeypatch.setattr(scrape, "robotsCheck", lambda url: (True, 0))
+        monkeypatch.setattr(scrape, "interrupt", False)
+        G = gh.Graph()
+        G.log = checkpoint.CheckpointLog(G, str(tmp_path / "Crawl"))
+        monkeypatch.setattr(scrape, "G", G)
+        return G
+
+    setUp.fetched = fetched
+    setUp.prefix = str(tmp_path / "Crawl")
+    return setUp
+
+def summary(G):
+    edges = sorted((gh.urlOf(e.u), gh.urlOf(e.v), e.weight) for e in G.E)
+    vertices = sorted((v.url, v.color, v.dist) for v in G.V)
+    return vertices, edges
+
+
+@pytest.mark.parametrize("killAt", [0.0, 0.1, 0.3, 0.5, 0.7, 0.9])
+def test_a_killed_crawl_resumes_to_the_same_graph(spider, killAt, monkeypatch):
+    start, web = makeWeb()
+    G = spider(web)
+    scrape.spiderDFS([start], 3)
+    expected = summary(G)
+    pages = len(spider.fetched)
+    G.log.close(remove=True)
+    spider.fetched.clear()
+
+    killAfter = int(pages * killAt)
+    G = spider(web, killAfter)
+    with pytest.raises(Killed):
+        scrape.spiderDFS([start], 3)
+    # (kill -9: whatever was written since the last commit is as good as lost)
+    G.log.file.close()
+
+    H = gh.Graph()
+    checkpoint.restore(H, spider.prefix)
+    H.log = checkpoint.CheckpointLog(H, spider.prefix)
+    monkeypatch.setattr(scrape, "G", H)
+    fetchedBefore = len(spider.fetched)
+    scrape.spiderDFS_resume(3, [start])
+    H.log.close()
+
+    assert summary(H) == expected
+    # the pages that made it into the checkpoint don't get fetched again
+    # (only the one that was in the middle of being added, at most)
+    assert len(spider.fetched) <= pages + 1
+    assert fetchedBefore == killAfter
+
+def test_each_page_is_committed_with_all_of_its_edges(spider):
+    start, web = makeWeb()
+    G = spider(web)
+    scrape.spiderDFS([start], 3)
+    G.log.close()
+
+    for batch in checkpoint.committedBatches(f"{spider.prefix}.{G.log.gen}.wal"):
+        pages = {record[1] for record in batch if record[0] == "E"}
+        assert len(pages) <= 1
+        for url in pages:
+            # every link on the page went in with the same commit
+            assert sorted(record[2] for record in batch if record[0] == "E") == sorted(set(web[url]))
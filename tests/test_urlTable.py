@@ -0,0 +1,33 @@
+import graphHandler as gh
+import urlTable
+from urlTable import UrlTable
+
+
+def test_each_url_gets_one_id():
+    table = UrlTable()
+    a = table.intern("https://example.com/a/")
+    b = table.intern("https://example.com/b/")
+    assert a != b
+    assert table.intern("https://example.com/a/") == a
+    assert table.get("https://example.com/c/") == None
+    assert "https://example.com/c/" not in table
+    assert len(table) == 2
+    assert table.url(b) == "https://example.com/b/"
+
+def test_urls_are_split_once():
+    table = UrlTable()
+    a = table.intern("https://example.com/a/b/")
+    b = table.intern("http://example.com/")
+    c = table.intern("https://other.example/")
+    assert table.domain(a) == "example.com"
+    assert table.resource(a) == "a/b/"
+    assert table.resource(b) == ""
+    assert table.domainId(a) == table.domainId(b) != table.domainId(c)
+    assert table.domainName(table.domainId(c)) == "other.example"
+
+def test_vertices_can_still_be_renamed():
+    u = gh.Vertex("https://example.com/old/")
+    u.url = "https://example.com/new/"
+    assert u.url == "https://example.com/new/"
+    assert u.id == urlTable.get("https://example.com/new/")
+    assert u == gh.Vertex("https://example.com/new/")
@@ -0,0 +1,121 @@
+import threading
+from array import array
+
+# URL interning: every url we come across gets a small integer id, and the table holds
+# the one copy of its string that everybody shares. The graph (vertices, edges, adjacency
+# lists) stores ids instead of its own copies of each url.
+#
+# Each url is only split into (domain, resource) once, when it's first added, so looking
+# up the domain of a url we've already seen is just a couple of array lookups. Domains
+# get their own ids too, so comparing domains is comparing ints.
+
+
+# returns (domain, resource) as a 2-tuple of a URL. Does not verify input.
+def splitURL(link):
+    # find the first "/" AFTER the protocol ("https://")
+    start = 8
+    if link.find("https://") < 0:
+        start = 7
+        if link.find("http://") < 0:
+            start = 0
+    split = link.find("/", start)
+    # if there is no "/" at the end, that means there is no resource
+    if split < 0:
+        split = len(link)
+        resource = ""
+    else:
+        # everything after the "/"
+        resource = link[split+1:]
+    # everything between "https://" and "/"
+    domain = link[start:split]
+
+    return domain, resource
+
+
+class UrlTable:
+    def __init__(self):
+        # ex: {"https://example.com/a/": 0, ...}
+        self.__ids = {}
+        # ex: ["https://example.com/a/", ...] (url of each id)
+        self.__urls = []
+        # domain id of each url id
+        self.__domainIds = array("I")
+        # where the resource starts in each url (so it doesn't need its own string)
+        self.__resourceStarts = array("I")
+        # ex: ["example.com", ...] (domain of each domain id)
+        self.__domains = []
+        # ex: {"example.com": 0, ...}
+        self.__domainIndex = {}
+        # only needed when adding, so two threads can't give the same url two ids
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__urls)
+
+    def __contains__(self, url):
+        return url in self.__ids
+
+    # Returns the id for url, giving it a new one if it doesn't have one yet
+    def intern(self, url):
+        i = self.__ids.get(url)
+        if i != None:
+            return i
+        with self.__lock:
+            i = self.__ids.get(url)
+            if i != None:
+                return i
+            domain, resource = splitURL(url)
+            d = self.__domainIndex.get(domain)
+            if d == None:
+                d = len(self.__domains)
+                self.__domains.append(domain)
+                self.__domainIndex[domain] = d
+            i = len(self.__urls)
+            self.__urls.append(url)
+            self.__domainIds.append(d)
+            self.__resourceStarts.append(len(url) - len(resource))
+            self.__ids[url] = i
+            return i
+
+    # Returns the id for url, or None if it doesn't have one (without adding it)
+    def get(self, url):
+        return self.__ids.get(url)
+
+    # Returns the url with the given id
+    def url(self, i):
+        return self.__urls[i]
+
+    # Returns the domain of the url with the given id
+    def domain(self, i):
+        return self.__domains[self.__domainIds[i]]
+
+    # Returns the domain id of the url with the given id
+    def domainId(self, i):
+        return self.__domainIds[i]
+
+    # Returns the domain with the given domain id
+    def domainName(self, d):
+        return self.__domains[d]
+
+    # Returns the resource part of the url with the given id (everything after the domain)
+    def resource(self, i):
+        return self.__urls[i][self.__resourceStarts[i]:]
+
+
+# The table shared by the scraper and the graph, so an id means the same url everywhere.
+#
+# Ids are never taken back: a url stays in here for as long as the process runs, even once
+# every Graph that had it is gone. That's fine for a crawl (which only ever has the one graph,
+# plus its domain graph), but a long running process that builds lots of unrelated graphs
+# keeps every url any of them ever had. Do that kind of work in a process of its own
+# (ex: benchGraph.py runs each memory pass in a new process) so the table goes away with it.
+# (Giving each Graph its own table would mean every Vertex, Edge and adjacency list carrying
+# around which table its ids belong to, which is what the ids are there to avoid.)
+shared = UrlTable()
+
+intern = shared.intern
+get = shared.get
+url = shared.url
+domain = shared.domain
+domainId = shared.domainId
+domainName = shared.domainName